@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+'''
+Annotation edit distance (AED) between transcripts, computed in batches.
+
+A transcript is a list of (start, end) exon or CDS coordinates with
+start <= end. AED = 1 - (SN + SP) / 2, where SN is the fraction of the
+reference covered by the query and SP the fraction of the query covering the
+reference. Each (query, reference) exon pair overlapping by at least one
+position (touching counts, like InterLap.find) adds min(end) - max(start) to
+the overlap.
+
+transcriptAEDs() takes any number of transcript pairs. Their exons are
+flattened into numpy coordinate arrays, every query exon is lined up against
+every reference exon of the same pair, and the overlaps are summed per pair
+with one bincount. The per-pair InterLap and np.subtract loop of the old
+getAED() is gone, and the results are the same three decimal strings.
+
+pairwiseAEDs() and geneAEDs() batch whole loci: all the transcript pairs of
+all the loci are computed in one call.
+
+>>> print(getAED([(1, 100), (200, 300)], [(1, 100), (250, 300)]))
+0.126
+>>> print(pairwiseAED([[(1, 100)], [(1, 50)]], [[(1, 100)]]))
+0.000
+>>> print(' '.join(pairwiseAEDs([([[(1, 100)]], [[(51, 150)]]),
+...                               ([[(1, 100)], [(1, 50)]], [[(1, 100)]])])))
+0.505 0.000
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__all__ = ['transcriptAEDs', 'getAED', 'pairwiseAED', 'pairwiseAEDs',
+           'geneAEDs']
+
+# exon pairs lined up at once, bounds the size of the temporary arrays
+CHUNK = 1 << 21
+
+
+class _Transcripts(object):
+    # exons of every transcript stored flat, a transcript object that is in
+    # several pairs (e.g. the isoforms of a locus) is stored once
+    def __init__(self):
+        self.index = {}
+        self.starts, self.ends = [], []
+        self.offsets, self.counts = [], []
+
+    def add(self, transcript):
+        try:
+            return self.index[id(transcript)]
+        except KeyError:
+            pass
+        i = self.index[id(transcript)] = len(self.counts)
+        self.offsets.append(len(self.starts))
+        self.counts.append(len(transcript))
+        if transcript:
+            starts, ends = zip(*transcript)
+            self.starts.extend(starts)
+            self.ends.extend(ends)
+        return i
+
+
+def _overlaps(np, starts, ends, offsets, counts, q, r):
+    # summed exon overlap of each pair of transcript indexes q[i], r[i]
+    rows = counts[q] * counts[r]
+    last = np.cumsum(rows)
+    overlap = np.zeros(len(q), dtype=np.float64)
+    lo = 0
+    while lo < len(q):
+        # pairs lo:hi fit in CHUNK exon pairs, or hi is one past a big pair
+        base = last[lo] - rows[lo]
+        hi = max(lo + 1, int(np.searchsorted(last, base + CHUNK, side='right')))
+        n = rows[lo:hi]
+        pair = np.repeat(np.arange(lo, hi), n)
+        local = np.arange(int(n.sum()), dtype=np.int64) - \
+            np.repeat(last[lo:hi] - n - base, n)
+        nr = counts[r][pair]
+        qi = offsets[q][pair] + local // nr
+        ri = offsets[r][pair] + local % nr
+        qs, qe, rs, re = starts[qi], ends[qi], starts[ri], ends[ri]
+        hit = (rs <= qe) & (re >= qs)
+        cov = np.abs(np.minimum(qe, re) - np.maximum(qs, rs))
+        overlap[lo:hi] = np.bincount(pair[hit] - lo, weights=cov[hit],
+                                     minlength=hi - lo)
+        lo = hi
+    return overlap
+
+
+def transcriptAEDs(pairs):
+    '''
+    AED of each (query, reference) transcript pair, returns a list of
+    three decimal strings in the same order
+    '''
+    import numpy as np
+    store = _Transcripts()
+    q, r, same = [], [], []
+    for query, reference in pairs:
+        q.append(store.add(query))
+        r.append(store.add(reference))
+        same.append(query == reference)
+    if not q:
+        return []
+    q = np.array(q, dtype=np.int64)
+    r = np.array(r, dtype=np.int64)
+    starts = np.array(store.starts, dtype=np.int64)
+    ends = np.array(store.ends, dtype=np.int64)
+    offsets = np.array(store.offsets, dtype=np.int64)
+    counts = np.array(store.counts, dtype=np.int64)
+    overlap = _overlaps(np, starts, ends, offsets, counts, q, r)
+    lengths = np.bincount(np.repeat(np.arange(len(counts)), counts),
+                          weights=np.abs(starts - ends), minlength=len(counts))
+    qLen, rLen = lengths[q], lengths[r]
+    scored = (qLen > 0) & (rLen > 0) & ~np.array(same, dtype=bool)
+    AED = np.zeros(len(q), dtype=np.float64)
+    # same operations in the same order as before, so the floats are identical
+    SP = overlap[scored] / qLen[scored]
+    SN = overlap[scored] / rLen[scored]
+    AED[scored] = 1 - ((SN + SP) / 2)
+    return ['{:.3f}'.format(x) for x in AED.tolist()]
+
+
+def getAED(query, reference):
+    '''
+    AED between two transcripts as a three decimal string
+    '''
+    return transcriptAEDs([(query, reference)])[0]
+
+
+def _average(pAED, nquery):
+    # the lowest AED of each slice of nquery pairwise values, averaged over
+    # the number of query transcripts
+    AEDsum = []
+    splitAED = [pAED[i:i+nquery] for i in range(0, len(pAED), nquery)]
+    for pair in splitAED:
+        AEDsum.append(min(pair))
+    AEDavg = sum(AEDsum) / nquery
+    return '{:.3f}'.format(AEDavg)
+
+
+def pairwiseAEDs(loci):
+    '''
+    pairwiseAED of each (query transcripts, reference transcripts) locus,
+    with the transcript pairs of all loci computed in one batch
+    '''
+    pairs, sizes = [], []
+    for query, reference in loci:
+        n = 0
+        for a in query:
+            for b in reference:
+                pairs.append((a, b))
+                n += 1
+        sizes.append((len(query), n))
+    pAED = [float(x) for x in transcriptAEDs(pairs)]
+    results = []
+    offset = 0
+    for nquery, n in sizes:
+        results.append(_average(pAED[offset:offset+n], nquery))
+        offset += n
+    return results
+
+
+def pairwiseAED(query, reference):
+    '''
+    takes a multiple transcripts and sums AED from lowest pairwise comparison and then calculates
+    the average based on number of transcripts in the query
+    '''
+    return pairwiseAEDs([(query, reference)])[0]
+
+
+def geneAEDs(pairs, queryGenes, refGenes):
+    '''
+    {(query, ref): (exonAED, cdsAED)} for (query, ref) locus names in pairs,
+    from funannotate gene dictionaries; cdsAED is 0.000 unless both are mRNA
+    '''
+    pairs = list(pairs)
+    loci = []
+    for q, r in pairs:
+        loci.append((queryGenes[q]['mRNA'], refGenes[r]['mRNA']))
+    coding = [(q, r) for q, r in pairs if queryGenes[q]['type'] == 'mRNA' and
+              refGenes[r]['type'] == 'mRNA']
+    for q, r in coding:
+        loci.append((queryGenes[q]['CDS'], refGenes[r]['CDS']))
+    AEDs = pairwiseAEDs(loci)
+    cdsAED = dict(zip(coding, AEDs[len(pairs):]))
+    results = {}
+    for x, exonAED in zip(pairs, AEDs):
+        results[x] = (exonAED, cdsAED.get(x, '0.000'))
+    return results
+
+
+if __name__ == "__main__":
+    # doctests, then check against and time the InterLap based getAED that
+    # update and contrast used before: python -m funannotate.aed [loci]
+    import sys
+    import time
+    import random
+    import doctest
+    import itertools
+    import numpy as np
+    from funannotate.interlap import InterLap
+    print(doctest.testmod(verbose=0,
+                          optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
+
+    def _legacy_getAED(query, reference):
+        def _length(listTup):
+            len = 0
+            for i in listTup:
+                l = abs(i[0] - i[1])
+                len += l
+            return len
+        if query == reference:
+            return '0.000'
+        rLen = _length(reference)
+        refInterlap = InterLap(reference)
+        QueryOverlap = 0
+        qLen = 0
+        for exon in query:
+            qLen += abs(exon[0] - exon[1])
+            if exon in refInterlap:
+                hit = list(refInterlap.find(exon))
+                for h in hit:
+                    diff = np.subtract(exon, h)
+                    if diff[0] <= 0 and diff[1] >= 0:
+                        QueryOverlap += abs(h[0] - h[1])
+                    elif diff[0] <= 0 and diff[1] < 0:
+                        QueryOverlap += abs(h[0] - exon[1])
+                    elif diff[0] > 0 and diff[1] >= 0:
+                        QueryOverlap += abs(exon[0] - h[1])
+                    elif diff[0] > 0 and diff[1] < 1:
+                        QueryOverlap += abs(exon[0] - exon[1])
+        SP = QueryOverlap / float(qLen)
+        SN = QueryOverlap / float(rLen)
+        AED = 1 - ((SN + SP) / 2)
+        return '{:.3f}'.format(AED)
+
+    def _legacy_pairwiseAED(query, reference):
+        pAED = [float(_legacy_getAED(a, b))
+                for a, b in itertools.product(query, reference)]
+        return _average(pAED, len(query))
+
+    def _transcript(start):
+        exons = []
+        for i in range(random.randint(1, 12)):
+            end = start + random.randint(20, 400)
+            exons.append((start, end))
+            start = end + random.randint(30, 300)
+        return exons
+
+    def _edit(transcript):
+        # move some exon boundaries, drop or keep the rest
+        exons = []
+        for s, e in transcript:
+            if random.random() < 0.1:
+                continue
+            if random.random() < 0.3:
+                s, e = s + random.randint(-15, 15), e + random.randint(-15, 15)
+            exons.append((s, max(s + 1, e)))
+        return exons or transcript
+
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random.seed(42)
+    loci = []
+    for i in range(num):
+        ref = [_transcript(random.randint(1, 1000000))
+               for x in range(random.choice([1, 1, 1, 2, 3]))]
+        query = [_edit(random.choice(ref))
+                 for x in range(random.choice([1, 1, 1, 2]))]
+        loci.append((query, ref))
+    t0 = time.time()
+    legacy = [_legacy_pairwiseAED(q, r) for q, r in loci]
+    t_legacy = time.time() - t0
+    t0 = time.time()
+    batch = pairwiseAEDs(loci)
+    t_batch = time.time() - t0
+    assert legacy == batch
+    print('{:,} loci: {:.3f} sec InterLap getAED, {:.3f} sec pairwiseAEDs, '
+          'identical results'.format(num, t_legacy, t_batch))
@@ -281,6 +281,8 @@ def main(args):
         '-s', '--species', help='Species name (e.g. "Aspergillus fumigatus") use quotes if there is a space')
     parser.add_argument('-t', '--tbl2asn', default='-l paired-ends',
                         help='Custom parameters for tbl2asn, example: linkage and gap info')
+    parser.add_argument('--ncbi_validate', action='store_true',
+                        help='Run NCBI tbl2asn to write GenBank file, validation reports and SQN files')
     parser.add_argument('-a', '--annotations',
                         help='Custom annotations, tsv 3 column file')
     parser.add_argument('--isolate', help='Isolate name (e.g. Af293)')
@@ -598,6 +600,9 @@ def main(args):
 
     lib.log.info("Adding Functional Annotation to %s, NCBI accession: %s" % (
         organism, WGS_accession))
+    # tbl2asn writes the GenBank file with --ncbi_validate or for a GenBank reannotation
+    if args.ncbi_validate or WGS_accession:
+        lib.CheckDependencies(['tbl2asn'])
     lib.log.info(
         "Annotation consists of: {:,} gene models".format(int(GeneCounts)))
 
@@ -856,7 +861,7 @@ def main(args):
         if not lib.checkannotations(signalp_out):
             lib.log.info("Predicting secreted proteins with SignalP")
             lib.signalP(Proteins, os.path.join(
-                outputdir, 'annotate_misc'), signalp_out)
+                outputdir, 'annotate_misc'), signalp_out, cpus=args.cpus)
         else:
             lib.log.info(
                 'Existing SignalP results found: {:}'.format(signalp_out))
@@ -1074,19 +1079,25 @@ def main(args):
         annot_version = 1
     else:
         annot_version = version
-    # have to run as subprocess because of multiprocessing issues
-    cmd = [sys.executable, os.path.join(parentdir, 'aux_scripts', 'tbl2asn_parallel.py'),
-           '-i', TBLOUT, '-f', os.path.join(outputdir,
-                                            'annotate_misc', 'tbl2asn', 'genome.fsa'),
-           '-o', os.path.join(outputdir, 'annotate_misc',
-                              'tbl2asn'), '--sbt', SBT, '-d', discrep,
-           '-s', organism, '-t', args.tbl2asn, '-v', str(annot_version), '-c', str(args.cpus)]
-    if args.isolate:
-        cmd += ['--isolate', args.isolate]
-    if args.strain:
-        cmd += ['--strain', args.strain]
-    lib.log.debug(' '.join(cmd))
-    subprocess.call(cmd)
+    # a GenBank reannotation has NCBI protein/transcript ids, so that always goes through tbl2asn
+    if args.ncbi_validate or WGS_accession:
+        # have to run as subprocess because of multiprocessing issues
+        cmd = [sys.executable, os.path.join(parentdir, 'aux_scripts', 'tbl2asn_parallel.py'),
+               '-i', TBLOUT, '-f', os.path.join(outputdir,
+                                                'annotate_misc', 'tbl2asn', 'genome.fsa'),
+               '-o', os.path.join(outputdir, 'annotate_misc',
+                                  'tbl2asn'), '--sbt', SBT, '-d', discrep,
+               '-s', organism, '-t', args.tbl2asn, '-v', str(annot_version), '-c', str(args.cpus)]
+        if args.isolate:
+            cmd += ['--isolate', args.isolate]
+        if args.strain:
+            cmd += ['--strain', args.strain]
+        lib.log.debug(' '.join(cmd))
+        subprocess.call(cmd)
+    else:
+        lib.tbl2gbk(TBLOUT, os.path.join(outputdir, 'annotate_misc', 'tbl2asn', 'genome.fsa'),
+                    os.path.join(outputdir, 'annotate_misc', 'tbl2asn', 'genome.gbf'), organism,
+                    strain=args.strain, isolate=args.isolate, parameters=args.tbl2asn, cpus=args.cpus)
     # check if completed succesfully
     if not lib.checkannotations(os.path.join(outputdir, 'annotate_misc', 'tbl2asn', 'genome.gbf')):
         lib.log.info('ERROR: GBK file conversion failed, tbl2asn parallel script has died')
@@ -1097,6 +1108,8 @@ def main(args):
     BadProducts = []
     if os.path.exists(discrep):
         BadProducts = lib.getFailedProductNames(discrep, Gene2ProdFinal)
+    else:
+        lib.log.info('No tbl2asn discrepancy report, product names were not validated by NCBI tbl2asn; run with --ncbi_validate to check them')
 
     Gene2ProductPassed = os.path.join(
         outputdir, 'annotate_results', 'Gene2Products.new-names-passed.txt')
@@ -1122,6 +1135,8 @@ def main(args):
                 key, value[0][0], value[0][1]))
     with open(MustFixHelp, 'w') as musthelp:
         musthelp.write('#GeneID\tName\tProduct Description\ttbl2asn Error\n')
+        if not os.path.exists(discrep):
+            musthelp.write('#tbl2asn was not run (no --ncbi_validate), product names were not validated\n')
         if BadProducts:
             for key, value in natsorted(BadProducts.items()):
                 MustFixCount += 1
@@ -1130,8 +1145,9 @@ def main(args):
 
     # collected output files and rename accordingly
     ResultsFolder = os.path.join(outputdir, 'annotate_results')
-    os.rename(discrep, os.path.join(ResultsFolder,
-                                    organism_name+'.discrepency.report.txt'))
+    if os.path.exists(discrep):
+        os.rename(discrep, os.path.join(ResultsFolder,
+                                        organism_name+'.discrepency.report.txt'))
     final_tbl = os.path.join(ResultsFolder, organism_name+'.tbl')
     final_gbk = os.path.join(ResultsFolder, organism_name+'.gbk')
     final_gff = os.path.join(ResultsFolder, organism_name+'.gff3')
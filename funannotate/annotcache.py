@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+'''
+On-disk cache of parsed annotation files.
+
+gff2dict, tbl2dict and the GenBank parsers are run on the same files by
+predict, fix, update, annotate and compare, and again on every re-run. The
+cache stores the parsed dictionaries as zlib compressed pickles keyed by the
+parser, its arguments and the identity of every input file (path, size and
+mtime, or a hash of the contents), so an unchanged input is deserialized
+instead of parsed. The least recently used entries are removed once the
+cache is larger than its size limit.
+
+The cache is off unless enabled with environment variables:
+
+    FUNANNOTATE_CACHE       cache folder, or "on" for ~/.cache/funannotate,
+                            unset or "off" disables the cache
+    FUNANNOTATE_CACHE_SIZE  size limit, e.g. 500M or 4G, default 2G
+    FUNANNOTATE_CACHE_HASH  set to 1 to key inputs by content hash rather
+                            than by size and mtime
+
+>>> cache = AnnotationCache(folder)
+>>> key = cache.key('gff2dict', ['genes.gff3', 'genome.fasta'])
+>>> Genes = cache.get(key)      # None if not cached
+>>> cache.put(key, Genes)
+
+Bump PARSER_VERSION whenever a parser changes what it returns.
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import os
+import sys
+import zlib
+import hashlib
+import tempfile
+from funannotate.__version__ import __version__
+
+if sys.version_info[0] < 3:
+    import cPickle as pickle
+else:
+    import pickle
+
+__all__ = ['AnnotationCache', 'cached', 'defaultCache', 'PARSER_VERSION']
+
+PARSER_VERSION = 2
+DEFAULT_SIZE = 2 * 1024**3
+SUFFIX = '.pkl.z'
+
+
+def parseSize(size):
+    '''
+    convert 500M, 4G, 1024 etc to bytes
+    '''
+    size = str(size).strip().upper().rstrip('B')
+    units = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def fileHash(filename, blocksize=1 << 20):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as infile:
+        for block in iter(lambda: infile.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class AnnotationCache(object):
+    '''
+    folder of compressed pickles with least recently used eviction
+    '''
+
+    def __init__(self, folder, maxsize=DEFAULT_SIZE, content_hash=False):
+        self.folder = os.path.abspath(folder)
+        self.maxsize = maxsize
+        self.content_hash = content_hash
+
+    def _identity(self, filename):
+        filename = os.path.abspath(filename)
+        st = os.stat(filename)
+        if self.content_hash:
+            return (filename, st.st_size, fileHash(filename))
+        return (filename, st.st_size, repr(st.st_mtime))
+
+    def key(self, parser, inputs, *args, **kwargs):
+        '''
+        cache key for parser run on the list of input files with args/kwargs
+        '''
+        ident = [parser, __version__, PARSER_VERSION,
+                 [self._identity(x) for x in inputs],
+                 [repr(x) for x in args],
+                 sorted((k, repr(v)) for k, v in kwargs.items())]
+        return hashlib.sha1(repr(ident).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + SUFFIX)
+
+    def __contains__(self, key):
+        return os.path.isfile(self._path(key))
+
+    def get(self, key):
+        '''
+        return cached object or None
+        '''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as infile:
+                data = infile.read()
+        except (IOError, OSError):
+            return None
+        try:
+            obj = pickle.loads(zlib.decompress(data))
+        except Exception:
+            # truncated or written by an incompatible python
+            self._remove(path)
+            return None
+        try:
+            os.utime(path, None)  # mark as recently used
+        except OSError:
+            pass
+        return obj
+
+    def put(self, key, obj):
+        '''
+        store obj, failures to write are ignored as the cache is optional
+        '''
+        try:
+            if not os.path.isdir(self.folder):
+                os.makedirs(self.folder)
+            data = zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), 1)
+            fd, tmp = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as outfile:
+                outfile.write(data)
+            os.rename(tmp, self._path(key))
+        except (IOError, OSError, pickle.PicklingError):
+            return False
+        self.evict()
+        return True
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def entries(self):
+        '''
+        list of (mtime, size, path) of cached files, oldest first
+        '''
+        results = []
+        if not os.path.isdir(self.folder):
+            return results
+        for x in os.listdir(self.folder):
+            if not x.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.folder, x)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            results.append((st.st_mtime, st.st_size, path))
+        return sorted(results)
+
+    def size(self):
+        return sum(x[1] for x in self.entries())
+
+    def evict(self):
+        '''
+        remove least recently used entries until under maxsize
+        '''
+        entries = self.entries()
+        total = sum(x[1] for x in entries)
+        for mtime, size, path in entries:
+            if total <= self.maxsize:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            self._remove(path)
+
+
+def defaultCache():
+    '''
+    AnnotationCache from the FUNANNOTATE_CACHE* environment, None if the cache
+    is disabled, which is the default
+    '''
+    folder = os.environ.get('FUNANNOTATE_CACHE', '')
+    if folder.lower() in ['off', 'false', 'no', '0', '']:
+        return None
+    if folder.lower() in ['on', 'true', 'yes', '1']:
+        base = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.cache')
+        folder = os.path.join(base, 'funannotate')
+    try:
+        maxsize = parseSize(os.environ.get('FUNANNOTATE_CACHE_SIZE', DEFAULT_SIZE))
+    except ValueError:
+        maxsize = DEFAULT_SIZE
+    content_hash = os.environ.get('FUNANNOTATE_CACHE_HASH', '0').lower() in \
+        ['1', 'true', 'yes']
+    return AnnotationCache(folder, maxsize=maxsize, content_hash=content_hash)
+
+
+def cached(parser, inputs, func, *args, **kwargs):
+    '''
+    return func(*args, **kwargs) from the default cache, parser names the
+    function and inputs is the list of files the result depends on
+    '''
+    cache = defaultCache()
+    if cache is None:
+        return func(*args, **kwargs)
+    try:
+        key = cache.key(parser, inputs, *args, **kwargs)
+    except OSError:
+        return func(*args, **kwargs)
+    result = cache.get(key)
+    if result is None:
+        result = func(*args, **kwargs)
+        cache.put(key, result)
+    return result
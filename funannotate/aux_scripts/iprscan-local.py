@@ -93,68 +93,12 @@ def countfasta(input):
     return count
 
 
-def scan_linepos(path):
-    """return a list of seek offsets of the beginning of each line"""
-    linepos = []
-    offset = 0
-    with open(path) as inf:
-        # WARNING: CPython 2.7 file.tell() is not accurate on file.next()
-        for line in inf:
-            linepos.append(offset)
-            offset += len(line)
-    return linepos
-
-
-def return_lines(path, linepos, nstart, nstop):
-    """return nsamp lines from path where line offsets are in linepos"""
-    offsets = linepos[nstart:nstop]
-    lines = []
-    with open(path) as inf:
-        for offset in offsets:
-            inf.seek(offset)
-            lines.append(inf.readline())
-    return lines
-
-
 def split_fasta(input, outputdir, chunks):
-    # function to return line positions of fasta files for chunking
-    fastapos = []
-    position = 0
-    numseqs = 0
+    # split into chunks balanced by number of residues
     basename = os.path.basename(input).split('.fa', -1)[0]
-    with open(input, 'r') as infile:
-        for line in infile:
-            if line.startswith('>'):
-                numseqs += 1
-                fastapos.append(position)
-            position += 1
-    splits = []
-    n = int(numseqs / chunks)
-    num = 0
-    for i in range(chunks):
-        if i == 0:
-            start = 0
-            num = n
-            lastpos = fastapos[n+1]
-        else:
-            start = lastpos
-            num = num + n
-            try:
-                lastpos = fastapos[num+1]  # find the n+1 seq
-            except IndexError:
-                lastpos = fastapos[-1]
-        splits.append((start, lastpos))
-    # check if output folder exists, if not create it
-    if not os.path.isdir(outputdir):
-        os.makedirs(outputdir)
-    # get line positions from file
-    linepos = scan_linepos(input)
-    # loop through the positions and write output
-    for i, x in enumerate(splits):
-        num = i+1
-        with open(os.path.join(outputdir, basename+'_'+str(num)+'.fasta'), 'w') as output:
-            lines = return_lines(input, linepos, x[0], x[1])
-            output.write('%s' % ''.join(lines))
+    lib.splitFastaBalanced(input, chunks, outputdir, prefix=basename+'_',
+                           suffix='.fasta',
+                           manifest=os.path.join(outputdir, 'chunks.manifest.txt'))
 
 
 def downloadIPRproperties(name, cpus):
@@ -43,14 +43,6 @@ def runPhobiusRemote(Input):
     os.remove(OUTPATH+'.sequence.txt')
 
 
-def runPhobiusLocal(Input):
-    base = Input.split('/')[-1]
-    base = base.split('.fa')[0]
-    OUTPATH = os.path.join(TMPDIR, base+'.phobius')
-    cmd = ['phobius.pl', '-short', Input]
-    lib.runSubprocess2(cmd, TMPDIR, lib.log, OUTPATH)
-
-
 global parentdir
 parentdir = os.path.join(os.path.dirname(__file__))
 
@@ -68,41 +60,41 @@ lib.log.debug(cmd_args)
 # create tmpdir to store fasta files and output files
 TMPDIR = 'phobius_' + str(os.getpid())
 
-# split fasta
-lib.splitFASTA(args.input, TMPDIR)
-
-# now get list of files in tmpdir
-proteins = []
-for file in os.listdir(TMPDIR):
-    if file.endswith('.fa'):
-        proteins.append(file)
-
-# now run the script
+# run locally on residue balanced batches of proteins streamed to phobius.pl
+# on stdin, the remote server takes a single protein per job so split the
+# fasta into one file per protein for it
+phobius = []
 if lib.which('phobius.pl'):
-    lib.runMultiProgress(runPhobiusLocal, proteins,
-                         multiprocessing.cpu_count())
+    for result in lib.pipeFasta(['phobius.pl', '-short'], args.input,
+                                cpus=multiprocessing.cpu_count()):
+        phobius.append(result.splitlines(True))
 else:
+    lib.splitFastaBalanced(args.input, lib.countfasta(args.input), TMPDIR)
+    proteins = []
+    for file in os.listdir(TMPDIR):
+        if file.endswith('.fa'):
+            proteins.append(file)
     lib.runMultiProgress(runPhobiusRemote, proteins,
                          29)  # max is 30 jobs at a time
-
-# collect all results
-phobius = []
-for file in os.listdir(TMPDIR):
-    if file.endswith('.phobius'):
-        phobius.append(os.path.join(TMPDIR, file))
+    # collect all results
+    for file in os.listdir(TMPDIR):
+        if file.endswith('.phobius'):
+            with open(os.path.join(TMPDIR, file), 'rU') as input:
+                phobius.append(input.readlines())
 
 # write output
 TMdomain = 0
 SigPep = 0
+total = 0
 with open(args.out, 'w') as output:
     output.write("%s\t%s\t%s\t%s\n" % ('ID', 'TM', 'SP', 'Prediction'))
     for x in phobius:
-        with open(x, 'rU') as input:
-            line = input.readlines()
-            result = line[1].split(' ')
-            result = [x for x in result if x]
-            if result[1] == 'prediction':
+        for line in x[1:]:
+            result = line.split(' ')
+            result = [y for y in result if y]
+            if len(result) < 4 or result[1] == 'prediction':
                 continue
+            total += 1
             if int(result[1]) > 0:
                 TMdomain += 1
             if result[2] == 'Y':
@@ -111,7 +103,7 @@ with open(args.out, 'w') as output:
                 result[0], result[1], result[2], result[3].replace('\n', '')))
 
 # clean
-if not args.debug:
+if not args.debug and os.path.isdir(TMPDIR):
     shutil.rmtree(TMPDIR)
 lib.log.debug("%i total proteins, %i TMdomain, %i Signal Peptide" %
-              (len(phobius), TMdomain, SigPep))
+              (total, TMdomain, SigPep))
@@ -1,6 +1,7 @@
 #!/bin/bash
 
 #simple wrapper for running aligner program and piping output to samtools view/sort
+#the sorted BAM is indexed so it can be read by region, a failed index is not an error
 
 if [ -z "$3" ]; then
     echo 'Usage: sam2bam.sh "aligner_command" bam_threads bam_output'
@@ -9,7 +10,7 @@ if [ -z "$3" ]; then
 fi
 
 #construct the command
-cmd="$1 | samtools view -@ $2 -bS - | samtools sort -@ $2 -o $3 -"
+cmd="$1 | samtools view -@ $2 -bS - | samtools sort -@ $2 -o $3 - && { samtools index $3 || true; }"
 
 #run the command
 eval $cmd
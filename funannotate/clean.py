@@ -12,25 +12,13 @@ from multiprocessing import Pool
 from Bio import SeqIO
 from Bio.SeqIO.FastaIO import SimpleFastaParser
 from funannotate.library import CheckDependencies, softwrap, countfasta
+from funannotate.genomescan import readFasta, nxStats
 
 
 def calcN50(input):
-    lengths = []
-    with open(input, 'r') as infile:
-        for id, sequence in SimpleFastaParser(infile):
-            lengths.append(len(sequence))
+    lengths = [len(seq) for name, seq in readFasta(input)]
     # now get N50
-    lengths.sort()
-    nlist = []
-    for x in lengths:
-        nlist += [x]*x
-    if len(nlist) % 2 == 0:
-        medianpos = int(len(nlist) / 2)
-        N50 = int((nlist[medianpos] + nlist[medianpos-1]) / 2)
-    else:
-        medianpos = int(len(nlist) / 2)
-        N50 = int(nlist[medianpos])
-    return N50
+    return nxStats(lengths)[0]
 
 
 def Sortbysize(input, n50, minlen=500):
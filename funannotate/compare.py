@@ -59,6 +59,8 @@ def main(args):
                         choices=['raxml', 'iqtree'], help='ML method')
     parser.add_argument('-d', '--database',
                         help='Path to funannotate database, $FUNANNOTATE_DB')
+    parser.add_argument('--digest_dir',
+                        help='Folder of parsed genomes reused between runs, default: OUT/digests')
     args = parser.parse_args(args)
 
     parentdir = os.path.join(os.path.dirname(__file__))
@@ -179,6 +181,7 @@ def main(args):
     sm_backbones = []
     transmembrane = []
     cogs = []
+    cdsTables = []
     names_seen = []
     num_input = len(args.input)
     if num_input == 0:
@@ -212,15 +215,25 @@ def main(args):
             lib.log.error(
                 "Error, was not able to find appropriate GenBank file in the annotate_results folder")
         gbkfilenames.append(GBK)
-        # now run genome routines
-        genomeStats = lib.genomeStats(GBK)
+    # now run genome routines, a single pass over each GenBank file in a
+    # process pool, results come back in input order
+    if not args.digest_dir:
+        args.digest_dir = os.path.join(args.out, 'digests')
+    digests = lib.genomeDigests(gbkfilenames, FUNDB, cpus=args.cpus,
+                                store=args.digest_dir)
+    for i, digest in enumerate(digests):
+        genomeStats = digest.stats
+        if genomeStats[1]:
+            lib.log.info("working on %s %s" % (genomeStats[0], genomeStats[1]))
+        else:
+            lib.log.info("working on %s" % genomeStats[0])
         if int(genomeStats[9].replace(',', '')) == 0:
             lib.log.error(
                 "%s contains 0 gene models, exiting script" % genomeStats[0])
             sys.exit(1)
         stats.append(genomeStats)
         # this function will return list of dictionaries for each functional category
-        functional = lib.getGBKannotation(GBK, FUNDB)
+        functional = digest.annotation
         # split those dictionaries and append to master list for each group of annotation
         pfam.append(functional[0])
         ipr.append(functional[1])
@@ -245,9 +258,10 @@ def main(args):
                 name = base+'-'+str(num+1)
             else:
                 name = name+'-1'
-        lib.parseGOterms(GBK, go_folder, name)
-        lib.gb2proteinortho(GBK, protortho, name)
+        lib.writeGOterms(digest.go, go_folder, name)
+        lib.writeProteinortho(digest.proteinortho, protortho, name)
         scinames.append(name)
+        cdsTables.append(digest.cds)
 
     # convert busco to dictionary
     busco = lib.busco_dictFlip(busco)
@@ -823,10 +837,12 @@ def main(args):
             # run diamond blastp for reciprocal hits, then follow with proteinortho for graph/clustering
             #lib.ReciprocalBlast(filelist, protortho, args.cpus)
             # setup command
+            # -keep saves the pairwise searches, a re-run with an added or
+            # changed genome only searches that genome
             cmd = ['proteinortho', '-project=funannotate', '-synteny',
-                   '-cpus='+str(args.cpus), '-singles', '-selfblast']
+                   '-cpus='+str(args.cpus), '-singles', '-selfblast', '-keep']
             cmd2 = cmd + filelist
-            if not os.path.isfile(protOrthoTSV):
+            if not lib.proteinorthoInputs(protortho, filelist):
                 lib.runSubprocess(cmd2, protortho, lib.log)
         else:
             shutil.copyfile(args.proteinortho, protOrthoTSV)
@@ -1111,81 +1127,64 @@ def main(args):
             args.out, 'annotations', scinames[y]+'.all.annotations.tsv')
         with open(outputname, 'w') as output:
             output.write("%s\n" % ('\t'.join(header)))
-            with open(gbkfilenames[y], 'rU') as input:
-                SeqRecords = SeqIO.parse(input, 'genbank')
-                for record in SeqRecords:
-                    for f in record.features:
-                        if f.type == 'CDS':
-                            egg = ''
-                            cluster = ''
-                            smcog = ''
-                            ID = f.qualifiers['locus_tag'][0]
-                            length = len(f.qualifiers['translation'][0])
-                            description = f.qualifiers['product'][0]
-                            start = f.location.nofuzzy_start
-                            end = f.location.nofuzzy_end
-                            chr = record.id
-                            location = str(chr)+':'+str(start)+'-'+str(end)
-                            if f.location.strand == 1:
-                                strand = '+'
-                            else:
-                                strand = '-'
-                            if ID in iprDict:
-                                IPRdomains = "; ".join(iprDict.get(ID))
-                            else:
-                                IPRdomains = ''
-                            if ID in signalpDict[y]:
-                                signalphit = signalpDict[y].get(ID)[0]
-                            else:
-                                signalphit = ''
-                            if ID in TMDict[y]:
-                                TMhit = TMDict[y].get(ID)[0]
-                            else:
-                                TMhit = ''
-                            if ID in pfamDict:
-                                pfamdomains = "; ".join(pfamDict.get(ID))
-                            else:
-                                pfamdomains = ''
-                            if ID in meropsDict:
-                                meropsdomains = "; ".join(meropsDict.get(ID))
-                            else:
-                                meropsdomains = ''
-                            if ID in cazyDict:
-                                cazydomains = "; ".join(cazyDict.get(ID))
-                            else:
-                                cazydomains = ''
-                            if ID in busco[y]:
-                                buscogroup = busco[y].get(ID)[0]
-                            else:
-                                buscogroup = ''
-                            if ID in goDict:
-                                goTerms = "; ".join(goDict.get(ID))
-                            else:
-                                goTerms = ''
-                            if ID in orthoDict:
-                                orthogroup = orthoDict.get(ID)
-                            else:
-                                orthogroup = ''
-                            if ID in TFLookup:
-                                transfactor = TFLookup.get(ID)
-                            else:
-                                transfactor = ''
-                            for k, v in f.qualifiers.items():
-                                if k == 'note':
-                                    notes = v[0].split('; ')
-                                    for i in notes:
-                                        if i.startswith('EggNog:'):
-                                            hit = i.replace('EggNog:', '')
-                                            egg = hit
-                                        if i.startswith('antiSMASH:'):
-                                            cluster = i.replace(
-                                                'antiSMASH:', '')
-                                        if i.startswith('SMCOG:'):
-                                            smcog = i
-
-                            final_result = [ID, location, strand, str(length), description, orthogroup, egg, buscogroup, signalphit,
-                                            TMhit, meropsdomains, cazydomains, transfactor, IPRdomains, pfamdomains, goTerms, cluster, smcog]
-                            output.write("%s\n" % ('\t'.join(final_result)))
+            for ID, chr, start, end, strand, length, description, notes in cdsTables[y]:
+                egg = ''
+                cluster = ''
+                smcog = ''
+                location = str(chr)+':'+str(start)+'-'+str(end)
+                if ID in iprDict:
+                    IPRdomains = "; ".join(iprDict.get(ID))
+                else:
+                    IPRdomains = ''
+                if ID in signalpDict[y]:
+                    signalphit = signalpDict[y].get(ID)[0]
+                else:
+                    signalphit = ''
+                if ID in TMDict[y]:
+                    TMhit = TMDict[y].get(ID)[0]
+                else:
+                    TMhit = ''
+                if ID in pfamDict:
+                    pfamdomains = "; ".join(pfamDict.get(ID))
+                else:
+                    pfamdomains = ''
+                if ID in meropsDict:
+                    meropsdomains = "; ".join(meropsDict.get(ID))
+                else:
+                    meropsdomains = ''
+                if ID in cazyDict:
+                    cazydomains = "; ".join(cazyDict.get(ID))
+                else:
+                    cazydomains = ''
+                if ID in busco[y]:
+                    buscogroup = busco[y].get(ID)[0]
+                else:
+                    buscogroup = ''
+                if ID in goDict:
+                    goTerms = "; ".join(goDict.get(ID))
+                else:
+                    goTerms = ''
+                if ID in orthoDict:
+                    orthogroup = orthoDict.get(ID)
+                else:
+                    orthogroup = ''
+                if ID in TFLookup:
+                    transfactor = TFLookup.get(ID)
+                else:
+                    transfactor = ''
+                for i in notes:
+                    if i.startswith('EggNog:'):
+                        hit = i.replace('EggNog:', '')
+                        egg = hit
+                    if i.startswith('antiSMASH:'):
+                        cluster = i.replace(
+                            'antiSMASH:', '')
+                    if i.startswith('SMCOG:'):
+                        smcog = i
+
+                final_result = [ID, location, strand, str(length), description, orthogroup, egg, buscogroup, signalphit,
+                                TMhit, meropsdomains, cazydomains, transfactor, IPRdomains, pfamdomains, goTerms, cluster, smcog]
+                output.write("%s\n" % ('\t'.join(final_result)))
     ############################################
 
     # build phylogeny
@@ -27,6 +27,8 @@ def main(args):
     parser.add_argument('-o', '--out', help='Basename of output files')
     parser.add_argument('--tbl2asn', default='-l paired-ends',
                         help='Parameters for tbl2asn, linkage and gap info')
+    parser.add_argument('--ncbi_validate', action='store_true',
+                        help='Run NCBI tbl2asn to write GenBank file and validation reports')
     args = parser.parse_args(args)
 
     parentdir = os.path.join(os.path.dirname(__file__))
@@ -46,6 +48,8 @@ def main(args):
     # get version of funannotate
     version = lib.get_version()
     lib.log.info("Running %s" % version)
+    if args.ncbi_validate:
+        lib.CheckDependencies(['tbl2asn'])
 
     # create output and temporary directory
     if args.out:
@@ -108,18 +112,23 @@ def main(args):
     if not version:
         version = 1
     lib.log.info('Converting to GenBank format')
-    # have to run as subprocess because of multiprocessing issues
-    cmd = [sys.executable, os.path.join(parentdir, 'aux_scripts', 'tbl2asn_parallel.py'),
-           '-i', os.path.join(basedir, 'tbl2asn', 'genome.tbl'), '-f', os.path.join(
-               basedir, 'tbl2asn', 'genome.fsa'),
-           '-o', os.path.join(basedir, 'tbl2asn'), '--sbt', SBT, '-d', discrep,
-           '-s', organism, '-t', args.tbl2asn, '-v', str(version), '-c', '4']
-    if isolate:
-        cmd += ['--isolate', isolate]
-    if strain:
-        cmd += ['--strain', strain]
-    lib.log.debug(' '.join(cmd))
-    subprocess.call(cmd)
+    if args.ncbi_validate:
+        # have to run as subprocess because of multiprocessing issues
+        cmd = [sys.executable, os.path.join(parentdir, 'aux_scripts', 'tbl2asn_parallel.py'),
+               '-i', os.path.join(basedir, 'tbl2asn', 'genome.tbl'), '-f', os.path.join(
+                   basedir, 'tbl2asn', 'genome.fsa'),
+               '-o', os.path.join(basedir, 'tbl2asn'), '--sbt', SBT, '-d', discrep,
+               '-s', organism, '-t', args.tbl2asn, '-v', str(version), '-c', '4']
+        if isolate:
+            cmd += ['--isolate', isolate]
+        if strain:
+            cmd += ['--strain', strain]
+        lib.log.debug(' '.join(cmd))
+        subprocess.call(cmd)
+    else:
+        lib.tbl2gbk(os.path.join(basedir, 'tbl2asn', 'genome.tbl'), os.path.join(basedir, 'tbl2asn', 'genome.fsa'),
+                    os.path.join(basedir, 'tbl2asn', 'genome.gbf'), organism, strain=strain,
+                    isolate=isolate, parameters=args.tbl2asn, cpus=4)
 
     # now get GBK files from folder
     lib.log.info('Generating output files.')
@@ -141,14 +150,17 @@ def main(args):
     # retrieve files/reorganize
     shutil.copyfile(os.path.join(basedir, 'tbl2asn', 'genome.gbf'), final_gbk)
     shutil.copyfile(os.path.join(basedir, 'tbl2asn', 'genome.tbl'), final_tbl)
-    shutil.copyfile(os.path.join(basedir, 'tbl2asn',
-                                 'genome.val'), final_validation)
-    shutil.copyfile(os.path.join(basedir, 'tbl2asn',
-                                 'errorsummary.val'), final_error)
+    if args.ncbi_validate:
+        shutil.copyfile(os.path.join(basedir, 'tbl2asn',
+                                     'genome.val'), final_validation)
+        shutil.copyfile(os.path.join(basedir, 'tbl2asn',
+                                     'errorsummary.val'), final_error)
     lib.tbl2allout(final_tbl, os.path.join(basedir, 'tbl2asn', 'genome.fsa'), final_gff,
                    final_proteins, final_transcripts, final_cds_transcripts, final_fasta)
-    errors = lib.ncbiCheckErrors(
-        final_error, final_validation, locustag, final_fixes)
+    errors = 0
+    if args.ncbi_validate:
+        errors = lib.ncbiCheckErrors(
+            final_error, final_validation, locustag, final_fixes)
     if errors > 0:
         lib.log.info("Manually edit the tbl file %s, then run:\n\nfunannotate fix -i %s -t %s\n" %
                      (final_tbl, final_gbk, final_tbl))
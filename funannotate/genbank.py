@@ -0,0 +1,700 @@
+# -*- coding: utf-8 -*-
+'''
+GenBank flat file reader and writer for funannotate gene dictionaries.
+
+Renders the GenBank records tbl2asn would produce from a NCBI tbl file
+straight from the funannotate standardized dictionary and the contig
+sequence, so the final .gbk can be written without running tbl2asn. Each
+contig is an independent record, library.tbl2gbk formats them in a process
+pool and writes them in genome order. tbl2asn is still what validates a
+submission and writes the .sqn files.
+
+>>> print(formatLocation([(200, 300), (1, 100)], '-', partialStart=True))
+complement(join(1..100,200..>300))
+>>> print(formatQualifier('product', 'hypothetical protein'), end='')
+                     /product="hypothetical protein"
+
+Features follow the tbl2asn layout: a gene feature, then mRNA and CDS for
+every transcript (or a single tRNA/rRNA/ncRNA), GO terms and notes combined
+into a single /note, N runs of 10 or more as assembly_gap features.
+transcript_id and protein_id are the bare tbl ids (the gnl|ncbi| database
+prefix is dropped) which is what gb_feature_add2dict reads back.
+
+readGenBank() streams the records back without building Biopython objects.
+The GenBank files funannotate and tbl2asn write only use simple locations
+(ranges, '<' and '>' partial ends, join and complement), so a line oriented
+reader yields GBRecord/GBFeature tuples with plain str sequences and 1-based
+(start, end) parts instead of SeqRecord/SeqFeature/Seq objects. Records with
+anything else in them (order(), remote locations, CONTIG records, etc) are
+handed to Bio.SeqIO one record at a time and converted, so the results are
+the same either way.
+
+>>> strand, parts, before, after = parseLocation('complement(join(<1..100,200..300))')
+>>> print(strand, parts, before, after)
+- [(200, 300), (1, 100)] True False
+>>> print(extractFeature(GBFeature('CDS', '-', [(5, 6), (1, 2)], False, False, {}),
+...                      'ACGTTTGG'))
+AAGT
+
+A record written by formatRecord() reads back with readGenBank():
+
+>>> gene = {'type': 'mRNA', 'strand': '+', 'location': (3, 14),
+...         'ids': ['g1-T1'], 'mRNA': [[(3, 14)]], 'CDS': [[(3, 14)]],
+...         'partialStart': [False], 'partialStop': [False],
+...         'codon_start': [1], 'product': ['hypothetical protein'],
+...         'protein': ['MAK*']}
+>>> text = formatRecord('scaffold_1', 'TTATGGCGAAATAGTT', {'g1': gene},
+...                     'Genus species', date='01-JAN-2020')
+>>> record = next(readGenBank(io.StringIO(text)))
+>>> print(record.id, record.description, record.seq)
+scaffold_1 Genus species scaffold_1 TTATGGCGAAATAGTT
+>>> for f in record.features:
+...     print(f.type, f.parts, ' '.join(f.qualifiers.get('locus_tag', ['-'])))
+source [(1, 16)] -
+gene [(3, 14)] g1
+mRNA [(3, 14)] g1
+CDS [(3, 14)] g1
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import io
+import re
+import time
+from collections import namedtuple
+from funannotate.seqops import RevComp
+
+__all__ = ['formatLocation', 'formatQualifier', 'formatFeature',
+           'formatRecord', 'geneFeatures', 'gapFeatures', 'goNotes',
+           'linkageEvidence', 'GBRecord', 'GBFeature', 'readGenBank',
+           'parseLocation', 'extractFeature', 'fromSeqRecord',
+           'fromSeqFeature']
+
+WIDTH = 79
+_INDENT = ' ' * 21
+_HEADER_INDENT = ' ' * 12
+_GAP = re.compile('[Nn]{10,}')
+_GO_LINE = re.compile(r'^\t\t\tgo_(\w+)\t(.*)\|(\d+)\|[^|]*\|(\w*)')
+_MONTHS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN',
+           'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+# qualifiers that are written without quotes
+_UNQUOTED = set(['codon_start', 'transl_table', 'estimated_length'])
+
+
+def _wrap(text, width):
+    # split on the last space that fits, hard split words that do not fit
+    lines = []
+    while len(text) > width:
+        i = text.rfind(' ', 0, width + 1)
+        if i <= 0:
+            lines.append(text[:width])
+            text = text[width:]
+        else:
+            lines.append(text[:i])
+            text = text[i+1:]
+    lines.append(text)
+    return lines
+
+
+def formatQualifier(key, value=None):
+    '''
+    /key="value" wrapped at 79 columns, value None writes a flag like /pseudo
+    '''
+    if value is None:
+        return '{:}/{:}\n'.format(_INDENT, key)
+    if key in _UNQUOTED:
+        text = '/{:}={:}'.format(key, value)
+    else:
+        text = '/{:}="{:}"'.format(key, '{:}'.format(value).replace('"', '""'))
+    width = WIDTH - len(_INDENT)
+    if key == 'translation':
+        lines = [text[i:i+width] for i in range(0, len(text), width)]
+    else:
+        lines = _wrap(text, width)
+    return ''.join(_INDENT + x + '\n' for x in lines)
+
+
+def formatLocation(coords, strand, partialStart=False, partialStop=False):
+    '''
+    GenBank location of (start, end) coordinates in transcript order,
+    partialStart/partialStop mark the 5' and 3' ends of the feature
+    '''
+    coords = sorted(coords)
+    parts = ['{:}..{:}'.format(s, e) if s != e else '{:}'.format(s) for s, e in coords]
+    if strand == '+':
+        left, right = partialStart, partialStop
+    else:
+        left, right = partialStop, partialStart
+    if left:
+        parts[0] = '<' + parts[0]
+    if right:
+        head, sep, tail = parts[-1].rpartition('..')
+        parts[-1] = head + sep + '>' + tail if sep else '>' + tail
+    if len(parts) > 1:
+        loc = 'join({:})'.format(','.join(parts))
+    else:
+        loc = parts[0]
+    if strand == '-':
+        loc = 'complement({:})'.format(loc)
+    return loc
+
+
+def formatFeature(type, location, qualifiers):
+    '''
+    feature table entry, qualifiers is a list of (key, value) tuples
+    '''
+    width = WIDTH - len(_INDENT)
+    lines = []
+    while len(location) > width:
+        i = location.rfind(',', 0, width)
+        if i < 0:
+            break
+        lines.append(location[:i+1])
+        location = location[i+1:]
+    lines.append(location)
+    result = ['     {:<16}{:}\n'.format(type, lines[0])]
+    result.extend(_INDENT + x + '\n' for x in lines[1:])
+    for key, value in qualifiers:
+        result.append(formatQualifier(key, value))
+    return ''.join(result)
+
+
+def goNotes(lines):
+    '''
+    GO:id -> (aspect, name, evidence) from the go_process, go_function and
+    go_component lines of a NCBI tbl file
+    '''
+    terms = {}
+    for line in lines:
+        if line.startswith('\t\t\tgo_'):
+            m = _GO_LINE.match(line)
+            if m:
+                terms['GO:' + m.group(3)] = (m.group(1), m.group(2), m.group(4))
+    return terms
+
+
+def _goNote(term, goNames):
+    if term in goNames:
+        aspect, name, evidence = goNames[term]
+        note = 'GO_{:}: {:} - {:}'.format(aspect, term, name)
+        if evidence:
+            note += ' [Evidence {:}]'.format(evidence)
+        return note
+    return term
+
+
+def _item(v, key, i):
+    # per transcript list of a gene, empty if the key or transcript is missing
+    values = v.get(key) or []
+    if i < len(values) and values[i]:
+        return values[i]
+    return []
+
+
+def _skip(v):
+    # models dicts2tbl does not write to the tbl file
+    if v.get('pseudo'):
+        return True
+    if v['type'] is None:
+        return True
+    if v['type'] == 'mRNA':
+        if not v['CDS'] or not len(v['ids']) == len(v['mRNA']) == len(v['CDS']):
+            return True
+    return False
+
+
+def geneFeatures(locus, v, goNames={}):
+    '''
+    feature table text of a gene in a funannotate dictionary, or '' for the
+    models that are not written to a tbl file
+    '''
+    if _skip(v):
+        return ''
+    strand = v['strand']
+    coding = v['type'] == 'mRNA'
+    name = v.get('name')
+    gene = [('gene', name)] if name else []
+    gene_start = coding and True in v['partialStart']
+    gene_stop = coding and True in v['partialStop']
+    quals = list(gene)
+    for alias in v.get('gene_synonym') or []:
+        quals.append(('gene_synonym', alias))
+    quals.append(('locus_tag', locus))
+    out = [formatFeature('gene', formatLocation([v['location']], strand, gene_start, gene_stop), quals)]
+    for i in range(len(v['ids'])):
+        product = _item(v, 'product', i) or None
+        if not coding:
+            coords = _item(v, 'mRNA', i) or [v['location']]
+            quals = gene + [('locus_tag', locus)]
+            if product:
+                quals.append(('product', product))
+            if product == 'tRNA-Xxx':
+                quals.append(('pseudo', None))
+            out.append(formatFeature(v['type'], formatLocation(coords, strand), quals))
+            continue
+        tid = v['ids'][i]
+        ps, pss = v['partialStart'][i], v['partialStop'][i]
+        quals = gene + [('locus_tag', locus), ('product', product),
+                        ('transcript_id', '{:}_mrna'.format(tid))]
+        out.append(formatFeature('mRNA', formatLocation(v['mRNA'][i], strand, ps, pss), quals))
+        quals = gene + [('locus_tag', locus)]
+        for ec in _item(v, 'EC_number', i):
+            quals.append(('EC_number', ec))
+        notes = list(_item(v, 'note', i))
+        notes += [_goNote(x, goNames) for x in _item(v, 'go_terms', i)]
+        if notes:
+            quals.append(('note', '; '.join(notes)))
+        quals += [('codon_start', v['codon_start'][i]), ('product', product),
+                  ('protein_id', tid)]
+        for xref in _item(v, 'db_xref', i):
+            quals.append(('db_xref', xref))
+        protein = _item(v, 'protein', i) or ''
+        if protein.endswith('*'):
+            protein = protein[:-1]
+        if protein:
+            quals.append(('translation', protein))
+        out.append(formatFeature('CDS', formatLocation(v['CDS'][i], strand, ps, pss), quals))
+    return ''.join(out)
+
+
+def linkageEvidence(parameters):
+    '''
+    linkage evidence given to tbl2asn with -l in a parameter string
+    '''
+    params = (parameters or '').split()
+    if '-l' in params and params.index('-l') + 1 < len(params):
+        return params[params.index('-l') + 1]
+    return None
+
+
+def gapFeatures(seq, linkage=None):
+    '''
+    (start, feature text) of assembly gaps, runs of 10 or more N of
+    unknown length as tbl2asn -a r10u reports them
+    '''
+    results = []
+    for m in _GAP.finditer(seq):
+        quals = [('estimated_length', 'unknown'), ('gap_type', 'within scaffold')]
+        if linkage:
+            quals.append(('linkage_evidence', linkage))
+        loc = '{:}..{:}'.format(m.start() + 1, m.end())
+        results.append((m.start() + 1, formatFeature('assembly_gap', loc, quals)))
+    return results
+
+
+def _date():
+    t = time.localtime()
+    return '{:02d}-{:}-{:}'.format(t.tm_mday, _MONTHS[t.tm_mon - 1], t.tm_year)
+
+
+def _header(key, text):
+    lines = _wrap(text, WIDTH - len(_HEADER_INDENT))
+    return '{:<12}{:}\n'.format(key, lines[0]) + \
+        ''.join(_HEADER_INDENT + x + '\n' for x in lines[1:])
+
+
+def formatOrigin(seq):
+    # native str formatting, most of a record is sequence
+    seq = seq.lower()
+    n = len(seq)
+    full = n - n % 60
+    fmt = str('%9d %s %s %s %s %s %s\n')
+    lines = [fmt % (i + 1, seq[i:i+10], seq[i+10:i+20], seq[i+20:i+30], seq[i+30:i+40],
+                    seq[i+40:i+50], seq[i+50:i+60]) for i in range(0, full, 60)]
+    if full < n:
+        chunk = seq[full:]
+        lines.append(str('%9d %s\n') % (full + 1, str(' ').join(
+            chunk[j:j+10] for j in range(0, len(chunk), 10))))
+    return 'ORIGIN      \n' + str('').join(lines) + '//\n'
+
+
+def formatRecord(contig, seq, Genes, organism, strain=None, isolate=None,
+                 linkage=None, goNames={}, date=None):
+    '''
+    GenBank record of a contig and the funannotate dictionary of its genes
+    '''
+    if date is None:
+        date = _date()
+    length = len(seq)
+    description = organism
+    if strain:
+        description += ' strain ' + strain
+    elif isolate:
+        description += ' isolate ' + isolate
+    out = ['LOCUS       {:<16} {:>11} bp    DNA     linear   UNK {:}\n'.format(contig, length, date),
+           _header('DEFINITION', '{:} {:}.'.format(description, contig)),
+           _header('ACCESSION', contig),
+           'VERSION\n',
+           'KEYWORDS    .\n',
+           _header('SOURCE', organism),
+           _header('  ORGANISM', organism),
+           _HEADER_INDENT + 'Unclassified.\n',
+           'FEATURES             Location/Qualifiers\n']
+    source = [('organism', organism), ('mol_type', 'genomic DNA')]
+    if strain:
+        source.append(('strain', strain))
+    if isolate:
+        source.append(('isolate', isolate))
+    out.append(formatFeature('source', '1..{:}'.format(length), source))
+    features = gapFeatures(seq, linkage=linkage)
+    for k, v in sorted(Genes.items(), key=lambda x: (x[1]['location'], x[0])):
+        text = geneFeatures(k, v, goNames)
+        if text:
+            features.append((v['location'][0], text))
+    features.sort(key=lambda x: x[0])
+    out.extend(x[1] for x in features)
+    out.append(formatOrigin(seq))
+    return ''.join(out)
+
+GBRecord = namedtuple('GBRecord', ['id', 'name', 'description', 'annotations',
+                                   'features', 'seq'])
+
+
+class GBFeature(namedtuple('GBFeature', ['type', 'strand', 'parts', 'before',
+                                         'after', 'qualifiers'])):
+    '''
+    feature of a GBRecord, strand is '+', '-' or None, parts are 1-based
+    (start, end) tuples in the order of SeqFeature.location.parts, before and
+    after are True for a '<' start or '>' end, qualifiers is a dict of lists
+    of values like SeqFeature.qualifiers
+    '''
+    __slots__ = ()
+
+    @property
+    def start(self):
+        return min(x[0] for x in self.parts)
+
+    @property
+    def end(self):
+        return max(x[1] for x in self.parts)
+
+
+class _Unsupported(ValueError):
+    # raised for anything the line reader leaves to Biopython
+    pass
+
+
+_SEQ_DELETE = '0123456789 \t\r\n'
+_SEQ_DELETE_TEXT = dict((ord(x), None) for x in _SEQ_DELETE)
+_RANGE = re.compile(r'^(<?)(\d+)(?:\.\.(>?)(\d+))?$')
+_FEATURE_INDENT = ' ' * 21
+
+
+def parseLocation(text):
+    '''
+    (strand, parts, before, after) of a location made of ranges, join() and
+    complement(), raises ValueError for any other location
+    '''
+    loc = str('').join(text.split())
+    strand = '+'
+    if loc.startswith('complement(') and loc.endswith(')'):
+        loc = loc[11:-1]
+        strand = '-'
+    if loc.startswith('join(') and loc.endswith(')'):
+        items = loc[5:-1].split(',')
+    else:
+        items = [loc]
+    parts = []
+    low, high, before, after = None, None, False, False
+    for x in items:
+        m = _RANGE.match(x)
+        if not m:
+            raise _Unsupported('unsupported location {:}'.format(text))
+        start = int(m.group(2))
+        end = int(m.group(4)) if m.group(4) else start
+        if start > end:
+            raise _Unsupported('unsupported location {:}'.format(text))
+        if low is None or start < low:
+            low, before = start, bool(m.group(1))
+        if high is None or end > high:
+            high, after = end, bool(m.group(3))
+        parts.append((start, end))
+    if strand == '-':
+        parts.reverse()
+    return strand, parts, before, after
+
+
+def extractFeature(f, seq):
+    '''
+    sequence of a GBFeature from its contig (str or Seq), reverse complemented
+    on the minus strand like SeqFeature.extract
+    '''
+    if f.strand == '-':
+        return RevComp(str('').join(str(seq[s-1:e]) for s, e in reversed(f.parts)))
+    return str('').join(str(seq[s-1:e]) for s, e in f.parts)
+
+
+def fromSeqFeature(f):
+    '''
+    GBFeature of a Biopython SeqFeature
+    '''
+    loc = f.location
+    if loc is None:
+        return GBFeature(f.type, None, [], False, False, f.qualifiers)
+    strand = {1: '+', -1: '-'}.get(loc.strand)
+    parts = [(int(x.nofuzzy_start) + 1, int(x.nofuzzy_end)) for x in loc.parts]
+    return GBFeature(f.type, strand, parts, '{:}'.format(loc.start).startswith('<'),
+                     '{:}'.format(loc.end).startswith('>'), f.qualifiers)
+
+
+def fromSeqRecord(record):
+    '''
+    GBRecord of a Biopython SeqRecord
+    '''
+    return GBRecord(record.id, record.name, record.description,
+                    record.annotations, [fromSeqFeature(f) for f in record.features],
+                    str(record.seq))
+
+
+def _qualifiers(lines):
+    # qualifier dict of the stripped lines following the location, quoted
+    # values are joined with spaces and unquoted as Bio.GenBank does
+    quals = {}
+    i, n = 0, len(lines)
+    while i < n:
+        line = lines[i]
+        i += 1
+        if line[0] != '/':
+            raise _Unsupported('unquoted qualifier continuation')
+        eq = line.find('=')
+        if eq == -1:
+            # flags like /pseudo, only the first one is kept
+            quals.setdefault(line[1:], [''])
+            continue
+        key, value = line[1:eq], line[eq+1:]
+        if value.startswith(' '):
+            raise _Unsupported('white space after = in qualifier')
+        if value.startswith('"') and value != '"':
+            chunks = [value]
+            while chunks[-1][-1] != '"':
+                if i == n:
+                    raise _Unsupported('unterminated qualifier')
+                chunks.append(lines[i])
+                i += 1
+            value = str(' ').join(chunks)
+        if value.startswith('"'):
+            value = value[1:]
+        if value.endswith('"'):
+            value = value[:-1]
+        value = value.replace('""', '"')
+        if key == 'translation':
+            value = str('').join(value.split())
+        if key in quals:
+            quals[key].append(value)
+        else:
+            quals[key] = [value]
+    return quals
+
+
+def _feature(key, lines):
+    # GBFeature of a feature key and its location/qualifier lines
+    location = lines[0].strip()
+    i = 1
+    while location.endswith(','):
+        if i == len(lines):
+            raise _Unsupported('unterminated location')
+        location += lines[i]
+        i += 1
+    strand, parts, before, after = parseLocation(location)
+    return GBFeature(key, strand, parts, before, after, _qualifiers(lines[i:]))
+
+
+def _parseHeader(lines, annotations):
+    # (id, name, description) from the header lines, organism, taxonomy and
+    # accessions go in annotations
+    name, description, ids, version = None, '', [], None
+    record_id = None
+    entries = []
+    for line in lines:
+        if line.startswith(' ' * 12) and entries:
+            entries[-1][1].append(line[12:])
+        elif line.strip():
+            entries.append((line[:12].strip(), [line[12:].strip()]))
+    for tag, data in entries:
+        if tag == 'LOCUS':
+            fields = data[0].split()
+            if not fields or 'aa' in fields:
+                raise _Unsupported('not a nucleotide LOCUS line')
+            name = fields[0]
+        elif tag == 'DEFINITION':
+            text = ' '.join(data)
+            description = text[:-1] if text.endswith('.') else text
+        elif tag == 'ACCESSION':
+            for x in ' '.join(data).replace(';', ' ').split():
+                if x not in ids:
+                    ids.append(x)
+            if record_id is None and ids:
+                record_id = ids[0]
+        elif tag == 'VERSION':
+            text = ' '.join(data[0].split()).split(' GI:')[0]
+            if text.count('.') == 1 and text.split('.')[1].isdigit():
+                if text.split('.')[0] not in ids:
+                    ids.append(text.split('.')[0])
+                if record_id is None:
+                    record_id = ids[0]
+                version = int(text.split('.')[1])
+            elif text:
+                record_id = text
+        elif tag == 'ORGANISM':
+            organism, lineage = data[0], ''
+            for x in data[1:]:
+                if lineage or ';' in x:
+                    lineage += ' ' + x
+                elif x.strip() != '.':
+                    organism += ' ' + x.strip()
+            annotations['organism'] = organism
+            lineage = lineage.strip()
+            if lineage.endswith('.'):
+                lineage = lineage[:-1]
+            annotations['taxonomy'] = [x.strip() for x in lineage.split(';') if x.strip()]
+        elif tag == 'CONTIG':
+            raise _Unsupported('CONTIG record')
+    if name is None:
+        raise _Unsupported('no LOCUS line')
+    if ids:
+        annotations['accessions'] = ids
+    if not record_id:
+        record_id = name
+    elif version is not None and '.' not in record_id:
+        record_id += '.{:}'.format(version)
+    return record_id, name, description
+
+
+def _sequence(lines):
+    # uppercase sequence of the ORIGIN lines, position numbers, spaces and
+    # line ends are deleted from all of the lines at once
+    if not lines or lines[-1].rstrip() != '//':
+        raise _Unsupported('unterminated sequence')
+    lines = lines[:-1]
+    for line in lines:
+        if line[9:10] != ' ':
+            raise _Unsupported('unexpected sequence line')
+    text = str('').join(lines)
+    if isinstance(text, bytes):
+        return text.translate(None, _SEQ_DELETE.encode('ascii')).upper()
+    return text.translate(_SEQ_DELETE_TEXT).upper()
+
+
+def _parseRecord(lines):
+    # GBRecord of the lines of a record from LOCUS to //
+    header, features = [], []
+    section = 'header'
+    key, current = None, None
+    origin = None
+    for i, line in enumerate(lines):
+        if section == 'features' and line.startswith(_FEATURE_INDENT):
+            # most lines are qualifiers, check them first
+            if current is None:
+                raise _Unsupported('qualifier outside of a feature')
+            line = line.strip()
+            if line:
+                current.append(line)
+            continue
+        line = line.rstrip()
+        if line.startswith('ORIGIN'):
+            section, origin = 'sequence', i + 1
+            break
+        elif line.startswith('FEATURES'):
+            section = 'features'
+        elif line.startswith('CONTIG') or line == '//':
+            raise _Unsupported('record without ORIGIN sequence')
+        elif section == 'header':
+            header.append(line)
+        elif section == 'footer':
+            continue
+        elif not line.strip():
+            continue
+        elif line[0] != ' ':
+            # BASE COUNT and other lines between features and sequence
+            section = 'footer'
+        else:
+            if len(line) <= 21 or (line[21] != ' ' and ' ' in line[21:]):
+                raise _Unsupported('unexpected feature line')
+            if current is not None:
+                features.append(_feature(key, current))
+            key, current = line[2:21].strip(), [line[21:]]
+    if section != 'sequence':
+        raise _Unsupported('record without ORIGIN sequence')
+    if current is not None:
+        features.append(_feature(key, current))
+    annotations = {}
+    record_id, name, description = _parseHeader(header, annotations)
+    seq = _sequence(lines[origin:])
+    return GBRecord(record_id, name, description, annotations, features, seq)
+
+
+def _recordLines(handle):
+    # lists of lines of every record, LOCUS to //
+    lines = None
+    for line in handle:
+        if lines is None:
+            if line.startswith('LOCUS'):
+                lines = [line]
+            continue
+        lines.append(line)
+        if line.startswith('//'):
+            yield lines
+            lines = None
+    if lines:
+        yield lines
+
+
+def readGenBank(input):
+    '''
+    stream GBRecord tuples from a GenBank file or open handle, records the
+    line reader does not handle are parsed with Bio.SeqIO and converted
+    '''
+    if hasattr(input, 'read'):
+        handle, close = input, False
+    else:
+        handle, close = open(input, 'r'), True
+    try:
+        for lines in _recordLines(handle):
+            try:
+                yield _parseRecord(lines)
+            except _Unsupported:
+                from Bio import SeqIO
+                text = str('').join(lines)
+                if isinstance(text, bytes):
+                    text = text.decode('utf-8')
+                yield fromSeqRecord(SeqIO.read(io.StringIO(text), 'genbank'))
+    finally:
+        if close:
+            handle.close()
+
+
+if __name__ == "__main__":
+    # doctests, with a GenBank file also time readGenBank against Bio.SeqIO
+    # python -m funannotate.genbank [genome.gbk]
+    import sys
+    import doctest
+    import resource
+    import subprocess
+
+    def _read(filename, reader):
+        records, features, bp = 0, 0, 0
+        if reader == 'biopython':
+            from Bio import SeqIO
+            parsed = SeqIO.parse(filename, 'genbank')
+        else:
+            parsed = readGenBank(filename)
+        for record in parsed:
+            records += 1
+            features += len(record.features)
+            bp += len(record.seq)
+        return records, features, bp
+
+    if len(sys.argv) > 2:
+        t0 = time.time()
+        counts = _read(sys.argv[1], sys.argv[2])
+        elapsed = time.time() - t0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        print('{:<12} {:>8.2f} sec {:>9.1f} Mb peak RSS   {:,} records, {:,} features, {:,} bp'.format(
+            sys.argv[2], elapsed, peak, *counts))
+    else:
+        print(doctest.testmod(verbose=0,
+                              optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
+        if len(sys.argv) > 1:
+            for reader in ['biopython', 'funannotate']:
+                # separate processes so each peak RSS is its own
+                subprocess.call([sys.executable, '-m', 'funannotate.genbank',
+                                 sys.argv[1], reader])
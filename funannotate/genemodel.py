@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+'''
+Compact gene model containers for the funannotate standardized dictionary.
+
+gff2dict/tbl2dict return one dictionary per locus holding lists of lists of
+(start, end) tuples plus the transcript, CDS and protein sequences of every
+transcript. For a large genome that is GBs of small Python objects. GeneModel
+keeps the same information in __slots__ objects with the coordinates of each
+transcript packed into a single array, and derives the sequences from a
+GenomeStore only when they are asked for.
+
+GeneModel behaves like a read-only funannotate dictionary, so dicts2tbl,
+dict2gff3, dict2gtf and dict2nucleotides2 work on it unchanged:
+
+>>> model = GeneModel.fromDict('g1', {'name': None, 'type': 'mRNA',
+...     'ids': ['g1-T1'], 'mRNA': [[(1, 10), (20, 30)]], 'CDS': [[(4, 10), (20, 27)]],
+...     '5UTR': [[(1, 3)]], '3UTR': [[(28, 30)]], 'codon_start': [1],
+...     'strand': '+', 'location': (1, 30), 'contig': 'chr1', 'source': 'funannotate',
+...     'product': ['hypothetical protein'], 'phase': [[0, 2]], 'db_xref': [[]],
+...     'go_terms': [[]], 'note': [[]], 'partialStart': [False],
+...     'partialStop': [False], 'pseudo': False})
+>>> model['CDS']
+[[(4, 10), (20, 27)]]
+>>> 'EC_number' in model, model['partialStop']
+(False, [False])
+
+Use toDict() to get a mutable plain dictionary back.
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import sys
+from array import array
+
+__all__ = ['GeneModel', 'Transcript', 'compactGene', 'compactGenes']
+
+# key order of the dictionaries built by gff2dict/tbl2dict
+KEYS = ('name', 'type', 'transcript', 'cds_transcript', 'protein', '5UTR',
+        '3UTR', 'codon_start', 'ids', 'CDS', 'mRNA', 'strand', 'location',
+        'contig', 'product', 'source', 'phase', 'db_xref', 'go_terms', 'note',
+        'partialStart', 'partialStop', 'pseudo', 'gene_synonym', 'EC_number')
+# keys holding one entry per transcript
+PER_TRANSCRIPT = ('ids', 'mRNA', 'CDS', '5UTR', '3UTR', 'codon_start',
+                  'product', 'phase', 'db_xref', 'go_terms', 'note',
+                  'partialStart', 'partialStop', 'EC_number')
+# keys derived from the genome
+SEQUENCES = ('transcript', 'cds_transcript', 'protein')
+# keys a dictionary may or may not have
+OPTIONAL = ('gene_synonym', 'EC_number')
+# feature types that gff2dict/tbl2dict store a transcript sequence for
+TRANSCRIBED = ('mRNA', 'tRNA', 'ncRNA', 'rRNA')
+
+# order of the coordinate blocks packed in Transcript.coords
+_BLOCKS = ('mRNA', 'CDS', '5UTR', '3UTR')
+_LISTS = ('note', 'db_xref', 'go_terms', 'EC_number')
+_SCALARS = frozenset(('name', 'type', 'strand', 'location', 'contig',
+                      'source', 'pseudo'))
+_KEYSET = frozenset(KEYS)
+# tuples of key names are shared between models
+_INTERN = {}
+
+
+def _intern(keys):
+    keys = tuple(keys)
+    return _INTERN.setdefault(keys, keys)
+
+
+def _pack(blocks):
+    # header of len(blocks) counts followed by the flattened (start, end) pairs
+    coords = array(str('l'), [len(x) for x in blocks])
+    for block in blocks:
+        for start, end in block:
+            coords.append(start)
+            coords.append(end)
+    return coords
+
+
+class Transcript(object):
+    '''
+    one transcript of a GeneModel, coordinates are packed in an array
+    '''
+    __slots__ = ('id', 'coords', 'phase', 'codon_start', 'product', 'note',
+                 'db_xref', 'go_terms', 'EC_number', 'partialStart',
+                 'partialStop')
+
+    def __init__(self, id, exons=(), cds=(), utr5=(), utr3=(), phase=(),
+                 codon_start=1, product=None, note=(), db_xref=(),
+                 go_terms=(), EC_number=(), partialStart=False,
+                 partialStop=False):
+        self.id = id
+        self.coords = _pack((exons, cds, utr5, utr3))
+        self.phase = array(str('b'), phase)
+        self.codon_start = codon_start
+        self.product = product
+        # empty annotation lists are stored as None
+        self.note = tuple(note) or None
+        self.db_xref = tuple(db_xref) or None
+        self.go_terms = tuple(go_terms) or None
+        self.EC_number = tuple(EC_number) or None
+        self.partialStart = partialStart
+        self.partialStop = partialStop
+
+    def __getstate__(self):
+        return tuple(getattr(self, x) for x in self.__slots__)
+
+    def __setstate__(self, state):
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
+    def block(self, key):
+        '''
+        return list of (start, end) tuples for mRNA, CDS, 5UTR or 3UTR
+        '''
+        n = _BLOCKS.index(key)
+        coords = self.coords
+        start = len(_BLOCKS) + 2 * sum(coords[:n])
+        end = start + 2 * coords[n]
+        return [(coords[i], coords[i+1]) for i in range(start, end, 2)]
+
+    @property
+    def exons(self):
+        return self.block('mRNA')
+
+    @property
+    def cds(self):
+        return self.block('CDS')
+
+
+class _LazySeqs(object):
+    '''
+    list-like view of the sequences of a GeneModel, computed on access
+    '''
+    __slots__ = ('model', 'key', 'indexes')
+
+    def __init__(self, model, key, indexes):
+        self.model = model
+        self.key = key
+        self.indexes = indexes
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.model.sequence(self.key, x) for x in self.indexes[i]]
+        return self.model.sequence(self.key, self.indexes[i])
+
+    def __iter__(self):
+        for x in self.indexes:
+            yield self.model.sequence(self.key, x)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class GeneModel(object):
+    '''
+    compact, read-only funannotate gene dictionary
+    sequences are derived from the genome (GenomeStore) when accessed
+    '''
+    __slots__ = ('locus', 'contig', 'type', 'strand', 'location', 'name',
+                 'source', 'pseudo', 'gene_synonym', 'transcripts', 'genome',
+                 '_empty', '_missing')
+
+    def __init__(self, locus, contig, type, strand, location, transcripts=(),
+                 name=None, source='funannotate', pseudo=False,
+                 gene_synonym=None, genome=None):
+        self.locus = locus
+        self.contig = contig
+        self.type = type
+        self.strand = strand
+        self.location = location
+        self.name = name
+        self.source = source
+        self.pseudo = pseudo
+        self.gene_synonym = gene_synonym
+        self.transcripts = list(transcripts)
+        self.genome = genome
+        self._empty = ()
+        self._missing = () if gene_synonym is not None else ('gene_synonym',)
+
+    @classmethod
+    def fromDict(cls, locus, d, genome=None):
+        '''
+        build a GeneModel from a funannotate dictionary, raises ValueError
+        if the dictionary has a shape that can not be represented exactly
+        '''
+        n = len(d.get('ids', []))
+        if not n:
+            raise ValueError('{:} has no transcripts'.format(locus))
+        for k in d:
+            if k not in KEYS:
+                raise ValueError('{:} has unknown key {:}'.format(locus, k))
+        missing = [x for x in KEYS if x not in d and x not in SEQUENCES]
+        if [x for x in missing if x not in OPTIONAL]:
+            raise ValueError('{:} is missing {:}'.format(locus, missing))
+        empty = []
+        for k in PER_TRANSCRIPT:
+            if k not in d:
+                continue
+            if len(d[k]) == 0:
+                empty.append(k)
+            elif len(d[k]) != n:
+                raise ValueError('{:} has {:} {:} for {:} transcripts'.format(
+                    locus, len(d[k]), k, n))
+        if 'ids' in empty:
+            raise ValueError('{:} has no transcripts'.format(locus))
+
+        def _get(k, i, default):
+            if k in empty or k not in d:
+                return default
+            return d[k][i]
+        transcripts = []
+        for i in range(n):
+            transcripts.append(Transcript(
+                d['ids'][i], exons=_get('mRNA', i, ()), cds=_get('CDS', i, ()),
+                utr5=_get('5UTR', i, ()), utr3=_get('3UTR', i, ()),
+                phase=_get('phase', i, ()),
+                codon_start=_get('codon_start', i, None),
+                product=_get('product', i, None), note=_get('note', i, ()),
+                db_xref=_get('db_xref', i, ()),
+                go_terms=_get('go_terms', i, ()),
+                EC_number=_get('EC_number', i, ()),
+                partialStart=_get('partialStart', i, None),
+                partialStop=_get('partialStop', i, None)))
+        synonyms = d.get('gene_synonym')
+        model = cls(locus, d['contig'], d['type'], d['strand'], d['location'],
+                    transcripts=transcripts, name=d['name'],
+                    source=d['source'], pseudo=d['pseudo'],
+                    gene_synonym=tuple(synonyms) if synonyms else None,
+                    genome=genome)
+        model._empty = _intern(empty)
+        model._missing = _intern(missing)
+        return model
+
+    def toDict(self):
+        '''
+        return a plain (mutable) funannotate dictionary
+        '''
+        return dict((k, self[k] if k not in SEQUENCES else list(self[k]))
+                    for k in self.keys())
+
+    def __getstate__(self):
+        return tuple(getattr(self, x) for x in self.__slots__)
+
+    def __setstate__(self, state):
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
+    def __repr__(self):
+        return 'GeneModel({!r}, {!r})'.format(self.locus, self.toDict())
+
+    # dictionary interface
+    def keys(self):
+        return [x for x in KEYS if x not in self._missing]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return key in _KEYSET and key not in self._missing
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        return [self[x] for x in self.keys()]
+
+    def items(self):
+        return [(x, self[x]) for x in self.keys()]
+
+    def iteritems(self):
+        for x in self.keys():
+            yield x, self[x]
+
+    def __getitem__(self, key):
+        if key in _SCALARS:
+            return getattr(self, key)
+        if key not in _KEYSET or key in self._missing:
+            raise KeyError(key)
+        if key in self._empty:
+            return []
+        if key == 'gene_synonym':
+            return list(self.gene_synonym or [])
+        elif key in _BLOCKS:
+            return [t.block(key) for t in self.transcripts]
+        elif key == 'ids':
+            return [t.id for t in self.transcripts]
+        elif key == 'phase':
+            return [list(t.phase) for t in self.transcripts]
+        elif key in _LISTS:
+            return [list(getattr(t, key) or []) for t in self.transcripts]
+        elif key in ('codon_start', 'product', 'partialStart', 'partialStop'):
+            return [getattr(t, key) for t in self.transcripts]
+        elif key in SEQUENCES:
+            if key == 'transcript':
+                have = self.type in TRANSCRIBED
+            else:
+                have = self.type == 'mRNA'
+            indexes = list(range(len(self.transcripts))) if have else []
+            return _LazySeqs(self, key, indexes)
+
+    def sequence(self, key, i):
+        '''
+        return transcript, cds_transcript or protein sequence of transcript i
+        nucleotide sequences are forward strand like gff2dict/tbl2dict
+        '''
+        if self.genome is None:
+            raise ValueError('{:} has no genome to derive sequences from'.format(
+                self.locus))
+        t = self.transcripts[i]
+        if key == 'transcript':
+            return self.genome.regions(self.contig, t.block('mRNA'))
+        cds = self.genome.regions(self.contig, t.block('CDS'))
+        if key == 'cds_transcript':
+            return cds
+        from funannotate.seqops import translate
+        return translate(cds, self.strand, t.codon_start - 1)
+
+
+def compactGene(locus, d, genome):
+    '''
+    return a GeneModel for dictionary d if it can be represented exactly,
+    stored sequences are checked against the genome, otherwise return d
+    '''
+    if isinstance(d, GeneModel):
+        return d
+    try:
+        model = GeneModel.fromDict(locus, d, genome=genome)
+    except (ValueError, KeyError, TypeError):
+        return d
+    for key in ('transcript', 'cds_transcript'):
+        if key not in d:
+            continue
+        derived = model[key]
+        if len(derived) != len(d[key]):
+            return d
+        if genome is not None and list(derived) != d[key]:
+            return d
+    if 'protein' in d and len(model['protein']) != len(d['protein']):
+        return d
+    return model
+
+
+def compactGenes(Genes, genome):
+    '''
+    replace the dictionaries in Genes with GeneModels in place
+    '''
+    for k, v in list(Genes.items()):
+        Genes[k] = compactGene(k, v, genome)
+    return Genes
+
+
+def _deepsize(obj, seen=None):
+    # approximate memory footprint of obj and everything it references
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deepsize(k, seen) + _deepsize(v, seen)
+                    for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deepsize(x, seen) for x in obj)
+    elif hasattr(obj, '__slots__') and not isinstance(obj, _LazySeqs):
+        for x in obj.__slots__:
+            if x == 'genome':
+                continue
+            size += _deepsize(getattr(obj, x, None), seen)
+    return size
+
+
+if __name__ == "__main__":
+    # memory benchmark on a synthetic genome
+    # python -m funannotate.genemodel [number of genes]
+    import os
+    import time
+    import random
+    import shutil
+    import doctest
+    import tempfile
+    from funannotate.genomestore import GenomeStore
+    from funannotate.seqops import translate
+    print(doctest.testmod(verbose=0,
+                          optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(42)
+    tmpdir = tempfile.mkdtemp()
+    fasta = os.path.join(tmpdir, 'genome.fa')
+    contigs, per_contig, spacing = [], 2000, 1500
+    table = bytes(bytearray([ord('ACGT'[i % 4]) for i in range(256)]))
+    with open(fasta, 'wb') as outfile:
+        for c in range(0, num, per_contig):
+            name = 'scaffold_{:}'.format(len(contigs) + 1)
+            length = min(per_contig, num - c) * spacing + 1000
+            seq = os.urandom(length).translate(table)
+            outfile.write(b'>' + name.encode('ascii') + b'\n')
+            for i in range(0, length, 80):
+                outfile.write(seq[i:i+80] + b'\n')
+            contigs.append((name, min(per_contig, num - c)))
+    genome = GenomeStore(fasta)
+    Genes = {}
+    count = 0
+    for name, n in contigs:
+        for g in range(n):
+            count += 1
+            locus = 'FUN_{:06d}'.format(count)
+            start = g * spacing + 100
+            exons, pos = [], start
+            for e in range(random.randint(1, 6)):
+                length = random.randint(60, 200)
+                exons.append((pos, pos + length - 1))
+                pos += length + random.randint(40, 80)
+            strand = random.choice('+-')
+            if strand == '-':
+                exons = exons[::-1]
+            transcript = genome.regions(name, exons)
+            Genes[locus] = {
+                'name': None, 'type': 'mRNA', 'transcript': [transcript],
+                'cds_transcript': [transcript],
+                'protein': [translate(transcript, strand, 0)],
+                '5UTR': [[]], '3UTR': [[]], 'codon_start': [1],
+                'ids': [locus + '-T1'], 'CDS': [list(exons)],
+                'mRNA': [list(exons)], 'strand': strand,
+                'location': (min(x[0] for x in exons), max(x[1] for x in exons)),
+                'contig': name, 'product': ['hypothetical protein'],
+                'source': 'funannotate', 'phase': [[0] * len(exons)],
+                'db_xref': [[]], 'go_terms': [[]], 'note': [[]],
+                'partialStart': [False], 'partialStop': [False],
+                'pseudo': False}
+    t0 = time.time()
+    dict_size = _deepsize(Genes)
+    t_size = time.time() - t0
+    t0 = time.time()
+    Models = compactGenes(dict(Genes), genome)
+    t_compact = time.time() - t0
+    model_size = _deepsize(Models)
+    assert all(isinstance(x, GeneModel) for x in Models.values())
+    print('{:,} genes on {:,} contigs'.format(count, len(contigs)))
+    print('{:<22} {:>10.1f} MB'.format('dict of dicts', dict_size / 1e6))
+    print('{:<22} {:>10.1f} MB ({:.1f}x smaller, converted in {:.2f} sec)'.format(
+        'dict of GeneModels', model_size / 1e6, dict_size / float(model_size),
+        t_compact))
+    # writers give identical output from both representations
+    try:
+        from funannotate.library import dict2gff3, dict2gtf
+        t0 = time.time()
+        dict2gff3(Genes, os.path.join(tmpdir, 'dict.gff3'))
+        t_dict = time.time() - t0
+        t0 = time.time()
+        dict2gff3(Models, os.path.join(tmpdir, 'model.gff3'))
+        t_model = time.time() - t0
+        dict2gtf(Genes, os.path.join(tmpdir, 'dict.gtf'))
+        dict2gtf(Models, os.path.join(tmpdir, 'model.gtf'))
+        for ext in ['gff3', 'gtf']:
+            with open(os.path.join(tmpdir, 'dict.'+ext)) as a:
+                with open(os.path.join(tmpdir, 'model.'+ext)) as b:
+                    assert a.read() == b.read()
+        print('dict2gff3 {:.2f} sec from dicts, {:.2f} sec from GeneModels'.format(
+            t_dict, t_model))
+    except ImportError:
+        pass
+    genome.close()
+    shutil.rmtree(tmpdir)
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+'''
+Single pass genome scanner for soft-masking, assembly gap and assembly
+statistics.
+
+Each contig is scanned as bytes with compiled regular expressions, so repeats
+(lowercase runs) and assembly gaps (N runs) come back as (start, end) runs
+rather than one Python int per masked base. Memory is bounded by the size of
+the largest contig.
+
+>>> scan = scanContig('chr1', b'ACGTacgtNNNNACnnGT')
+>>> scan.length, scan.gc, scan.masked, scan.gaps
+(18, 6, 6, 6)
+>>> scan.repeats
+[(4, 7), (14, 15)]
+>>> scan.gap_runs
+[(8, 11), (14, 15)]
+>>> stats = AssemblyStats()
+>>> stats.add(scan)
+>>> stats.n50()
+18
+
+Runs are 0-based and inclusive, which is what the repeat/gap BED files
+written by library.checkMask and friends have always contained.
+
+scanGenome() does the same over a memory-mapped GenomeStore with a process
+pool; workers scan byte ranges of the mapped file and return flat interval
+arrays, the parent merges runs split at window boundaries and yields one
+ContigScan per contig in the requested order.
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import re
+import sys
+import multiprocessing
+from array import array
+from collections import namedtuple, OrderedDict
+
+__all__ = ['ContigScan', 'AssemblyStats', 'scanContig', 'scanFasta',
+           'scanGenome', 'readFasta', 'nxStats']
+
+_LOWER = re.compile(b'[a-z]+')
+_LOWER_OR_GAP = re.compile(b'[a-zN]+')
+_GAP = re.compile(b'[Nn]+')
+
+ContigScan = namedtuple('ContigScan', ['name', 'length', 'gc', 'masked',
+                                       'gaps', 'repeats', 'gap_runs'])
+
+
+def _bytes(seq):
+    if not isinstance(seq, bytes):
+        return seq.encode('ascii', 'replace')
+    return seq
+
+
+def _native(b):
+    if sys.version_info[0] >= 3:
+        return b.decode('ascii', 'replace')
+    return b
+
+
+def _runs(regex, seq, offset=0):
+    return [(m.start() + offset, m.end() - 1 + offset)
+            for m in regex.finditer(seq)]
+
+
+def gcCount(seq):
+    # same letters Bio.SeqUtils.GC counts
+    return sum(seq.count(x) for x in (b'G', b'C', b'g', b'c', b'S', b's'))
+
+
+def scanContig(name, seq, repeats=True, gaps=True, gaps_are_masked=False,
+               offset=0):
+    '''
+    scan a single contig, returns ContigScan
+    repeats/gaps toggle collecting the runs, masked counts are always returned
+    gaps_are_masked counts uppercase N as masked too (checkMasklowMem style)
+    offset is added to the run coordinates when scanning a slice of a contig
+    '''
+    seq = _bytes(seq)
+    regex = _LOWER_OR_GAP if gaps_are_masked else _LOWER
+    if repeats:
+        repeat_runs = _runs(regex, seq, offset)
+        masked = sum(e - s + 1 for s, e in repeat_runs)
+    else:
+        repeat_runs = []
+        masked = sum(len(x) for x in regex.findall(seq))
+    if gaps:
+        gap_runs = _runs(_GAP, seq, offset)
+        gap_bp = sum(e - s + 1 for s, e in gap_runs)
+    else:
+        gap_runs = []
+        gap_bp = seq.count(b'N') + seq.count(b'n')
+    return ContigScan(name, len(seq), gcCount(seq), masked, gap_bp,
+                      repeat_runs, gap_runs)
+
+
+def readFasta(input):
+    '''
+    stream (name, sequence bytes) from a FASTA file or open binary handle,
+    name is the first word of the header like SeqIO record.id
+    '''
+    if hasattr(input, 'read'):
+        handle, close = input, False
+    else:
+        handle, close = open(input, 'rb'), True
+    try:
+        name, chunks = None, []
+        for line in handle:
+            line = _bytes(line)
+            if line.startswith(b'>'):
+                if name is not None:
+                    yield name, b''.join(chunks)
+                header = line[1:].strip()
+                name = _native(header.split()[0]) if header else ''
+                chunks = []
+            elif name is not None:
+                chunks.append(line.strip())
+        if name is not None:
+            yield name, b''.join(chunks)
+    finally:
+        if close:
+            handle.close()
+
+
+def scanFasta(input, repeats=True, gaps=True, gaps_are_masked=False):
+    '''
+    yield a ContigScan for every record in a FASTA file
+    '''
+    for name, seq in readFasta(input):
+        yield scanContig(name, seq, repeats=repeats, gaps=gaps,
+                         gaps_are_masked=gaps_are_masked)
+
+
+def _flatten(runs):
+    flat = array(str('l'))
+    for s, e in runs:
+        flat.append(s)
+        flat.append(e)
+    return flat
+
+
+def _mergeRuns(runs, flat):
+    # append flat (start, end) pairs, joining runs split at a window edge
+    for i in range(0, len(flat), 2):
+        s, e = flat[i], flat[i+1]
+        if runs and runs[-1][1] + 1 == s:
+            runs[-1] = (runs[-1][0], e)
+        else:
+            runs.append((s, e))
+
+
+_STORE = None
+
+
+def _initScanWorker(store):
+    global _STORE
+    _STORE = store
+
+
+def _scanSegments(args):
+    segments, gaps_are_masked = args
+    results = []
+    for name, start, end in segments:
+        seq = _STORE.fetch_bytes(name, start + 1, end)
+        scan = scanContig(name, seq, gaps_are_masked=gaps_are_masked,
+                          offset=start)
+        results.append((name, scan.gc, scan.masked, scan.gaps,
+                        _flatten(scan.repeats), _flatten(scan.gap_runs)))
+    return results
+
+
+def _segments(store, order, window):
+    # split contigs into windows and pack small contigs together so every
+    # task scans roughly window bp
+    tasks, current, size = [], [], 0
+    for name in order:
+        length = store.length(name)
+        for start in range(0, max(length, 1), window):
+            end = min(start + window, length)
+            current.append((name, start, end))
+            size += end - start
+            if size >= window:
+                tasks.append(current)
+                current, size = [], 0
+    if current:
+        tasks.append(current)
+    return tasks
+
+
+def scanGenome(store, cpus=1, order=None, gaps_are_masked=False,
+               window=5000000):
+    '''
+    scan a GenomeStore (or FASTA filename) with a pool of cpus workers,
+    yields one ContigScan per contig in order (default FASTA order)
+    '''
+    if not hasattr(store, 'fetch_bytes'):
+        from funannotate.genomestore import GenomeStore
+        store = GenomeStore(store)
+    if order is None:
+        order = store.keys()
+    tasks = [(x, gaps_are_masked) for x in _segments(store, order, window)]
+    pool = None
+    if cpus > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(processes=min(cpus, len(tasks)),
+                                    initializer=_initScanWorker,
+                                    initargs=(store,))
+        results = pool.imap(_scanSegments, tasks)
+    else:
+        _initScanWorker(store)
+        results = (_scanSegments(x) for x in tasks)
+    try:
+        current = None
+        for batch in results:
+            for name, gc, masked, gaps, repeats, gap_runs in batch:
+                if current is None or current[0] != name:
+                    if current is not None:
+                        yield ContigScan(*current)
+                    current = [name, store.length(name), 0, 0, 0, [], []]
+                current[2] += gc
+                current[3] += masked
+                current[4] += gaps
+                _mergeRuns(current[5], repeats)
+                _mergeRuns(current[6], gap_runs)
+        if current is not None:
+            yield ContigScan(*current)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def _weightedMedian(lengths, total):
+    # value at the middle of the list where each length x is repeated x times
+    # this is how funannotate has always reported N50
+    def _at(pos):
+        cum = 0
+        for x in lengths:
+            cum += x
+            if cum > pos:
+                return x
+    mid = total // 2
+    if total % 2 == 0:
+        return int((_at(mid) + _at(mid - 1)) / 2)
+    return int(_at(mid))
+
+
+def nxStats(lengths):
+    '''
+    return (N50, L50) for a list of contig lengths
+    '''
+    lengths = sorted(lengths)
+    total = sum(lengths)
+    if total == 0:
+        return 0, 0
+    N50 = _weightedMedian(lengths, total)
+    cum, L50 = 0, 0
+    for x in reversed(lengths):
+        cum += x
+        L50 += 1
+        if cum * 2 >= total:
+            break
+    return N50, L50
+
+
+class AssemblyStats(object):
+    '''
+    accumulates ContigScan results into whole assembly statistics
+    '''
+
+    def __init__(self):
+        self.contigs = OrderedDict()
+        self.lengths = []
+        self.length = 0
+        self.gc = 0
+        self.masked = 0
+        self.gaps = 0
+
+    def add(self, scan):
+        self.contigs[scan.name] = scan.length
+        self.lengths.append(scan.length)
+        self.length += scan.length
+        self.gc += scan.gc
+        self.masked += scan.masked
+        self.gaps += scan.gaps
+
+    @property
+    def largest(self):
+        return max(self.lengths) if self.lengths else 0
+
+    def n50(self):
+        return nxStats(self.lengths)[0]
+
+    def l50(self):
+        return nxStats(self.lengths)[1]
+
+    def percentGC(self):
+        if not self.length:
+            return 0.0
+        return self.gc * 100 / float(self.length)
+
+    def fractionMasked(self):
+        if not self.length:
+            return 0.0
+        return self.masked / float(self.length)
+
+
+if __name__ == "__main__":
+    import doctest
+    print(doctest.testmod(verbose=0,
+                          optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+'''
+GenomeStore gives random access to regions of a (potentially very large)
+genome FASTA file without loading the sequences into memory.
+
+On first use a samtools-compatible .fai offset index is written next to the
+FASTA file (or kept in memory if that location is not writable) and the FASTA
+file is memory-mapped, so extracting a CDS costs roughly the size of the CDS
+rather than the size of the genome.
+
+>>> genome = GenomeStore('genome.fasta')
+>>> genome.length('scaffold_1')
+1534222
+>>> genome.fetch('scaffold_1', 1, 10)       # 1-based, inclusive
+'ATGCGATTAC'
+>>> genome.regions('scaffold_1', [(1, 3), (7, 10)])
+'ATGTTAC'
+
+Contigs with irregular line lengths cannot be addressed by offset arithmetic,
+those few records are read once and held in memory instead.
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import os
+import sys
+import mmap
+from collections import OrderedDict, namedtuple
+
+__all__ = ['GenomeStore', 'FaidxRecord', 'openGenome']
+
+
+# one line of a .fai index
+FaidxRecord = namedtuple('FaidxRecord', ['name', 'length', 'offset',
+                                         'linebases', 'linewidth'])
+
+
+def _native(b):
+    # return a native str from the bytes stored on disk
+    if sys.version_info[0] >= 3:
+        return b.decode('ascii', 'replace')
+    return b
+
+
+def buildFaidx(fasta):
+    '''
+    scan a FASTA file once and return (OrderedDict of FaidxRecord, irregular)
+    where irregular is a set of contig names whose line lengths are not
+    uniform and therefore can not be addressed by byte offset
+    '''
+    index = OrderedDict()
+    irregular = set()
+    name, length, offset, linebases, linewidth = (None, 0, 0, 0, 0)
+    lastbases, ragged = None, False
+    pos = 0
+    with open(fasta, 'rb') as infile:
+        for line in infile:
+            linelen = len(line)
+            if line.startswith(b'>'):
+                if name is not None:
+                    index[name] = FaidxRecord(name, length, offset,
+                                              linebases, linewidth)
+                    if ragged:
+                        irregular.add(name)
+                header = line[1:].strip()
+                name = _native(header.split()[0]) if header else ''
+                length, linebases, linewidth = (0, 0, 0)
+                lastbases, ragged = None, False
+                offset = pos + linelen
+            elif name is not None:
+                bases = len(line.rstrip(b'\r\n'))
+                if bases == 0:
+                    # blank lines are only tolerated at the end of a record
+                    if linebases == 0:
+                        ragged = True
+                    lastbases = 0
+                    pos += linelen
+                    continue
+                if linebases == 0:
+                    linebases, linewidth = bases, linelen
+                elif lastbases is not None and lastbases != linebases:
+                    # a previous line was short, so this is not regular
+                    ragged = True
+                elif bases > linebases:
+                    ragged = True
+                elif line.endswith(b'\n') and linelen - bases != linewidth - linebases:
+                    ragged = True
+                if bases != linebases:
+                    lastbases = bases
+                length += bases
+            pos += linelen
+    if name is not None:
+        index[name] = FaidxRecord(name, length, offset, linebases, linewidth)
+        if ragged:
+            irregular.add(name)
+    return index, irregular
+
+
+def readFaidx(faidx):
+    index = OrderedDict()
+    with open(faidx, 'r') as infile:
+        for line in infile:
+            cols = line.rstrip('\r\n').split('\t')
+            if len(cols) < 5:
+                continue
+            index[cols[0]] = FaidxRecord(cols[0], int(cols[1]), int(cols[2]),
+                                         int(cols[3]), int(cols[4]))
+    return index
+
+
+def writeFaidx(index, faidx):
+    with open(faidx, 'w') as outfile:
+        for k, v in index.items():
+            outfile.write('{:}\t{:}\t{:}\t{:}\t{:}\n'.format(
+                v.name, v.length, v.offset, v.linebases, v.linewidth))
+
+
+class GenomeStore(object):
+    '''
+    memory-mapped, .fai indexed genome FASTA file
+    coordinates are 1-based and inclusive, like GFF3/TBL
+    '''
+
+    def __init__(self, fasta, faidx=None, write_index=True):
+        self.filename = os.path.abspath(fasta)
+        self.faidx = faidx or self.filename + '.fai'
+        self._handle = None
+        self._mmap = None
+        self._cache = {}
+        self.index, irregular = self._load_index(write_index)
+        # contigs that can't be addressed by offset are loaded once
+        for name in irregular:
+            self._cache[name] = self._read_record(name)
+
+    def _load_index(self, write_index):
+        if os.path.isfile(self.faidx) and \
+                os.path.getmtime(self.faidx) >= os.path.getmtime(self.filename):
+            index = readFaidx(self.faidx)
+            if index or os.path.getsize(self.filename) == 0:
+                return index, set()
+        index, irregular = buildFaidx(self.filename)
+        if write_index and not irregular:
+            try:
+                writeFaidx(index, self.faidx)
+            except (IOError, OSError):
+                pass
+        return index, irregular
+
+    def _open(self):
+        if self._mmap is None:
+            self._handle = open(self.filename, 'rb')
+            if os.path.getsize(self.filename) > 0:
+                self._mmap = mmap.mmap(self._handle.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            else:
+                self._mmap = b''
+        return self._mmap
+
+    def _read_record(self, name):
+        # slow path for records with ragged line lengths
+        rec = self.index[name]
+        seq = []
+        with open(self.filename, 'rb') as infile:
+            infile.seek(rec.offset)
+            for line in infile:
+                if line.startswith(b'>'):
+                    break
+                seq.append(line.rstrip(b'\r\n'))
+        return b''.join(seq)
+
+    def _offset(self, rec, pos):
+        # byte offset of 0-based position pos in the record
+        return rec.offset + (pos // rec.linebases) * rec.linewidth + \
+            pos % rec.linebases
+
+    def close(self):
+        if self._mmap is not None and not isinstance(self._mmap, bytes):
+            self._mmap.close()
+        if self._handle is not None:
+            self._handle.close()
+        self._mmap, self._handle = None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        # mmap objects can't be pickled, re-open lazily in child processes
+        state = self.__dict__.copy()
+        state['_handle'], state['_mmap'] = None, None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return list(self.index.keys())
+
+    def length(self, name):
+        return self.index[name].length
+
+    def lengths(self):
+        '''
+        return OrderedDict of contig: length in FASTA file order
+        '''
+        return OrderedDict((k, v.length) for k, v in self.index.items())
+
+    def fetch_bytes(self, name, start, end):
+        '''
+        return raw bytes of 1-based inclusive region, clamped to the contig
+        '''
+        rec = self.index[name]
+        s = max(start - 1, 0)
+        e = min(end, rec.length)
+        if e <= s:
+            return b''
+        if name in self._cache:
+            return self._cache[name][s:e]
+        if rec.linebases == 0:
+            return b''
+        mm = self._open()
+        raw = mm[self._offset(rec, s):self._offset(rec, e - 1) + 1]
+        if e - s != len(raw):
+            raw = raw.replace(b'\n', b'').replace(b'\r', b'')
+        return raw
+
+    def fetch(self, name, start, end):
+        '''
+        return 1-based inclusive region as a str, preserving case
+        '''
+        return _native(self.fetch_bytes(name, start, end))
+
+    def sequence(self, name):
+        return self.fetch(name, 1, self.index[name].length)
+
+    def regions(self, name, coordinates):
+        '''
+        concatenate list of (start, end) tuples in ascending order, this
+        mirrors library.getSeqRegions
+        '''
+        return _native(b''.join(
+            self.fetch_bytes(name, x[0], x[1])
+            for x in sorted(coordinates, key=lambda tup: tup[0])))
+
+    def items(self):
+        '''
+        iterate over (name, sequence) tuples in FASTA file order
+        '''
+        for name in self.index:
+            yield name, self.sequence(name)
+
+
+def openGenome(fasta):
+    '''
+    return a GenomeStore for a FASTA filename, or fasta if it already is one
+    '''
+    if isinstance(fasta, GenomeStore):
+        return fasta
+    return GenomeStore(fasta)
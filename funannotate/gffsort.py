@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+'''
+Coordinate sorting of GFF3 and Augustus hints files with bounded memory.
+
+Records are read into a buffer until it reaches the memory budget, the
+buffer is sorted and spilled to a temporary run file, and the runs are then
+combined with a k-way merge. Files smaller than the budget are sorted in
+memory without touching the disk. Sorting is stable, records that compare
+equal keep their input order.
+
+The budget is set with the memory argument or the FUNANNOTATE_SORT_MEMORY
+environment variable (e.g. 500M, 4G), default 1G.
+
+sortHints() orders hints by contig, feature, end and start, as the
+sort -n -k 4,4 | sort -s -n -k 5,5 | sort -s -n -k 3,3 | sort -s -k 1,1
+pipeline and the natsorted version of it that predict used before.
+
+>>> hints = ['scaffold_10\\tb2h\\tintron\\t50\\t90\\t0\\t+\\t.\\tsrc=E',
+...          'scaffold_2\\tb2h\\tintron\\t70\\t80\\t0\\t+\\t.\\tsrc=E',
+...          'scaffold_2\\tb2h\\tintron\\t60\\t80\\t0\\t+\\t.\\tsrc=E',
+...          'scaffold_2\\tb2h\\texonpart\\t10\\t400\\t0\\t+\\t.\\tsrc=E']
+>>> for x in externalSort(hints, hintsKey, memory=1):
+...     print(' '.join(x.split('\\t')[:5]))
+scaffold_2 b2h exonpart 10 400
+scaffold_2 b2h intron 60 80
+scaffold_2 b2h intron 70 80
+scaffold_10 b2h intron 50 90
+
+sortGFF() keeps each gene model (a feature without a Parent and all of the
+lines that follow it) together and orders the models by the contig order of
+a FASTA index, then by start, like bedtools sort -faidx.
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import os
+import sys
+import heapq
+import tempfile
+from natsort import natsort_keygen
+from funannotate.annotcache import parseSize
+
+if sys.version_info[0] < 3:
+    import cPickle as pickle
+else:
+    import pickle
+
+__all__ = ['externalSort', 'hintsKey', 'sortHints', 'gffBlocks',
+           'contigOrder', 'sortGFF', 'sortMemory']
+
+DEFAULT_MEMORY = 1024**3
+# python objects take several times the size of the text they hold
+OVERHEAD = 10
+# run files merged at once
+MAX_RUNS = 64
+
+
+def sortMemory(memory=None):
+    '''
+    memory budget in bytes from the argument or FUNANNOTATE_SORT_MEMORY
+    '''
+    if memory is None:
+        memory = os.environ.get('FUNANNOTATE_SORT_MEMORY', DEFAULT_MEMORY)
+    try:
+        return parseSize(memory)
+    except ValueError:
+        return DEFAULT_MEMORY
+
+
+def _spill(buffer, tmpdir):
+    # write a sorted buffer of (key, record) to a run file, return the path
+    fd, path = tempfile.mkstemp(suffix='.sortrun', dir=tmpdir)
+    with os.fdopen(fd, 'wb') as outfile:
+        pickler = pickle.Pickler(outfile, pickle.HIGHEST_PROTOCOL)
+        for item in buffer:
+            pickler.dump(item)
+            pickler.clear_memo()
+    return path
+
+
+def _readRun(path, run):
+    # (key, run, position, record) so the merge never compares records and
+    # equal keys come out in input order
+    with open(path, 'rb') as infile:
+        unpickler = pickle.Unpickler(infile)
+        position = 0
+        while True:
+            try:
+                key, record = unpickler.load()
+            except EOFError:
+                break
+            yield key, run, position, record
+            position += 1
+
+
+def externalSort(records, key, memory=None, tmpdir=None):
+    '''
+    yield records (strings) sorted by key(record), spilling sorted runs to
+    tmpdir when the records do not fit in the memory budget
+    '''
+    limit = sortMemory(memory)
+    runs, buffer, size = [], [], 0
+    try:
+        for record in records:
+            buffer.append((key(record), record))
+            size += len(record) * OVERHEAD
+            if size >= limit:
+                buffer.sort(key=lambda x: x[0])
+                runs.append(_spill(buffer, tmpdir))
+                buffer, size = [], 0
+        buffer.sort(key=lambda x: x[0])
+        if not runs:
+            for k, record in buffer:
+                yield record
+            return
+        if buffer:
+            runs.append(_spill(buffer, tmpdir))
+            buffer = []
+        # merge consecutive runs into one until they can all be open at once
+        while len(runs) > MAX_RUNS:
+            group = runs[:MAX_RUNS]
+            merged = heapq.merge(*[_readRun(x, i) for i, x in enumerate(group)])
+            path = _spill(((k, record) for k, run, position, record in merged),
+                          tmpdir)
+            for x in group:
+                os.remove(x)
+            runs = [path] + runs[MAX_RUNS:]
+        merged = heapq.merge(*[_readRun(x, i) for i, x in enumerate(runs)])
+        for k, run, position, record in merged:
+            yield record
+    finally:
+        for x in runs:
+            try:
+                os.remove(x)
+            except OSError:
+                pass
+
+
+_natkey = natsort_keygen()
+_NUMBER = _natkey('1')[0] if _natkey('1') == (_natkey('1')[0], 1) else None
+_KEYS = {}
+
+
+def _numberKey(text):
+    # same as the natsort key, without natsort for the common plain integer
+    if _NUMBER is not None and text.isdigit():
+        return (_NUMBER, int(text))
+    return _natkey(text)
+
+
+def _wordKey(text):
+    # contig and feature names repeat, so cache their natsort keys
+    try:
+        return _KEYS[text]
+    except KeyError:
+        _KEYS[text] = _natkey(text)
+        return _KEYS[text]
+
+
+def hintsKey(line):
+    '''
+    sort key of a hints line: contig, feature, end, start in natural order
+    '''
+    cols = line.rstrip('\r\n').split('\t')
+    return (_wordKey(cols[0]), _wordKey(cols[2]), _numberKey(cols[4]),
+            _numberKey(cols[3]))
+
+
+def sortHints(input, output, memory=None):
+    '''
+    sort an Augustus hints file, blank lines are dropped
+    '''
+    tmpdir = os.path.dirname(os.path.abspath(output))
+    with open(input, 'r') as infile:
+        lines = (x.rstrip('\r\n') for x in infile if x.strip())
+        with open(output, 'w') as outfile:
+            for line in externalSort(lines, hintsKey, memory=memory,
+                                     tmpdir=tmpdir):
+                outfile.write('{:}\n'.format(line))
+
+
+def gffBlocks(handle):
+    '''
+    yield the text of the comment lines before the first feature (may be
+    empty) and then one block per gene model: a feature without a Parent
+    and all of the lines up to the next one
+    '''
+    block, header = [], True
+    for line in handle:
+        if not header and not line.startswith('#') and line.strip():
+            cols = line.split('\t')
+            if len(cols) > 8 and 'Parent=' not in cols[8] and block:
+                yield ''.join(block)
+                block = []
+        elif header and not line.startswith('#') and line.strip():
+            yield ''.join(block)
+            block, header = [], False
+        block.append(line)
+    if block or header:
+        yield ''.join(block)
+
+
+def contigOrder(order):
+    '''
+    contig name -> position, from a FASTA index (.fai) or a FASTA file
+    '''
+    if order.endswith('.fai'):
+        names = []
+        with open(order, 'r') as infile:
+            for line in infile:
+                if line.strip():
+                    names.append(line.split('\t')[0])
+    else:
+        from funannotate.genomestore import GenomeStore
+        names = GenomeStore(order).keys()
+    return dict((x, i) for i, x in enumerate(names))
+
+
+def sortGFF(input, output, order, memory=None):
+    '''
+    sort gene models in a GFF3 file by the contig order of a FASTA index,
+    raises KeyError for a contig that is not in the index
+    '''
+    contigs = contigOrder(order)
+
+    def _blockKey(block):
+        for line in block.split('\n'):
+            if line.strip() and not line.startswith('#'):
+                cols = line.split('\t')
+                return (contigs[cols[0]], int(cols[3]))
+        return (-1, 0)
+
+    tmpdir = os.path.dirname(os.path.abspath(output))
+    with open(input, 'r') as infile:
+        blocks = gffBlocks(infile)
+        with open(output, 'w') as outfile:
+            outfile.write(next(blocks))
+            for block in externalSort(blocks, _blockKey, memory=memory,
+                                      tmpdir=tmpdir):
+                outfile.write(block)
+
+
+if __name__ == "__main__":
+    # doctests, then sort a hints file with a small budget and check the
+    # result against natsorted: python -m funannotate.gffsort hints [memory]
+    import time
+    import doctest
+    print(doctest.testmod(verbose=0,
+                          optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
+    if len(sys.argv) > 1:
+        import operator
+        from natsort import natsorted
+        memory = sys.argv[2] if len(sys.argv) > 2 else '64M'
+        output = sys.argv[1] + '.sorted'
+        t0 = time.time()
+        sortHints(sys.argv[1], output, memory=memory)
+        t_sort = time.time() - t0
+        t0 = time.time()
+        with open(sys.argv[1], 'r') as infile:
+            data = [x.rstrip().split('\t') for x in infile if x.strip()]
+        for col in [3, 4, 2, 0]:
+            data = natsorted(data, key=operator.itemgetter(col))
+        t_legacy = time.time() - t0
+        with open(output, 'r') as infile:
+            assert [x.rstrip('\n').split('\t') for x in infile] == data
+        os.remove(output)
+        print('{:,} hints: {:.3f} sec gffsort ({:} budget), {:.3f} sec '
+              'natsorted in memory'.format(len(data), t_sort, memory, t_legacy))
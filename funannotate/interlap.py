@@ -89,11 +89,31 @@ Test every item in the InterLap. These 50K queries take < 0.5 seconds:
 >>> list(inter.closest((10, 13)))
 [(9, 9)]
 
+`NCLInterLap` has the same API but indexes the intervals as a nested
+containment list, so a query costs a binary search plus the number of hits
+no matter how long the longest interval is. `InterLap` scans back from the
+query by the length of the longest interval ever added, which makes every
+query on a contig slow once a single 2 Mb cluster or transcript alignment is
+in the tree. `find` yields hits in the same order as `InterLap`.
+
+>>> nc = NCLInterLap(ranges)
+>>> nc.add([(20, 22, {'info': 'hi'}), (2, 3, {'info': 'hello'}), (9, 9)])
+>>> nc.add((1, 200000000))
+>>> list(nc.find((21, 21)))
+[(1, 200000000), (20, 22, {'info': 'hi'})]
+>>> (200000001, 200000001) in nc, (200000000, 200000000) in nc
+(False, True)
+>>> for s, e in ranges:
+...     assert list(nc.find((s, e)))[-1][:2] >= (s, e)
+>>> list(NCLInterLap([(2, 3), (20, 22), (9, 9)]).closest((11, 12)))
+[(9, 9)]
+
 """
+from bisect import bisect_left, bisect_right
 from itertools import groupby
 from operator import itemgetter
 
-__all__ = ['InterLap']
+__all__ = ['InterLap', 'NCLInterLap', 'overlapPairs']
 
 __version__ = '0.2.6'
 
@@ -194,6 +214,32 @@ class InterLap(object):
                     yield ival
                 break
 
+    def join(self, other, fraction=0.0, other_fraction=0.0):
+        """Yield (element, [overlapping elements of other]) for every element.
+
+        Equivalent to ``(x, list(other.find(x)))`` for x in self, but found
+        the same way as overlapPairs instead of querying other one interval
+        at a time. With fraction or other_fraction only the hits covering at
+        least that fraction of the element, or of the hit, are returned.
+        """
+        # both lists are kept sorted by start, so the hits starting before x
+        # come first and the ones starting inside x are a slice of other
+        iset, oset = self._iset, other._iset
+        starts = [x[0] for x in iset]
+        ostarts = [o[0] for o in oset]
+        hits = [[] for x in iset]
+        for o in oset:
+            for i in range(bisect_right(starts, o[0]),
+                           bisect_right(starts, o[1])):
+                hits[i].append(o)
+        for x, h in zip(iset, hits):
+            h.extend(oset[bisect_left(ostarts, x[0]):
+                          bisect_right(ostarts, x[1])])
+            if fraction > 0 or other_fraction > 0:
+                h = [o for o in h if _covers(x[0], x[1], o[0], o[1], fraction)
+                     and _covers(o[0], o[1], x[0], x[1], other_fraction)]
+            yield x, h
+
     def __contains__(self, other):
         """Indicate whether `other` overlaps any elements in the tree."""
         iset = self._iset
@@ -217,6 +263,163 @@ class InterLap(object):
         return iter(self._iset)
 
 
+class NCLInterLap(InterLap):
+
+    """InterLap backed by a nested containment list (see module docstring).
+
+    The index is rebuilt on the first query after intervals are added, so
+    load the tree first and query it afterwards.
+    """
+
+    def __init__(self, ranges=()):
+        ranges = list(ranges)
+        super(NCLInterLap, self).__init__(ranges)
+        self._index = None
+
+    def add(self, ranges):
+        r"""Add a single (or many) [start, end, \*] item to the tree."""
+        super(NCLInterLap, self).add(ranges)
+        self._index = None
+
+    update = add
+
+    def _build(self):
+        # intervals sorted by start then longest first, so a parent always
+        # comes before the intervals it contains. Every sublist is stored as
+        # parallel lists of starts, ends, positions in _iset and the sublist
+        # number of the children (0, the top level, if none); within a sublist
+        # both starts and ends increase so it can be bisected on either.
+        iset = self._iset
+        order = sorted(range(len(iset)), key=lambda i: (iset[i][0], -iset[i][1]))
+        lists = [([], [], [], [])]
+        stack = []  # (end, sublist of its children or 0, owner, slot)
+        for i in order:
+            start, end = iset[i][0], iset[i][1]
+            while stack and stack[-1][0] < end:
+                stack.pop()
+            if stack:
+                top = stack[-1]
+                if not top[1]:
+                    lists.append(([], [], [], []))
+                    sub = len(lists) - 1
+                    lists[top[2]][3][top[3]] = sub
+                    stack[-1] = (top[0], sub, top[2], top[3])
+                parent = stack[-1][1]
+            else:
+                parent = 0
+            starts, ends, idx, kids = lists[parent]
+            starts.append(start)
+            ends.append(end)
+            idx.append(i)
+            kids.append(0)
+            stack.append((end, 0, parent, len(kids) - 1))
+        # running maximum of the ends in start order, for closest()
+        starts = [iset[i][0] for i in order]
+        maxends, m = [], None
+        for i in order:
+            m = iset[i][1] if m is None else max(m, iset[i][1])
+            maxends.append(m)
+        self._index = (lists, starts, maxends)
+        return self._index
+
+    def _hits(self, start, end):
+        # positions in _iset of every interval overlapping [start, end]
+        lists = (self._index or self._build())[0]
+        starts, ends, idx, kids = lists[0]
+        i = bisect_left(ends, start)
+        r = bisect_right(starts, end)
+        hits = idx[i:r]
+        todo = [k for k in kids[i:r] if k]
+        while todo:
+            starts, ends, idx, kids = lists[todo.pop()]
+            i = bisect_left(ends, start)
+            r = bisect_right(starts, end)
+            hits.extend(idx[i:r])
+            todo.extend([k for k in kids[i:r] if k])
+        hits.sort()
+        return hits
+
+    def find(self, other):
+        """Return an interable of elements that overlap other in the tree."""
+        iset = self._iset
+        for i in self._hits(other[0], other[1]):
+            yield iset[i]
+
+    def closest(self, other):
+        """Yield the overlapping elements, or else all of the nearest ones."""
+        if other in self:
+            for o in self.find(other):
+                yield o
+            return
+        lists, starts, maxends = self._index or self._build()
+        if not starts:
+            return
+        # nothing overlaps, so everything starting before other ends before it
+        dist = []
+        i = bisect_left(starts, other[0])
+        if i:
+            dist.append(other[0] - maxends[i - 1])
+        if i < len(starts):
+            dist.append(starts[i] - other[1])
+        d = min(dist)
+        for o in self.find((other[0] - d, other[1] + d)):
+            yield o
+
+    def __contains__(self, other):
+        """Indicate whether `other` overlaps any elements in the tree."""
+        # only the top level needs checking, children lie inside their parent
+        starts, ends = (self._index or self._build())[0][0][:2]
+        i = bisect_left(ends, other[0])
+        return i < len(starts) and starts[i] <= other[1]
+
+
+def _covers(s, e, os, oe, fraction):
+    # overlap of [os, oe] with [s, e] is at least fraction of the length of
+    # [s, e], both measured as end - start like loci.overlapFraction; a single
+    # position is covered by anything that overlaps it
+    if fraction <= 0 or e <= s:
+        return True
+    return (min(e, oe) - max(s, os)) / float(e - s) >= fraction
+
+
+def overlapPairs(a, b, a_fraction=0.0, b_fraction=0.0):
+    """Yield (i, j) for every a[i] that overlaps b[j].
+
+    a and b are sequences of (start, end, *) like the contents of an InterLap
+    and overlap is tested the same way as InterLap.find. A pair is only
+    yielded if the overlap covers at least a_fraction of a[i] and b_fraction
+    of b[j]. Every pair is found once, from the interval that starts first:
+    the intervals of the other set starting inside it are a contiguous run
+    of its start-sorted list, so the cost is two binary searches per
+    interval plus the number of pairs however long the intervals are.
+
+    >>> genes = [(1, 100, 'g1'), (150, 300, 'g2'), (400, 500, 'g3')]
+    >>> models = [(50, 160, 'm1'), (290, 410, 'm2'), (420, 430, 'm3')]
+    >>> sorted(overlapPairs(genes, models))
+    [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2)]
+    >>> sorted(overlapPairs(genes, models, a_fraction=0.1))
+    [(0, 0), (2, 1), (2, 2)]
+    >>> sorted(overlapPairs(genes, models, b_fraction=0.5))
+    [(2, 2)]
+    """
+    a_order = sorted(range(len(a)), key=lambda i: a[i][0])
+    b_order = sorted(range(len(b)), key=lambda j: b[j][0])
+    a_starts = [a[i][0] for i in a_order]
+    b_starts = [b[j][0] for j in b_order]
+    for i in a_order:
+        s, e = a[i][0], a[i][1]
+        for j in b_order[bisect_left(b_starts, s):bisect_right(b_starts, e)]:
+            if _covers(s, e, b[j][0], b[j][1], a_fraction) and \
+                    _covers(b[j][0], b[j][1], s, e, b_fraction):
+                yield i, j
+    for j in b_order:
+        s, e = b[j][0], b[j][1]
+        for i in a_order[bisect_right(a_starts, s):bisect_right(a_starts, e)]:
+            if _covers(a[i][0], a[i][1], s, e, a_fraction) and \
+                    _covers(s, e, a[i][0], a[i][1], b_fraction):
+                yield i, j
+
+
 def overlaps(s1, e1, s2, e2):
     """
     >>> overlaps(2, 4, 3, 5)
@@ -325,9 +528,59 @@ class Interval(object):
 
 
 if __name__ == "__main__":
+    # doctests, then InterLap vs NCLInterLap on genes mixed with a few long
+    # intervals and join vs find on two gene sets:
+    # python -m funannotate.interlap [number of intervals]
+    import sys
     import time
+    import random
     t0 = time.time()
     import doctest
     print(doctest.testmod(verbose=0,
                           optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
     print(time.time() - t0)
+
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    random.seed(42)
+    genes = []
+    for i in range(num):
+        start = random.randint(1, 100000000)
+        genes.append((start, start + random.randint(500, 20000), 'gene%i' % i))
+    queries = [(x[0], x[1]) for x in random.sample(genes, min(num, 20000))]
+    queries += [(x, x + 100) for x in random.sample(range(100000000), 20000)]
+    for nlong in [0, 1, 10, 100]:
+        ranges = list(genes)
+        for i in range(nlong):
+            start = random.randint(1, 98000000)
+            ranges.append((start, start + random.randint(500000, 2000000),
+                           'long%i' % i))
+        results = []
+        for cls in [InterLap, NCLInterLap]:
+            t0 = time.time()
+            inter = cls(ranges)
+            found = [list(inter.find(q)) for q in queries]
+            t_find = time.time() - t0
+            t0 = time.time()
+            contained = [q in inter for q in queries]
+            t_contains = time.time() - t0
+            results.append((found, contained))
+            print('{:<12} {:>6,} intervals {:>4} long {:>8.3f} sec find '
+                  '{:>8.3f} sec contains'.format(cls.__name__, len(ranges),
+                                                 nlong, t_find, t_contains))
+        assert results[0] == results[1]
+
+    # bulk join of two gene sets against a find() per gene
+    models = []
+    for x in genes:
+        shift = random.randint(-1000, 1000)
+        models.append((x[0] + shift, x[1] + shift, x[2]))
+    a, b = NCLInterLap(genes), NCLInterLap(models)
+    t0 = time.time()
+    loop = [(x, list(b.find(x))) for x in a]
+    t_loop = time.time() - t0
+    t0 = time.time()
+    joined = list(a.join(b))
+    t_join = time.time() - t0
+    assert loop == joined
+    print('{:,} x {:,} genes: {:.3f} sec find loop, {:.3f} sec join'.format(
+        len(genes), len(models), t_loop, t_join))
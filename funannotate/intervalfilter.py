@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+'''
+In-process replacement for the bedtools intersect calls used to filter gene
+models against repeats, assembly gaps and antiSMASH clusters.
+
+BED and GFF3 files are read into Region tuples, GFF3 start coordinates are
+converted to 0-based like bedtools does, and the overlaps are found with
+interlap.overlapPairs instead of running bedtools and parsing its output.
+The semantics follow bedtools intersect: intervals are half-open, they
+overlap if they share at least one base, strand is ignored, a minimum
+overlap fraction is measured against the length of the A interval and each
+B interval is tested on its own. Zero length BED intervals (start == end)
+are widened by one base on either side, as bedtools does for insertions.
+
+>>> genes = parseRegions(['chr1\\tEVM\\tgene\\t101\\t200\\t.\\t+\\t.\\tID=g1;',
+...                       'chr1\\tEVM\\tgene\\t301\\t400\\t.\\t-\\t.\\tID=g2;'])
+>>> repeats = parseRegions(['chr1\\t100\\t185', 'chr1\\t250\\t320'])
+>>> [(x.start, x.end, y.start, y.end, bp) for x, y, bp in overlapping(genes, repeats)]
+[(100, 200, 100, 185, 85), (300, 400, 250, 320, 20)]
+>>> [(x.start, y.start) for x, y, bp in overlapping(genes, repeats, fraction=0.5)]
+[(100, 100)]
+>>> for x in nonOverlapping(genes, parseRegions(['chr1\\t399\\t399'])):
+...     print(x.line.split('\\t')[-1])
+ID=g1;
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from collections import namedtuple, defaultdict
+from funannotate.interlap import overlapPairs
+
+__all__ = ['Region', 'readRegions', 'parseRegions', 'overlapping',
+           'nonOverlapping']
+
+# start is 0-based and end exclusive, line is the input line without the
+# line ending so it can be written back unchanged
+Region = namedtuple('Region', ['contig', 'start', 'end', 'line'])
+
+
+def _isGFF(cols):
+    return len(cols) == 9 and cols[3].isdigit() and cols[4].isdigit() and \
+        cols[6] in ['+', '-', '.', '?']
+
+
+def parseRegions(lines):
+    '''
+    list of Region from BED or GFF3 lines, headers, comments and blank
+    lines are skipped
+    '''
+    regions = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith(('#', 'track', 'browser')):
+            continue
+        cols = line.split('\t')
+        if _isGFF(cols):
+            start, end = int(cols[3]) - 1, int(cols[4])
+        else:
+            start, end = int(cols[1]), int(cols[2])
+        regions.append(Region(cols[0], start, end, line))
+    return regions
+
+
+def readRegions(input):
+    '''
+    list of Region from a BED or GFF3 file, in file order
+    '''
+    with open(input, 'r') as infile:
+        return parseRegions(infile)
+
+
+def _widen(x):
+    # bedtools treats a zero length interval as the bases either side of it
+    if x.start == x.end:
+        return x.start - 1, x.end + 1
+    return x.start, x.end
+
+
+def _byContig(regions):
+    # contig -> (closed (start, end) spans, positions in regions)
+    contigs = defaultdict(lambda: ([], []))
+    for i, x in enumerate(regions):
+        start, end = _widen(x)
+        spans, index = contigs[x.contig]
+        spans.append((start, end - 1))
+        index.append(i)
+    return contigs
+
+
+def overlapping(a, b, fraction=0.0):
+    '''
+    yield (x, y, overlap bp) for every region x in a overlapping a region y
+    in b, like bedtools intersect -wo [-f fraction] -a a -b b; pairs come
+    in the order of a and then of b
+    '''
+    contigs = _byContig(b)
+    pairs = []
+    for contig, (spans, index) in _byContig(a).items():
+        if contig not in contigs:
+            continue
+        others, oindex = contigs[contig]
+        for i, j in overlapPairs(spans, others):
+            pairs.append((index[i], oindex[j]))
+    pairs.sort()
+    for i, j in pairs:
+        xs, xe = _widen(a[i])
+        ys, ye = _widen(b[j])
+        bp = min(xe, ye) - max(xs, ys)
+        if fraction > 0 and bp / float(xe - xs) < fraction:
+            continue
+        yield a[i], b[j], bp
+
+
+def nonOverlapping(a, *others):
+    '''
+    yield the regions of a that do not overlap any region in others, like
+    bedtools intersect -v -a a -b others...
+    '''
+    b = []
+    for regions in others:
+        b.extend(regions)
+    contigs = _byContig(b)
+    hit = set()
+    for contig, (spans, index) in _byContig(a).items():
+        if contig in contigs:
+            hit.update(index[i] for i, j in overlapPairs(spans, contigs[contig][0]))
+    for i, x in enumerate(a):
+        if i not in hit:
+            yield x
+
+
+if __name__ == "__main__":
+    import doctest
+    print(doctest.testmod(verbose=0,
+                          optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
@@ -13,16 +13,29 @@ import shutil
 import platform
 import multiprocessing
 import itertools
+import functools
 import hashlib
 import math
 import gzip
 import operator
 import textwrap
 import errno
+import tempfile
+from contextlib import contextmanager
 from natsort import natsorted
 import funannotate.resources as resources
-from funannotate.interlap import InterLap
-from collections import defaultdict
+from funannotate.interlap import InterLap, NCLInterLap
+from funannotate.genomestore import GenomeStore, openGenome
+from funannotate.seqops import RevComp, translate, translateBatch
+from funannotate.genomescan import AssemblyStats, scanContig, scanFasta, scanGenome
+from funannotate.genemodel import GeneModel, compactGene
+from funannotate.annotcache import AnnotationCache, cached, fileHash, PARSER_VERSION
+from funannotate.__version__ import __version__
+from funannotate.genbank import (formatRecord, goNotes, linkageEvidence, readGenBank,
+                                 GBFeature, extractFeature, fromSeqFeature)
+from funannotate.intervalfilter import readRegions, overlapping, nonOverlapping
+import funannotate.gffsort as gffsort
+from collections import defaultdict, namedtuple
 import warnings
 from Bio import SeqIO
 with warnings.catch_warnings():
@@ -780,6 +793,30 @@ def readBlocks2(source, startpattern, endpattern):
     yield buffer
 
 
+@contextmanager
+def openLines(input):
+    '''
+    iterate over the lines of a filename, an open file or a list of lines
+    '''
+    if isinstance(input, (list, tuple)) or hasattr(input, 'read'):
+        yield input
+    else:
+        with open(input, 'r') as infile:
+            yield infile
+
+
+@contextmanager
+def openOutput(output):
+    '''
+    open a filename for writing, an open file is used as is and left open
+    '''
+    if hasattr(output, 'write'):
+        yield output
+    else:
+        with open(output, 'w') as outfile:
+            yield outfile
+
+
 def empty_line_sep(line):
     return line == '\n'
 
@@ -1313,16 +1350,14 @@ def gb2output(input, output1, output2, output3):
 
 
 def sortGFF(input, output, order):
-    cmd = ['bedtools', 'sort', '-header', '-faidx', order, '-i', input]
-    with open(output, 'w') as out:
-        proc = subprocess.Popen(cmd, stdout=out, stderr=subprocess.PIPE)
-    stderr = proc.communicate()
-    if stderr:
-        if stderr[0] == None:
-            if stderr[1] != '':
-                log.error(
-                    "Sort GFF failed, unreferenced scaffold present in gene predictions, check logfile")
-                sys.exit(1)
+    # order is the FASTA index (.fai) or FASTA file giving the contig order
+    try:
+        gffsort.sortGFF(input, output, order)
+    except KeyError as e:
+        log.debug("{:} not found in {:}".format(e, order))
+        log.error(
+            "Sort GFF failed, unreferenced scaffold present in gene predictions, check logfile")
+        sys.exit(1)
 
 
 def checkGenBank(input):
@@ -1380,11 +1415,15 @@ def BamHeaderTest(genome, mapping):
         for rec in SeqIO.parse(input, 'fasta'):
             if rec.id not in genome_headers:
                 genome_headers.append(rec.id)
-    # get list of fasta headers from BAM
-    bam_headers = []
+    # get list of fasta headers from BAM, of a bgzip BAM only the blocks holding
+    # the header are read, pybam.read takes an uncompressed BAM too
     with open(mapping, 'rb') as bamin:
-        bam = pybam.read(bamin)
-        bam_headers = bam.file_chromosomes
+        bgzip = bamin.read(4) == b'\x1f\x8b\x08\x04'
+    if bgzip:
+        bam_headers = pybam.indexed(mapping).file_chromosomes
+    else:
+        with open(mapping, 'rb') as bamin:
+            bam_headers = pybam.read(bamin).file_chromosomes
     # make sure the bam headers is a list
     if not type(bam_headers) is list:
         log.error(
@@ -1406,11 +1445,22 @@ def mapCount(input, location_dict, output):
     import funannotate.pybam as pybam
     # parse with pybam and count coverage (pileup)
     Counts = {}
-    for aln in pybam.read(os.path.realpath(input)):
-        if not aln.sam_rname in Counts:
-            Counts[aln.sam_rname] = 1
-        else:
-            Counts[aln.sam_rname] += 1
+    if pybam.find_index(os.path.realpath(input)):
+        # mapped + unmapped reads placed on each transcript, straight from the index
+        bam = pybam.indexed(os.path.realpath(input))
+        for name in bam.file_chromosomes:
+            placed = bam.counts(name)
+            if placed is None:  # index without read counts
+                Counts = {}
+                break
+            if sum(placed) > 0:
+                Counts[name] = sum(placed)
+    if not Counts:
+        for aln in pybam.read(os.path.realpath(input), decompressor='threads'):
+            if not aln.sam_rname in Counts:
+                Counts[aln.sam_rname] = 1
+            else:
+                Counts[aln.sam_rname] += 1
     with open(output, 'w') as outfile:
         outfile.write("#mRNA-ID\tgene-ID\tLocation\tTPM\n")
         for k, v in natsorted(location_dict.items()):
@@ -1453,7 +1503,7 @@ def bam2gff3(input, output):
     count = 0
     with open(output, 'w') as gffout:
         gffout.write('##gff-version 3\n')
-        for aln in pybam.read(os.path.realpath(input)):
+        for aln in pybam.read(os.path.realpath(input), decompressor='threads'):
             if aln.sam_flag == 0:
                 strand = '+'
             elif aln.sam_flag == 16:
@@ -1545,7 +1595,7 @@ def bam2ExonsHints(input, gff3, hints):
     with open(gff3, 'w') as gffout:
         gffout.write('##gff-version 3\n')
         with open(hints, 'w') as hintsout:
-            for num, aln in enumerate(pybam.read(os.path.realpath(input))):
+            for num, aln in enumerate(pybam.read(os.path.realpath(input), decompressor='threads')):
                 if aln.sam_flag == 0:
                     strand = '+'
                 elif aln.sam_flag == 16:
@@ -1677,56 +1727,6 @@ def combineTranscripts(minimap, gmap, output):
                             contig, source, feature, start, end, score, strand, phase, i+1, Target))
 
 
-def RevComp(s):
-    rev_comp_lib = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'U': 'A', 'M': 'K', 'R': 'Y', 'W': 'W',
-                    'S': 'S', 'Y': 'R', 'K': 'M', 'V': 'B', 'H': 'D', 'D': 'H', 'B': 'V', 'X': 'X', 'N': 'N'}
-    cseq = ''
-    n = len(s)
-    s = s.upper()
-    for i in range(0, n):
-        c = s[n-i-1]
-        cseq += rev_comp_lib[c]
-    return cseq
-
-
-def translate(cDNA, strand, phase):
-    '''
-    translate cDNA into protein sequence
-    trying to see if I can speed this up over Biopython
-    '''
-    def _split(str, num):
-        return [str[start:start+num] for start in range(0, len(str), num)]
-    codon_table = {'TTT': 'F', 'TTC': 'F', 'TTA': 'L', 'TTG': 'L', 'TCT': 'S',
-                   'TCC': 'S', 'TCA': 'S', 'TCG': 'S', 'TAT': 'Y', 'TAC': 'Y',
-                   'TGT': 'C', 'TGC': 'C', 'TGG': 'W', 'CTT': 'L', 'CTC': 'L',
-                   'CTA': 'L', 'CTG': 'L', 'CCT': 'P', 'CCC': 'P', 'CCA': 'P',
-                   'CCG': 'P', 'CAT': 'H', 'CAC': 'H', 'CAA': 'Q', 'CAG': 'Q',
-                   'CGT': 'R', 'CGC': 'R', 'CGA': 'R', 'CGG': 'R', 'ATT': 'I',
-                   'ATC': 'I', 'ATA': 'I', 'ATG': 'M', 'ACT': 'T', 'ACC': 'T',
-                   'ACA': 'T', 'ACG': 'T', 'AAT': 'N', 'AAC': 'N', 'AAA': 'K',
-                   'AAG': 'K', 'AGT': 'S', 'AGC': 'S', 'AGA': 'R', 'AGG': 'R',
-                   'GTT': 'V', 'GTC': 'V', 'GTA': 'V', 'GTG': 'V', 'GCT': 'A',
-                   'GCC': 'A', 'GCA': 'A', 'GCG': 'A', 'GAT': 'D', 'GAC': 'D',
-                   'GAA': 'E', 'GAG': 'E', 'GGT': 'G', 'GGC': 'G', 'GGA': 'G',
-                   'GGG': 'G', 'TAA': '*', 'TAG': '*', 'TGA': '*'}
-    if strand == '-' or strand == -1:
-        seq = RevComp(cDNA)
-    else:
-        seq = cDNA
-    seq = seq[phase:]
-    # map seq to proteins
-    protSeq = []
-    for i in _split(seq, 3):
-        if len(i) == 3:
-            iSeq = i.upper()
-            if iSeq in codon_table:
-                aa = codon_table[iSeq]
-                protSeq.append(aa)
-            else:
-                protSeq.append('X')
-    return ''.join(protSeq)
-
-
 def extend2stop(seqDict, header, coordinates, strand, phase, protLen):
     '''
     try to extend a CDS lacking a stop to find a stop codon
@@ -1737,8 +1737,12 @@ def extend2stop(seqDict, header, coordinates, strand, phase, protLen):
     sorted_coordinates = sorted(coordinates, key=lambda tup: tup[0])
     if strand == '+':
         newStop = sorted_coordinates[-1][1]+60
-        if newStop > len(seqDict[header]):
-            newStop = len(seqDict[header])
+        if isinstance(seqDict, GenomeStore):
+            seqLen = seqDict.length(header)
+        else:
+            seqLen = len(seqDict[header])
+        if newStop > seqLen:
+            newStop = seqLen
         lastTup = (sorted_coordinates[-1][0], newStop)
         if len(sorted_coordinates) > 1:
             newCoords = sorted_coordinates[:-1]
@@ -1783,8 +1787,10 @@ def extend2stop(seqDict, header, coordinates, strand, phase, protLen):
 
 
 def getSeqRegions(SeqRecordDict, header, coordinates):
-    # takes SeqRecord dictionary or Index, returns sequence string
+    # takes GenomeStore, SeqRecord dictionary or Index, returns sequence string
     # coordinates is a list of tuples [(1,10), (20,30)]
+    if isinstance(SeqRecordDict, GenomeStore):
+        return SeqRecordDict.regions(header, coordinates)
     result = ''
     sorted_coordinates = sorted(coordinates, key=lambda tup: tup[0])
     for x in sorted_coordinates:
@@ -1797,65 +1803,63 @@ def convertgff2tbl(gff, prefix, fasta, prots, trans, tblout, external=False):
     from collections import OrderedDict
     '''
     function to convert directly from gff to tbl
+    the GFF3 file is streamed one contig at a time
     '''
 
     def _sortDict(d):
         return (d[1]['contig'], d[1]['location'][0])
 
-    # load GFF annotations into funannotate dictionary
-    Genes = {}
-    Genes = gff2dict(gff, fasta, Genes)
     # get scaffold names/lengths
-    scaffLen = {}
-    with open(fasta, 'r') as seqin:
-        for record in SeqIO.parse(seqin, 'fasta'):
-            if not record.id in scaffLen:
-                scaffLen[record.id] = len(record.seq)
-    # get partialStart/stop info and load scaffold dictionary with coordinates of Genes
-    sGenes = sorted(Genes.iteritems(), key=_sortDict)
-    sortedGenes = OrderedDict(sGenes)
-    renamedGenes = {}
-    scaff2genes = {}
-    counter = 1
-    for k, v in sortedGenes.items():
-        if not prefix:
-            locusTag = k
-        else:
-            locusTag = prefix+'_'+str(counter).zfill(6)
-        if not locusTag in renamedGenes:
-            renamedGenes[locusTag] = v
-            if not v['contig'] in scaff2genes:
-                scaff2genes[v['contig']] = [locusTag]
-            else:
-                scaff2genes[v['contig']].append(locusTag)
-        counter += 1
-    if external:
-        log.info('Found {:,} gene models from GFF3 annotation'.format(len(sortedGenes)))
-    dicts2tbl(renamedGenes, scaff2genes, scaffLen, 'CFMR', '12345', [], tblout, external=external)
-    #transcript to geneID dictionary
+    scaffLen = GenomeStore(fasta).lengths()
+    total = 0
     geneDB = {}
-    for k,v in renamedGenes.items():
-        for x in v['ids']:
-            if not x in geneDB:
-                geneDB[x] = k
-
-    # write to protein and transcripts
-    with open(prots, 'w') as protout:
-        with open(trans, 'w') as tranout:
-            for k, v in natsorted(Genes.items()):
+    protSpool, transSpool = BlockSpool(), BlockSpool()
+    counter = 1
+    with TblWriter(tblout, scaffLen, 'CFMR', '12345', external=external) as tbl:
+        # load GFF annotations into funannotate dictionary
+        for contig, seq, Genes in iterContigs(gff, fasta, order=sorted, sequence=False, compact=True):
+            total += len(Genes)
+            # get partialStart/stop info and load scaffold dictionary with coordinates of Genes
+            renamedGenes = OrderedDict()
+            for k, v in sorted(Genes.iteritems(), key=_sortDict):
+                if not prefix:
+                    locusTag = k
+                else:
+                    locusTag = prefix+'_'+str(counter).zfill(6)
+                if not locusTag in renamedGenes:
+                    renamedGenes[locusTag] = v
+                counter += 1
+            tbl.write(renamedGenes)
+            #transcript to geneID dictionary
+            for k,v in renamedGenes.items():
+                for x in v['ids']:
+                    if not x in geneDB:
+                        geneDB[x] = k
+            # write to protein and transcripts
+            for k, v in Genes.items():
                 if v['pseudo'] and v['pseudo'] == True:
                     continue
-                for i, x in enumerate(v['ids']):
-                    try:
-                        Transcript = str(v['transcript'][i])
-                    except IndexError:
-                        print(k,v)
-                    tranout.write('>%s %s\n%s\n' % (x, k, softwrap(Transcript)))
-                    if v['type'] == 'mRNA':
-                        Prot = v['protein'][i]
-                        protout.write('>%s %s\n%s\n' % (x, k, softwrap(Prot)))
+                with protSpool.block(k) as protout:
+                    with transSpool.block(k) as tranout:
+                        for i, x in enumerate(v['ids']):
+                            try:
+                                Transcript = str(v['transcript'][i])
+                            except IndexError:
+                                print(k,v)
+                            tranout.write('>%s %s\n%s\n' % (x, k, softwrap(Transcript)))
+                            if v['type'] == 'mRNA':
+                                Prot = v['protein'][i]
+                                protout.write('>%s %s\n%s\n' % (x, k, softwrap(Prot)))
+        if external:
+            log.info('Found {:,} gene models from GFF3 annotation'.format(total))
+    with open(prots, 'w') as protout:
+        protSpool.copy(protout)
+    with open(trans, 'w') as tranout:
+        transSpool.copy(tranout)
+    protSpool.close()
+    transSpool.close()
 
-    return len(Genes), geneDB
+    return total, geneDB
 
 
 def tblfilter(input, remove, output):
@@ -2075,9 +2079,9 @@ def dict2nucleotides2(input, prots, trans, cdstrans):
     function to generate protein and transcripts from dictionary
     '''
     # write to protein and transcripts
-    with open(prots, 'w') as protout:
-        with open(trans, 'w') as tranout:
-            with open(cdstrans, 'w') as cdsout:
+    with openOutput(prots) as protout:
+        with openOutput(trans) as tranout:
+            with openOutput(cdstrans) as cdsout:
                 for k, v in natsorted(input.items()):
                     if 'pseudo' in v:
                         if v['pseudo']:
@@ -2119,25 +2123,325 @@ def tbl2allout(input, fasta, GFF, Proteins, Transcripts, cdsTranscripts, DNA):
     '''
     function to convert NCBI tbl format directly to other formats; this will be a replacement
     for Genbank derived output files and correctly parse/print the transcript/proteins
+    the tbl file is streamed one contig at a time
     '''
-    Genes = {}
-    Genes = tbl2dict(input, fasta, Genes)
-    # write GFF
-    dict2gff3(Genes, GFF)
-    # write to protein and transcripts
-    dict2nucleotides2(Genes, Proteins, Transcripts, cdsTranscripts)
+    with GFF3Writer(GFF) as gff:
+        with NucleotideWriter(Proteins, Transcripts, cdsTranscripts) as nucl:
+            for contig, seq, Genes in iterContigs(input, fasta, tbl=True, sequence=False, compact=True):
+                # write GFF
+                gff.write(Genes)
+                # write to protein and transcripts
+                nucl.write(Genes)
     # copy over DNA fasta file
     shutil.copyfile(fasta, DNA)
 
 
-def tbl2dict(input, fasta, Genes):
+def indexContigs(input, tbl=False):
+    '''
+    scan a GFF3 (or NCBI tbl) file once and return an OrderedDict of
+    contig: [(offset, length)] byte ranges holding the lines of that contig,
+    consecutive lines of a contig are a single range so sorted input gives
+    one range per contig
+    '''
+    from collections import OrderedDict
+    index = OrderedDict()
+    contig, start, pos = None, 0, 0
+    with open(input, 'rb') as infile:
+        for line in infile:
+            name = contig
+            if tbl:
+                if line.startswith(b'>Feature'):
+                    name = line.rstrip().split(b' ')[-1].decode('utf-8')
+            elif line.startswith(b'##FASTA'):
+                break
+            elif not line.startswith(b'#') and line.strip():
+                name = line.split(b'\t', 1)[0].decode('utf-8')
+            if name != contig:
+                if contig is not None:
+                    index.setdefault(contig, []).append((start, pos - start))
+                contig, start = name, pos
+            pos += len(line)
+    if contig is not None:
+        index.setdefault(contig, []).append((start, pos - start))
+    return index
+
+
+def contigLines(input, ranges):
+    '''
+    return list of lines stored at the byte ranges from indexContigs
+    '''
+    lines = []
+    with open(input, 'rb') as infile:
+        for offset, length in ranges:
+            infile.seek(offset)
+            lines.extend(infile.read(length).decode('utf-8').splitlines(True))
+    return lines
+
+
+def missingContigs(input, contigs, SeqRecords, fatal=False):
+    '''
+    log an error for the contigs of annotation file input that are not in the
+    genome FASTA, their gene models are dropped or with fatal=True the script
+    exits. returns list of missing contigs
+    '''
+    missing = [x for x in contigs if not x in SeqRecords]
+    if missing:
+        names = ', '.join(missing[:10]) + (', ...' if len(missing) > 10 else '')
+        if fatal:
+            log.error('{:,} contigs in {:} are not in the genome FASTA, exiting: {:}'.format(
+                len(missing), input, names))
+            sys.exit(1)
+        log.error('{:,} contigs in {:} are not in the genome FASTA, gene models on them were dropped: {:}'.format(
+            len(missing), input, names))
+    return missing
+
+
+def iterContigs(inputs, fasta, tbl=False, order=None, sequence=True, **kwargs):
+    '''
+    stream funannotate gene dictionaries one contig at a time from one or more
+    GFF3 (or NCBI tbl) files, yields (contig, sequence, Genes) so only a single
+    contig of models is held in memory. order is a list of contigs or a function
+    to sort the contig names with, default natsorted. sequence=False yields None
+    instead of the contig sequence, kwargs are passed to gff2dict/tbl2dict
+    '''
+    if not isinstance(inputs, (list, tuple)):
+        inputs = [inputs]
+    SeqRecords = openGenome(fasta)
+    indexes = [indexContigs(x, tbl=tbl) for x in inputs]
+    contigs = set()
+    for input, index in zip(inputs, indexes):
+        # tbl2dict cannot translate models without their contig sequence
+        missingContigs(input, index.keys(), SeqRecords, fatal=tbl)
+        contigs.update(index.keys())
+    if order is None:
+        order = natsorted
+    if callable(order):
+        order = order(contigs)
+    for contig in order:
+        if not contig in contigs or not contig in SeqRecords:
+            continue
+        Genes = {}
+        for input, index in zip(inputs, indexes):
+            if contig in index:
+                lines = contigLines(input, index[contig])
+                if tbl:
+                    Genes = tbl2dict(lines, SeqRecords, Genes, **kwargs)
+                else:
+                    Genes = gff2dict(lines, SeqRecords, Genes, **kwargs)
+        if sequence:
+            yield contig, SeqRecords.sequence(contig), Genes
+        else:
+            yield contig, None, Genes
+
+
+def _byContig(Genes):
+    from collections import OrderedDict
+    contigs = OrderedDict()
+    for k, v in Genes.items():
+        if not v['contig'] in contigs:
+            contigs[v['contig']] = OrderedDict()
+        contigs[v['contig']][k] = v
+    return contigs
+
+
+class BlockSpool(object):
+    '''
+    temporary file of named blocks of text, lets output be generated in one
+    order and written in another without holding it in memory
+    '''
+
+    def __init__(self):
+        self.handle = tempfile.TemporaryFile(mode='w+')
+        self.blocks = {}
+
+    @contextmanager
+    def block(self, key):
+        self.handle.seek(0, 2)
+        start = self.handle.tell()
+        yield self.handle
+        self.handle.seek(0, 2)
+        if not key in self.blocks:
+            self.blocks[key] = []
+        self.blocks[key].append((start, self.handle.tell() - start))
+
+    def copy(self, output, order=None):
+        '''
+        write blocks to open file output, default in natsorted key order
+        '''
+        if order is None:
+            order = natsorted(self.blocks)
+        for key in order:
+            for start, length in self.blocks.get(key, []):
+                self.handle.seek(start)
+                output.write(self.handle.read(length))
+
+    def close(self):
+        self.handle.close()
+
+
+class TblWriter(object):
+    '''
+    writer counterpart of dicts2tbl, write() takes funannotate dictionaries a
+    contig at a time (genes in the order they should be written) and close()
+    writes the tbl file as dicts2tbl would have with all genes at once
+    '''
+
+    def __init__(self, output, scaffLen, SeqCenter, SeqRefNum, skipList=[], annotations=False, external=False):
+        self.output = output
+        self.scaffLen = scaffLen
+        self.SeqCenter = SeqCenter
+        self.SeqRefNum = SeqRefNum
+        self.skipList = skipList
+        self.annotations = annotations
+        self.external = external
+        self.skipped = [0, 0, 0]
+        self.spool = BlockSpool()
+
+    def write(self, Genes):
+        for contig, genes in _byContig(Genes).items():
+            with self.spool.block(contig) as out:
+                counts = dicts2tbl(genes, {contig: list(genes.keys())}, self.scaffLen, self.SeqCenter,
+                                   self.SeqRefNum, self.skipList, out, annotations=self.annotations,
+                                   external=self.external, report=False)
+            self.skipped = [x + y for x, y in zip(self.skipped, counts)]
+
+    def close(self):
+        with open(self.output, 'w') as tbl:
+            self.spool.copy(tbl)
+        self.spool.close()
+        tblSkipped(*self.skipped)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+        else:
+            self.spool.close()
+
+
+class GFF3Writer(object):
+    '''
+    writer counterpart of dict2gff3, takes funannotate dictionaries a contig
+    at a time and writes the same GFF3 file on close()
+    '''
+
+    def __init__(self, output):
+        self.output = output
+        self.spool = BlockSpool()
+
+    def write(self, Genes):
+        for contig, genes in _byContig(Genes).items():
+            with self.spool.block(contig) as out:
+                dict2gff3(genes, out, header=False)
+
+    def close(self):
+        with open(self.output, 'w') as gffout:
+            gffout.write("##gff-version 3\n")
+            self.spool.copy(gffout)
+        self.spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+        else:
+            self.spool.close()
+
+
+class NucleotideWriter(object):
+    '''
+    writer counterpart of dict2nucleotides2, takes funannotate dictionaries a
+    contig at a time and writes the protein, transcript and CDS FASTA files
+    in natsorted locus order on close()
+    '''
+
+    def __init__(self, prots, trans, cdstrans):
+        self.outputs = [prots, trans, cdstrans]
+        self.spools = [BlockSpool(), BlockSpool(), BlockSpool()]
+
+    def write(self, Genes):
+        prots, trans, cdstrans = self.spools
+        for k, v in Genes.items():
+            with prots.block(k) as protout:
+                with trans.block(k) as tranout:
+                    with cdstrans.block(k) as cdsout:
+                        dict2nucleotides2({k: v}, protout, tranout, cdsout)
+
+    def close(self):
+        for output, spool in zip(self.outputs, self.spools):
+            with open(output, 'w') as outfile:
+                spool.copy(outfile)
+            spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+        else:
+            for spool in self.spools:
+                spool.close()
+
+
+_GBK_STORE = None
+
+
+def _initGBKworker(store):
+    global _GBK_STORE
+    _GBK_STORE = store
+
+
+def _tbl2gbkContig(args):
+    contig, tbl, ranges, organism, strain, isolate, linkage = args
+    lines = contigLines(tbl, ranges) if ranges else []
+    Genes = tbl2dict(lines, _GBK_STORE, {}) if lines else {}
+    return formatRecord(contig, _GBK_STORE.sequence(contig), Genes, organism,
+                        strain=strain, isolate=isolate, linkage=linkage,
+                        goNames=goNotes(lines))
+
+
+def tbl2gbk(tbl, fasta, output, organism, strain=None, isolate=None, parameters='-l paired-ends', cpus=1):
+    '''
+    write GenBank flat file from NCBI tbl and genome FASTA without tbl2asn,
+    contigs are converted in parallel and written in FASTA order. parameters
+    is the tbl2asn parameter string, the -l linkage evidence is used for gaps
+    '''
+    SeqRecords = openGenome(fasta)
+    index = indexContigs(tbl, tbl=True)
+    linkage = linkageEvidence(parameters)
+    tasks = [(x, tbl, index.get(x), organism, strain, isolate, linkage) for x in SeqRecords.keys()]
+    pool = None
+    if cpus > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(processes=min(cpus, len(tasks)), initializer=_initGBKworker,
+                                    initargs=(SeqRecords,))
+        results = pool.imap(_tbl2gbkContig, tasks)
+    else:
+        _initGBKworker(SeqRecords)
+        results = (_tbl2gbkContig(x) for x in tasks)
+    try:
+        with open(output, 'w') as outfile:
+            for record in results:
+                outfile.write(record)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def tbl2dict(input, fasta, Genes, compact=False):
     '''
     need a method to convert directly from NCBI tbl format to several output formats
     to avoid conversion problems with GBK files that have mutliple transcripts
     if can load funannotate dictionary directly from tbl format, then can write the other
     formats directly
+    compact=True returns read-only GeneModels that derive sequences from the genome
     '''
-    with open(input, 'r') as infile:
+    with openLines(input) as infile:
         contig = ''
         for item in readBlocks2(infile, '>Feature', '\tgene\n'):
             if item[0].startswith('>Feature'):  # this will be contig header block
@@ -2293,8 +2597,10 @@ def tbl2dict(input, fasta, Genes):
                                          'db_xref': dbxref, 'go_terms': go_terms, 'EC_number': ECnum, 'note': note,
                                          'partialStart': fivepartial, 'partialStop': threepartial, 'pseudo': False}
     # now we need to sort coordinates, get protein/transcript sequences and capture UTRs
-    SeqRecords = SeqIO.to_dict(SeqIO.parse(fasta, 'fasta'))
+    SeqRecords = openGenome(fasta)
     for k, v in Genes.items():
+        if isinstance(v, GeneModel):
+            continue
         for i in range(0, len(v['ids'])):
             if v['type'] == 'mRNA' or v['type'] == 'tRNA':
                 if v['strand'] == '+':
@@ -2335,12 +2641,15 @@ def tbl2dict(input, fasta, Genes):
                     Genes[k]['3UTR'].append(ThreeUTR)
                 except ValueError:
                     print('ERROR', k, v)
+        if compact:
+            Genes[k] = compactGene(k, v, SeqRecords)
     return Genes
 
 
-def dicts2tbl(genesDict, scaff2genes, scaffLen, SeqCenter, SeqRefNum, skipList, output, annotations=False, external=False):
+def dicts2tbl(genesDict, scaff2genes, scaffLen, SeqCenter, SeqRefNum, skipList, output, annotations=False, external=False, report=True):
     '''
     function to take funannotate annotation dictionaries and convert to NCBI tbl output
+    output can be a filename or open file, returns number of (pseudo, nocds, duplicates) skipped
     '''
     duplicates = 0
     pseudo = 0
@@ -2370,7 +2679,7 @@ def dicts2tbl(genesDict, scaff2genes, scaffLen, SeqCenter, SeqRefNum, skipList,
         else:
             return False
 
-    with open(output, 'w') as tbl:
+    with openOutput(output) as tbl:
         for k, v in natsorted(scaff2genes.items()):
             tbl.write('>Feature %s\n' % k)
             tbl.write('1\t%s\tREFERENCE\n' % scaffLen.get(k))
@@ -2628,13 +2937,15 @@ def dicts2tbl(genesDict, scaff2genes, scaffLen, SeqCenter, SeqRefNum, skipList,
                                 geneInfo['location'][1], geneInfo['location'][0], geneInfo['type']))
                             tbl.write('\t\t\tproduct\t%s\n' %
                                       geneInfo['product'][i])
+    if report:
+        tblSkipped(pseudo, nocds, duplicates)
+    return pseudo, nocds, duplicates
+
+
+def tblSkipped(pseudo, nocds, duplicates):
     if any(i > 0 for i in [duplicates, pseudo, nocds]):
-        try:
-            print('Skipped {:,} annotations: {:,} pseudo genes; {:,} no CDS; {:,} duplicated features'.format(
-                sum([pseudo, nocds, duplicates]), pseudo, nocds, duplicates))
-        except NameError:
-            print('Skipped {:,} annotations: {:,} pseudo genes; {:,} no CDS; {:,} duplicated features'.format(
-                sum([pseudo, nocds, duplicates]), pseudo, nocds, duplicates))
+        print('Skipped {:,} annotations: {:,} pseudo genes; {:,} no CDS; {:,} duplicated features'.format(
+            sum([pseudo, nocds, duplicates]), pseudo, nocds, duplicates))
 
 
 def GFF2tbl(evm, trnascan, fasta, scaffLen, prefix, Numbering, SeqCenter, SeqRefNum, tblout):
@@ -2642,36 +2953,27 @@ def GFF2tbl(evm, trnascan, fasta, scaffLen, prefix, Numbering, SeqCenter, SeqRef
     '''
     function to take EVM protein models and tRNA scan GFF to produce a GBK tbl file as well
     as a new GFF3 file. The function will also rename locus_id if passed.
+    Models are streamed one contig at a time, contigs are numbered in sorted order
+    which is the order sorting all of the models by contig and location gives
     '''
     def _sortDict(d):
         return (d[1]['contig'], d[1]['location'][1])
 
-    # load GFF into dictionary
-    Genes = {}
-    Genes = gff2dict(evm, fasta, Genes)
-    Genes = gff2dict(trnascan, fasta, Genes)
-
-    # now sort dictionary by contig and location, rename using prefix, translate to protein space to get proper start/stop info
-    sGenes = sorted(Genes.iteritems(), key=_sortDict)
-    sortedGenes = OrderedDict(sGenes)
-    renamedGenes = {}
-    scaff2genes = {}
     count = Numbering
-    for k, v in sortedGenes.items():
-        if prefix:
-            locusTag = prefix+'_'+str(count).zfill(6)
-        else:
-            locusTag = k
-        renamedGenes[locusTag] = v
-        if not v['contig'] in scaff2genes:
-            scaff2genes[v['contig']] = [locusTag]
-        else:
-            scaff2genes[v['contig']].append(locusTag)
-        count += 1
-
-    # write tbl outputfile
-    dicts2tbl(renamedGenes, scaff2genes, scaffLen,
-              SeqCenter, SeqRefNum, [], tblout)
+    with TblWriter(tblout, scaffLen, SeqCenter, SeqRefNum) as tbl:
+        # load GFF into dictionary
+        for contig, seq, Genes in iterContigs([evm, trnascan], fasta, order=sorted, sequence=False, compact=True):
+            # now sort dictionary by location, rename using prefix
+            renamedGenes = OrderedDict()
+            for k, v in sorted(Genes.iteritems(), key=_sortDict):
+                if prefix:
+                    locusTag = prefix+'_'+str(count).zfill(6)
+                else:
+                    locusTag = k
+                renamedGenes[locusTag] = v
+                count += 1
+            # write tbl outputfile
+            tbl.write(renamedGenes)
 
 
 def checkRefSeq(input):
@@ -2745,10 +3047,8 @@ def getGBKLocusTag(input):
 
 def gb2dna(input, output):
     with open(output, 'w') as outfile:
-        with open(input, 'r') as infile:
-            for record in SeqIO.parse(infile, 'genbank'):
-                outfile.write(">%s\n%s\n" %
-                              (record.id, softwrap(str(record.seq))))
+        for record in readGenBank(input):
+            outfile.write(">%s\n%s\n" % (record.id, softwrap(record.seq)))
 
 
 def getID(input, type):
@@ -2850,18 +3150,54 @@ def getID(input, type):
         return locusTag, ID, Parent
 
 
+def gbk2dict(input, dna=None):
+    '''
+    parse GenBank file into funannotate dictionary, returns (genes, scaff2genes, scaffLen)
+    where scaff2genes is contig: [locus tags] in file order, optionally write contigs to dna
+    '''
+    genes = {}
+    scaff2genes = {}
+    scaffLen = {}
+    with openOutput(dna if dna else os.devnull) as dnaout:
+        for record in readGenBank(input):
+            if dna:
+                dnaout.write(">{:}\n{:}\n".format(
+                    record.id, softwrap(record.seq)))
+            Contig = record.id
+            if not Contig in scaffLen:
+                scaffLen[Contig] = len(record.seq)
+            for f in record.features:
+                if f.type == 'gene':
+                    locusTag, ID, Parent = getID(f, f.type)
+                    if not Contig in scaff2genes:
+                        scaff2genes[Contig] = [locusTag]
+                    else:
+                        scaff2genes[Contig].append(locusTag)
+                gb_feature_add2dict(f, record, genes)
+    return genes, scaff2genes, scaffLen
+
+
+def loadGBK(input, dna=None):
+    '''
+    gbk2dict through the on-disk annotation cache, contigs are still written
+    to dna from the GenBank file when the annotation is cached
+    '''
+    parsed = []
+
+    def _parse():
+        parsed.append(True)
+        return gbk2dict(input, dna=dna)
+    result = cached('gbk2dict', [input], _parse)
+    if dna and not parsed:
+        gb2dna(input, dna)
+    return result
+
+
 def gb2nucleotides(input, prots, trans, dna):
     '''
     function to generate protein, transcripts, and contigs from genbank file
     '''
-    genes = {}
-    with open(dna, 'w') as dnaout:
-        with open(input, 'r') as filein:
-            for record in SeqIO.parse(filein, 'genbank'):
-                dnaout.write(">%s\n%s\n" %
-                             (record.id, softwrap(str(record.seq))))
-                for f in record.features:
-                    gb_feature_add2dict(f, record, genes)
+    genes = loadGBK(input, dna=dna)[0]
     # write to protein and transcripts
     dict2nucleotides(genes, prots, trans)
     return len(genes)
@@ -2899,14 +3235,7 @@ def gb2gffnuc(input, gff, prots, trans, dna):
     '''
     function to generate protein, transcripts, and contigs from genbank file
     '''
-    genes = {}
-    with open(dna, 'w') as dnaout:
-        with open(input, 'r') as filein:
-            for record in SeqIO.parse(filein, 'genbank'):
-                dnaout.write(">{:}\n{:}\n".format(
-                    record.id, softwrap(str(record.seq))))
-                for f in record.features:
-                    gb_feature_add2dict(f, record, genes)
+    genes = loadGBK(input, dna=dna)[0]
     # write gff3 output
     dict2gff3(genes, gff)
     # write to protein and transcripts
@@ -2919,25 +3248,7 @@ def gb2parts(input, tbl, gff, prots, trans, dna):
     function returns a dictionary of all gene models from a genbank file this function
     can handle multiple transcripts per locus/gene
     '''
-    genes = {}
-    scaff2genes = {}
-    scaffLen = {}
-    with open(dna, 'w') as dnaout:
-        with open(input, 'r') as filein:
-            for record in SeqIO.parse(filein, 'genbank'):
-                dnaout.write(">{:}\n{:}\n".format(
-                    record.id, softwrap(str(record.seq))))
-                Contig = record.id
-                if not Contig in scaffLen:
-                    scaffLen[Contig] = len(record.seq)
-                for f in record.features:
-                    if f.type == 'gene':
-                        locusTag, ID, Parent = getID(f, f.type)
-                        if not Contig in scaff2genes:
-                            scaff2genes[Contig] = [locusTag]
-                        else:
-                            scaff2genes[Contig].append(locusTag)
-                    gb_feature_add2dict(f, record, genes)
+    genes, scaff2genes, scaffLen = loadGBK(input, dna=dna)
 
     # write tbl output
     dicts2tbl(genes, scaff2genes, scaffLen, 'CFMR', '12345', [], tbl)
@@ -2974,6 +3285,8 @@ def gb_feature_add2dict(f, record, genes):
     'source': annotation source
     'pseudo': True/False
     }
+    f is a GBFeature from readGenBank or a Biopython SeqFeature, record is
+    the GBRecord/SeqRecord it belongs to
     '''
     # get info from features, if there is no locusTag then exit
     if f.type == 'gene' or f.type == 'mRNA' or f.type == 'CDS' or f.type == 'tRNA' or f.type == 'rRNA' or f.type == 'ncRNA' or f.type == 'exon':
@@ -2982,21 +3295,19 @@ def gb_feature_add2dict(f, record, genes):
             return genes
     else:
         return genes
+    if not isinstance(f, GBFeature):
+        f = fromSeqFeature(f)
     # check for mismatching funannotate ID locus tag basename
     if ID and '-T' in ID:  # then this is from funannotate, okay to modify - this is to capture apparent tbl2asn local error
         # there is a problem, update locusTag with basename of ID
         if ID.split('-T')[0] != locusTag:
             locusTag = ID.split('-T')[0]
     # standard information from every feature
-    strand = f.location.strand
-    if strand == 1:
-        strand = '+'
-    elif strand == -1:
-        strand = '-'
-    start = f.location.nofuzzy_start + 1
-    end = f.location.nofuzzy_end
+    strand = f.strand
+    start = f.start
+    end = f.end
     chr = record.id
-    num_parts = len(f.location.parts)
+    num_parts = len(f.parts)
     name, Product = (None,)*2
     Fivepartial, Threepartial = (False,)*2
     DBxref = []
@@ -3022,7 +3333,7 @@ def gb_feature_add2dict(f, record, genes):
             if not genes[locusTag]['name']:
                 genes[locusTag]['name'] = name
     elif f.type == 'tRNA' or f.type == 'rRNA' or f.type == 'ncRNA':
-        feature_seq = f.extract(record.seq)
+        feature_seq = extractFeature(f, record.seq)
         try:
             name = f.qualifiers['gene'][0]
         except KeyError:
@@ -3038,22 +3349,21 @@ def gb_feature_add2dict(f, record, genes):
             exonTuples.append((int(start), int(end)))
         else:  # more than 1 exon, so loop through
             for i in range(0, num_parts):
-                ex_start = f.location.parts[i].nofuzzy_start + 1
-                ex_end = f.location.parts[i].nofuzzy_end
+                ex_start, ex_end = f.parts[i]
                 exonTuples.append((int(ex_start), int(ex_end)))
         # now we want to sort the positions I think...
         if strand == '+':
             sortedExons = sorted(exonTuples, key=lambda tup: tup[0])
-            if unicode(f.location.start).startswith('<'):
+            if f.before:
                 Fivepartial = True
-            if unicode(f.location.end).startswith('>'):
+            if f.after:
                 Threepartial = True
         else:
             sortedExons = sorted(
                 exonTuples, key=lambda tup: tup[0], reverse=True)
-            if unicode(f.location.start).startswith('<'):
+            if f.before:
                 Threepartial = True
-            if unicode(f.location.end).startswith('>'):
+            if f.after:
                 Fivepartial = True
         # update positions
         if not locusTag in genes:
@@ -3076,7 +3386,7 @@ def gb_feature_add2dict(f, record, genes):
             if not genes[locusTag]['name']:
                 genes[locusTag]['name'] = name
     elif f.type == 'mRNA':
-        feature_seq = f.extract(record.seq)
+        feature_seq = extractFeature(f, record.seq)
         try:
             name = f.qualifiers['gene'][0]
         except KeyError:
@@ -3086,22 +3396,21 @@ def gb_feature_add2dict(f, record, genes):
             exonTuples.append((int(start), int(end)))
         else:  # more than 1 exon, so loop through
             for i in range(0, num_parts):
-                ex_start = f.location.parts[i].nofuzzy_start + 1
-                ex_end = f.location.parts[i].nofuzzy_end
+                ex_start, ex_end = f.parts[i]
                 exonTuples.append((int(ex_start), int(ex_end)))
         # now we want to sort the positions I think...
         if strand == '+':
             sortedExons = sorted(exonTuples, key=lambda tup: tup[0])
-            if unicode(f.location.start).startswith('<'):
+            if f.before:
                 Fivepartial = True
-            if unicode(f.location.end).startswith('>'):
+            if f.after:
                 Threepartial = True
         else:
             sortedExons = sorted(
                 exonTuples, key=lambda tup: tup[0], reverse=True)
-            if unicode(f.location.start).startswith('<'):
+            if f.before:
                 Threepartial = True
-            if unicode(f.location.end).startswith('>'):
+            if f.after:
                 Fivepartial = True
         # update positions
         if not locusTag in genes:
@@ -3120,7 +3429,7 @@ def gb_feature_add2dict(f, record, genes):
     elif f.type == 'exon':  # assuming need to overwrite mRNA feature then?
         genes[locusTag]['mRNA'] = []
         genes[locusTag]['transcript'] = []
-        feature_seq = f.extract(record.seq)
+        feature_seq = extractFeature(f, record.seq)
         try:
             name = f.qualifiers['gene'][0]
         except KeyError:
@@ -3130,22 +3439,21 @@ def gb_feature_add2dict(f, record, genes):
             exonTuples.append((int(start), int(end)))
         else:  # more than 1 exon, so loop through
             for i in range(0, num_parts):
-                ex_start = f.location.parts[i].nofuzzy_start + 1
-                ex_end = f.location.parts[i].nofuzzy_end
+                ex_start, ex_end = f.parts[i]
                 exonTuples.append((int(ex_start), int(ex_end)))
         # now we want to sort the positions I think...
         if strand == '+':
             sortedExons = sorted(exonTuples, key=lambda tup: tup[0])
-            if unicode(f.location.start).startswith('<'):
+            if f.before:
                 Fivepartial = True
-            if unicode(f.location.end).startswith('>'):
+            if f.after:
                 Threepartial = True
         else:
             sortedExons = sorted(
                 exonTuples, key=lambda tup: tup[0], reverse=True)
-            if unicode(f.location.start).startswith('<'):
+            if f.before:
                 Threepartial = True
-            if unicode(f.location.end).startswith('>'):
+            if f.after:
                 Fivepartial = True
         # update positions
         if not locusTag in genes:
@@ -3159,7 +3467,7 @@ def gb_feature_add2dict(f, record, genes):
             genes[locusTag]['partialStart'].append(Fivepartial)
             genes[locusTag]['partialStop'].append(Threepartial)
     elif f.type == 'CDS' and 'codon_start' in f.qualifiers:
-        feature_seq = f.extract(record.seq)
+        feature_seq = extractFeature(f, record.seq)
         if not ID:
             try:
                 log.info("putative transcript from %s has no ID\n(%s %s %s)" % (
@@ -3182,8 +3490,7 @@ def gb_feature_add2dict(f, record, genes):
             cdsTuples.append((int(start), int(end)))
         else:
             for i in range(0, num_parts):
-                ex_start = f.location.parts[i].nofuzzy_start + 1
-                ex_end = f.location.parts[i].nofuzzy_end
+                ex_start, ex_end = f.parts[i]
                 cdsTuples.append((int(ex_start), int(ex_end)))
         if strand == '+':
             sortedCDS = sorted(cdsTuples, key=lambda tup: tup[0])
@@ -3237,7 +3544,7 @@ def gb_feature_add2dict(f, record, genes):
 
 def bed2interlap(bedfile):
     # load interlap object from a bed file
-    inter = defaultdict(InterLap)
+    inter = defaultdict(NCLInterLap)
     with open(bedfile, 'r') as infile:
         for line in infile:
             line = line.strip()
@@ -3257,7 +3564,7 @@ def gff2interlap(input, fasta):
     '''
     function to parse GFF3 file, construct scaffold/gene interlap dictionary and funannotate standard annotation dictionary
     '''
-    inter = defaultdict(InterLap)
+    inter = defaultdict(NCLInterLap)
     Genes = {}
     Genes = gff2dict(input, fasta, Genes)
     for k, v in natsorted(Genes.items()):
@@ -3269,8 +3576,7 @@ def gff2interlapDict(input, fasta, inter, Dict):
     '''
     function to parse GFF3 file, construct scaffold/gene interlap dictionary and funannotate standard annotation dictionary
     '''
-    Genes = {}
-    Genes = gff2dict(input, fasta, Genes, gap_filter=True)
+    Genes = loadGFF3(input, fasta, gap_filter=True)
     for k, v in natsorted(Genes.items()):
         inter[v['contig']].add(
             (v['location'][0], v['location'][1], v['strand'], k))
@@ -3500,7 +3806,92 @@ def harmonize_transcripts(genome, alignments, gfffile, hintsfile, evidence=None,
     dict2hints(Genes, hintsfile)
     
     
-def gff2dict(file, fasta, Genes, debug=False, gap_filter=False):
+def loadGFF3(input, fasta, cpus=1, **kwargs):
+    '''
+    gff2dict of a GFF3 file through the on-disk annotation cache,
+    parsed with gff2dictParallel if cpus > 1
+    '''
+    if cpus > 1:
+        return cached('gff2dict', [input, fasta], functools.partial(gff2dictParallel, cpus=cpus),
+                      input, fasta, {}, **kwargs)
+    return cached('gff2dict', [input, fasta], gff2dict, input, fasta, {}, **kwargs)
+
+
+_SHARD_STORE = None
+
+
+def _initGFFshard(store):
+    global _SHARD_STORE
+    _SHARD_STORE = store
+
+
+def _gff2dictShard(args):
+    # returns (Genes, None) or (None, (exit code, traceback)), gff2dict exits on
+    # malformed GFF3 which would otherwise leave the pool waiting on the task
+    file, ranges, debug, gap_filter = args
+    try:
+        return gff2dict(contigLines(file, ranges), _SHARD_STORE, {}, debug=debug, gap_filter=gap_filter), None
+    except SystemExit as e:
+        return None, (e.code, None)
+    except Exception:
+        import traceback
+        return None, (1, traceback.format_exc())
+
+
+def gff2dictParallel(file, fasta, Genes, cpus=2, debug=False, gap_filter=False):
+    '''
+    gff2dict with a process pool: the byte ranges of every contig in the GFF3 file
+    are indexed, grouped into shards of similar size and parsed in parallel, then
+    merged in shard order. Output is identical to gff2dict; if Genes already has
+    models or a locus turns up in more than one shard the file is parsed serially
+    '''
+    SeqRecords = openGenome(fasta)
+    if Genes or cpus < 2:
+        return gff2dict(file, SeqRecords, Genes, debug=debug, gap_filter=gap_filter)
+    index = indexContigs(file)
+    missingContigs(file, index.keys(), SeqRecords)
+    # largest contigs first onto the least loaded shard
+    sizes = sorted(((sum(x[1] for x in v), k) for k, v in index.items() if k in SeqRecords), reverse=True)
+    numShards = min(len(sizes), cpus * 4)
+    if numShards < 2:
+        return gff2dict(file, SeqRecords, Genes, debug=debug, gap_filter=gap_filter)
+    shards = [[] for x in range(numShards)]
+    loads = [(0, x) for x in range(numShards)]
+    for size, contig in sizes:
+        load, i = loads[0]
+        shards[i].extend(index[contig])
+        loads[0] = (load + size, i)
+        loads.sort()
+    tasks = [(file, sorted(x), debug, gap_filter) for x in shards]
+    pool = multiprocessing.Pool(processes=min(cpus, numShards), initializer=_initGFFshard,
+                                initargs=(SeqRecords,))
+    try:
+        for result, error in pool.imap(_gff2dictShard, tasks):
+            if error:
+                pool.terminate()
+                code, trace = error
+                if trace:
+                    log.error('Parsing {:} failed:\n{:}'.format(file, trace))
+                sys.exit(code or 1)
+            for k in result:
+                if k in Genes:
+                    pool.terminate()
+                    return gff2dict(file, SeqRecords, {}, debug=debug, gap_filter=gap_filter)
+            Genes.update(result)
+    finally:
+        pool.close()
+        pool.join()
+    return Genes
+
+
+def loadTbl(input, fasta):
+    '''
+    tbl2dict of a NCBI tbl file through the on-disk annotation cache
+    '''
+    return cached('tbl2dict', [input, fasta], tbl2dict, input, fasta, {})
+
+
+def gff2dict(file, fasta, Genes, debug=False, gap_filter=False, compact=False):
     '''
     general function to take a GFF3 file and return a funannotate standardized dictionary
     locustag: {
@@ -3527,10 +3918,11 @@ def gff2dict(file, fasta, Genes, debug=False, gap_filter=False):
     '5UTR': [[(),()]] #list of lists of tuples (start, end)
     '3UTR': [[(),()]] #list of lists of tuples (start, end)
     }
+    compact=True returns read-only GeneModels that derive sequences from the genome
     '''
     idParent = {}
-    SeqRecords = SeqIO.to_dict(SeqIO.parse(fasta, 'fasta'))
-    with open(file, 'r') as input:
+    SeqRecords = openGenome(fasta)
+    with openLines(file) as input:
         for line in input:
             if line.startswith('\n') or line.startswith('#'):
                 continue
@@ -3712,6 +4104,8 @@ def gff2dict(file, fasta, Genes, debug=False, gap_filter=False):
                                     (start, end))
     # loop through and make sure CDS and exons are properly sorted and codon_start is correct, translate to protein space
     for k, v in Genes.items():
+        if isinstance(v, GeneModel):
+            continue
         for i in range(0, len(v['ids'])):
             if v['type'] in ['mRNA', 'tRNA', 'ncRNA', 'rRNA']:
                 if v['strand'] == '+':
@@ -3769,6 +4163,8 @@ def gff2dict(file, fasta, Genes, debug=False, gap_filter=False):
             v['location'] = (min(all_mRNA_coords,key=lambda item:item[0])[0], max(all_mRNA_coords,key=lambda item:item[1])[1])
         except ValueError:
             print(k,v)
+        if compact and k in Genes:
+            Genes[k] = compactGene(k, v, SeqRecords)
     return Genes
 
 
@@ -3795,10 +4191,11 @@ def simplifyGO(inputList):
     return simple
 
 
-def dict2gff3(input, output, debug=False):
+def dict2gff3(input, output, debug=False, header=True):
     from collections import OrderedDict
     '''
     function to convert funannotate gene dictionary to gff3 output
+    output can be a filename or open file
     '''
     def _sortDict(d):
         return (d[1]['contig'], d[1]['location'][0])
@@ -3806,8 +4203,9 @@ def dict2gff3(input, output, debug=False):
     sGenes = natsorted(input.iteritems(), key=_sortDict)
     sortedGenes = OrderedDict(sGenes)
     # then loop through and write GFF3 format
-    with open(output, 'w') as gffout:
-        gffout.write("##gff-version 3\n")
+    with openOutput(output) as gffout:
+        if header:
+            gffout.write("##gff-version 3\n")
         for k, v in sortedGenes.items():
             if 'pseudo' in v:
                 if v['pseudo']:
@@ -4378,14 +4776,7 @@ def gb2allout(input, GFF, Proteins, Transcripts, DNA):
     you see corresponds to first CDS feature, etc. **hopefully this is an okay assumption**
     '''
     # idea is to populate the dictionary first, then write GFF, proteins, transcripts, can write DNA on first pass
-    genes = {}
-    with open(DNA, 'w') as scaffolds:
-        with open(input, 'r') as gbk:
-            for record in SeqIO.parse(gbk, 'genbank'):
-                scaffolds.write(">{:}\n{:}\n".format(
-                    record.id, softwrap(str(record.seq))))
-                for f in record.features:
-                    gb_feature_add2dict(f, record, genes)
+    genes = loadGBK(input, dna=DNA)[0]
     # write GFF
     dict2gff3_old(genes, GFF)
     # write to protein and transcripts
@@ -4709,47 +5100,132 @@ def batch_iterator(iterator, batch_size):
             yield batch
 
 
+def fastaRecords(input):
+    '''
+    stream raw FASTA records from file, yields (header, seqlines, residues)
+    where header and seqlines are the unmodified lines of the record
+    '''
+    with open(input, 'r') as infile:
+        header, seqlines, residues = None, [], 0
+        for line in infile:
+            if line.startswith('>'):
+                if header is not None:
+                    yield header, seqlines, residues
+                header, seqlines, residues = line, [], 0
+            elif header is not None:
+                seqlines.append(line)
+                residues += len(line.strip())
+        if header is not None:
+            yield header, seqlines, residues
+
+
+def splitFastaBalanced(input, chunks, folder, prefix='chunk_', suffix='.fa', manifest=None):
+    '''
+    single pass split of FASTA file into at most chunks files, each record is
+    written to the chunk with the fewest residues so far so that a few very
+    long proteins don't end up together in one straggling chunk.
+    optionally write a tab-delimited manifest (file, records, residues)
+    returns list of [filename, records, residues] for the non-empty chunks
+    '''
+    import heapq
+    chunks = max(int(chunks), 1)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    heap = [(0, i) for i in range(chunks)]
+    handles = {}
+    stats = {}
+    try:
+        for header, seqlines, residues in fastaRecords(input):
+            load, i = heapq.heappop(heap)
+            if not i in handles:
+                filename = os.path.join(folder, '{:}{:}{:}'.format(prefix, len(handles)+1, suffix))
+                handles[i] = open(filename, 'w')
+                stats[i] = [filename, 0, 0]
+            handles[i].write(header)
+            handles[i].write(''.join(seqlines))
+            stats[i][1] += 1
+            stats[i][2] += residues
+            # +1 so that empty records still rotate through the chunks
+            heapq.heappush(heap, (load + residues + 1, i))
+    finally:
+        for x in handles.values():
+            x.close()
+    results = natsorted(stats.values(), key=lambda x: x[0])
+    if manifest:
+        with open(manifest, 'w') as outfile:
+            outfile.write('#file\trecords\tresidues\n')
+            for x in results:
+                outfile.write('{:}\t{:}\t{:}\n'.format(*x))
+    return results
+
+
+def fastaBatches(input, residues=100000):
+    '''
+    stream FASTA records to workers without writing files, yields lists of
+    (ID, sequence) tuples holding roughly residues amino acids/bases each
+    '''
+    batch, size = [], 0
+    for header, seqlines, length in fastaRecords(input):
+        batch.append((header[1:].strip(), ''.join(x.strip() for x in seqlines)))
+        size += length
+        if size >= residues:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+def _pipeFasta(task):
+    # run cmd on a batch of (ID, sequence) given as FASTA on stdin, return stdout
+    cmd, batch = task
+    data = ''.join('>{:}\n{:}\n'.format(ID, seq) for ID, seq in batch)
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    stdout, stderr = proc.communicate(data.encode('utf-8'))
+    if stderr:
+        log.debug(stderr)
+    return stdout.decode('utf-8')
+
+
+def pipeFasta(cmd, input, cpus=1, residues=100000):
+    '''
+    run cmd, a tool reading FASTA from stdin, on residue sized batches of the
+    records in input across cpus processes without writing chunk files,
+    yields the output of every batch in input order
+    '''
+    tasks = ((cmd, x) for x in fastaBatches(input, residues=residues))
+    pool = None
+    if cpus > 1:
+        pool = multiprocessing.Pool(processes=cpus)
+        results = pool.imap(_pipeFasta, tasks)
+    else:
+        results = (_pipeFasta(x) for x in tasks)
+    try:
+        for x in results:
+            yield x
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
 def fasta2chunks(input, chunks, tmpdir, output):
-    # split the input fasta file into 20 chunks to process
-    with open(input, 'r') as seqs:
-        SeqCount = countfasta(input)
-        SeqRecords = SeqIO.parse(seqs, 'fasta')
-        chunks = SeqCount / int(chunks)
-        # divide into chunks, store in tmp file
-        folder = os.path.join(tmpdir, output)
-        if not os.path.exists(folder):
-            os.makedirs(folder)
-        else:
-            shutil.rmtree(folder)
-            os.makedirs(folder)
-        for i, batch in enumerate(batch_iterator(SeqRecords, chunks)):
-            filename = "chunk_%i.fa" % (i+1)
-            tmpout = os.path.join(folder, filename)
-            handle = open(tmpout, "w")
-            SeqIO.write(batch, handle, "fasta")
-            handle.close()
-
-
-def signalP(input, tmpdir, output):
-    # split input file into chunks, 20 should mean < 200 proteins per chunk
-    fasta2chunks(input, 40, tmpdir, 'signalp_tmp')
-    for file in os.listdir(os.path.join(tmpdir, 'signalp_tmp')):
-        if file.startswith('chunk'):
-            file = os.path.join(tmpdir, 'signalp_tmp', file)
-            tmp_out = file.replace('.fa', '.signalp.out')
-            cmd = ['signalp', '-t', 'euk', '-f', 'short', file]
-            runSubprocess2(cmd, '.', log, tmp_out)
-    # now concatenate all outputs
-    if os.path.isfile(output):
-        os.remove(output)
-    with open(output, 'a') as finalout:
-        for file in os.listdir(os.path.join(tmpdir, 'signalp_tmp')):
-            if file.endswith('.signalp.out'):
-                file = os.path.join(tmpdir, 'signalp_tmp', file)
-                with open(file) as infile:
-                    finalout.write(infile.read())
-    # cleanup tmp directory
-    shutil.rmtree(os.path.join(tmpdir, 'signalp_tmp'))
+    # split the input fasta file into residue balanced chunks to process
+    folder = os.path.join(tmpdir, output)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    splitFastaBalanced(input, chunks, folder)
+
+
+def signalP(input, tmpdir, output, cpus=1):
+    # stream batches of ~200 proteins to signalp on stdin, no chunk files are
+    # written to tmpdir; outputs are concatenated in input order
+    cmd = ['signalp', '-t', 'euk', '-f', 'short']
+    log.debug(' '.join(cmd))
+    with open(output, 'w') as finalout:
+        for result in pipeFasta(cmd, input, cpus=cpus):
+            finalout.write(result)
 
 
 def parseSignalP(sigP, secretome_annot):
@@ -4876,11 +5352,13 @@ def SortRenameHeaders(input, output):
 
 
 def validate_tRNA(input, genes, gaps, output):
-    # run bedtools intersect to keep only input that dont intersect with either genes or gaps
-    cmd = ['bedtools', 'intersect', '-v', '-a', input, '-b', genes]
+    # keep only input that dont intersect with either genes or gaps, same as bedtools intersect -v
+    others = [readRegions(genes)]
     if gaps:
-        cmd.append(gaps)
-    runSubprocess2(cmd, '.', log, output)
+        others.append(readRegions(gaps))
+    with open(output, 'w') as outfile:
+        for x in nonOverlapping(readRegions(input), *others):
+            outfile.write('{:}\n'.format(x.line))
 
 
 # via https://stackoverflow.com/questions/2154249/identify-groups-of-continuous-numbers-in-a-list
@@ -4898,27 +5376,15 @@ def list2groups(L):
 
 
 def checkMask(genome, bedfile):
-    from Bio.SeqIO.FastaIO import SimpleFastaParser
     # load contig names and sizes into dictionary, get masked repeat stats
-    GenomeLength = 0
-    maskedSize = 0
     masked = {}
-    ContigSizes = {}
-    with open(genome, 'r') as input:
-        for header, Seq in SimpleFastaParser(input):
-            if ' ' in header:
-                ID = header.split(' ')[0]
-            else:
-                ID = header
-            if not ID in masked:
-                masked[ID] = []
-            if not ID in ContigSizes:
-                ContigSizes[ID] = len(Seq)
-            GenomeLength += len(Seq)
-            maskedSize += n_lower_chars(Seq)
-            for i, c in enumerate(Seq):
-                if c.islower():
-                    masked[ID].append(i)  # 0 based
+    stats = AssemblyStats()
+    for scan in scanFasta(genome, gaps=False):
+        stats.add(scan)
+        masked[scan.name] = scan.repeats  # 0 based
+    ContigSizes = dict(stats.contigs)
+    GenomeLength = stats.length
+    maskedSize = stats.masked
     if maskedSize == 0:  # not softmasked, return False
         with open(bedfile, 'w') as bedout:
             bedout.write('')
@@ -4927,116 +5393,39 @@ def checkMask(genome, bedfile):
         counter = 1
         with open(bedfile, 'w') as bedout:
             for k, v in natsorted(masked.items()):
-                repeats = list(list2groups(v))
-                for item in repeats:
-                    if len(item) == 2:
-                        bedout.write('{:}\t{:}\t{:}\tRepeat_{:}\n'.format(
-                            k, item[0], item[1], counter))
-                        counter += 1
+                for item in v:
+                    bedout.write('{:}\t{:}\t{:}\tRepeat_{:}\n'.format(
+                        k, item[0], item[1], counter))
+                    counter += 1
     percentMask = maskedSize / float(GenomeLength)
     return ContigSizes, GenomeLength, maskedSize, percentMask
 
 
-def maskingstats2bed(input, counter, alock):
-    from Bio.SeqIO.FastaIO import SimpleFastaParser
-    masked = []
-    gaps = []
-    maskedSize = 0
-    bedfilename = input.replace('.fasta', '.bed')
-    gapfilename = input.replace('.fasta', '.gaps')
-    with open(input, 'r') as infile:
-        for header, Seq in SimpleFastaParser(infile):
-            if ' ' in header:
-                ID = header.split(' ')[0]
-            else:
-                ID = header
-            for i, c in enumerate(Seq):
-                if c == 'N' or c == 'n':
-                    masked.append(i)
-                    maskedSize += 1
-                    gaps.append(i)
-                elif c.islower():
-                    masked.append(i)  # 0 based
-                    maskedSize += 1
-
-    if maskedSize > 0:  # not softmasked, return False
-        with open(bedfilename, 'w') as bedout:
-            repeats = list(list2groups(masked))
-            for item in repeats:
-                if len(item) == 2:
-                    bedout.write('{:}\t{:}\t{:}\tRepeat_\n'.format(
-                        ID, item[0], item[1]))
-    if len(gaps) > 0:
-        with open(gapfilename, 'w') as gapout:
-            bedGaps = list(list2groups(gaps))
-            for item in bedGaps:
-                if len(item) == 2:
-                    gapout.write(
-                        '{:}\t{:}\t{:}\tassembly-gap_\n'.format(ID, item[0], item[1]))
-    with alock:
-        counter.value += maskedSize
-
-
-def mask_safe_run(*args, **kwargs):
-    """Call run(), catch exceptions."""
-    try:
-        maskingstats2bed(*args, **kwargs)
-    except Exception as e:
-        print("error: %s run(*%r, **%r)" % (e, args, kwargs))
-
-
 def checkMasklowMem(genome, bedfile, gapsfile, cpus):
-    from Bio.SeqIO.FastaIO import SimpleFastaParser
-    # load contig names and sizes into dictionary, get masked repeat stats
-    ContigSizes = {}
-    tmpdir = os.path.join(os.path.dirname(genome), 'mask_'+str(os.getpid()))
-    os.makedirs(tmpdir)
-    file_list = []
-    with open(genome, 'r') as input:
-        for header, Seq in SimpleFastaParser(input):
-            if ' ' in header:
-                ID = header.split(' ')[0]
-            else:
-                ID = header
-            if not ID in ContigSizes:
-                ContigSizes[ID] = len(Seq)
-            with open(os.path.join(tmpdir, ID+'.fasta'), 'w') as fastaout:
-                fastaout.write('>{:}\n{:}\n'.format(ID, Seq))
-            file_list.append(os.path.join(tmpdir, ID+'.fasta'))
-    #num = 1
-    p = multiprocessing.Pool(processes=cpus)
-    TotalMask = multiprocessing.Manager().Value('i', 0)
-    lock = multiprocessing.Manager().Lock()
-    result = []
-    for i in file_list:
-        result.append(p.apply_async(mask_safe_run, [i, TotalMask, lock]))
-    p.close()
-    p.join()
+    # scan memory-mapped genome in parallel, get masked repeat and gap stats
+    genomeIndex = GenomeStore(genome)
+    ContigSizes = dict(genomeIndex.lengths())
+    TotalMask = 0
     repeatNum = 1
     gapNum = 1
     with open(bedfile, 'w') as bedout:
-        for file in natsorted(os.listdir(tmpdir)):
-            if file.endswith('.bed'):
-                with open(os.path.join(tmpdir, file), 'r') as infile:
-                    for line in infile:
-                        line = line.replace(
-                            'Repeat_', 'Repeat_'+str(repeatNum))
-                        bedout.write(line)
-                        repeatNum += 1
-    with open(gapsfile, 'w') as gapout:
-        for file in natsorted(os.listdir(tmpdir)):
-            if file.endswith('.gaps'):
-                with open(os.path.join(tmpdir, file), 'r') as infile:
-                    for line in infile:
-                        line = line.replace(
-                            'assembly-gap_', 'assembly-gap_'+str(gapNum))
-                        gapout.write(line)
-                        gapNum += 1
-
-    SafeRemove(tmpdir)
+        with open(gapsfile, 'w') as gapout:
+            for scan in scanGenome(genomeIndex, cpus=cpus,
+                                   order=natsorted(genomeIndex.keys()),
+                                   gaps_are_masked=True):
+                TotalMask += scan.masked
+                for item in scan.repeats:
+                    bedout.write('{:}\t{:}\t{:}\tRepeat_{:}\n'.format(
+                        scan.name, item[0], item[1], repeatNum))
+                    repeatNum += 1
+                for item in scan.gap_runs:
+                    gapout.write('{:}\t{:}\t{:}\tassembly-gap_{:}\n'.format(
+                        scan.name, item[0], item[1], gapNum))
+                    gapNum += 1
+    genomeIndex.close()
     GenomeLength = sum(ContigSizes.values())
-    percentMask = TotalMask.value / float(GenomeLength)
-    return ContigSizes, GenomeLength, TotalMask.value, percentMask
+    percentMask = TotalMask / float(GenomeLength)
+    return ContigSizes, GenomeLength, TotalMask, percentMask
 
 
 def RunGeneMarkES(command, input, ini, maxintron, softmask, cpus, tmpdir, output, fungus):
@@ -5333,7 +5722,7 @@ def zff2gff3(input, fasta, output):
                     if end > Genes[ID]['location'][1]:
                         Genes[ID]['location'] = (Genes[ID]['location'][0], end)
     # translate, check partial, etc
-    SeqRecords = SeqIO.to_dict(SeqIO.parse(fasta, 'fasta'))
+    SeqRecords = GenomeStore(fasta)
     for k, v in Genes.items():
         i = 0
         if v['strand'] == '+':
@@ -5748,19 +6137,14 @@ def RemoveBadModels(proteins, gff, length, repeats, BlastResults, tmpdir, method
     repeat = 0
     gapspan = 0
     if 'overlap' in methods:
-        # first run bedtools to intersect models where 90% of gene overlaps with repeatmasker region
-        repeat_temp = os.path.join(tmpdir, 'genome.repeats.to.remove.gff')
-        cmd = ['bedtools', 'intersect', '-f', '0.9', '-a', gff, '-b', repeats]
-        runSubprocess2(cmd, '.', log, repeat_temp)
-        # parse the results from bedtools and add to remove list
-        with open(repeat_temp, 'r') as input:
-            for line in input:
-                if "\tgene\t" in line:
-                    ninth = line.split('ID=')[-1]
-                    ID = ninth.split(";")[0]
-                    if not ID in reason:
-                        reason[ID] = 'remove_reason=repeat_overlap;'
-                        repeat += 1
+        # first find models where 90% of gene overlaps with repeatmasker region (bedtools intersect -f 0.9)
+        genes = [x for x in readRegions(gff) if x.line.split('\t')[2] == 'gene']
+        for x, y, bp in overlapping(genes, readRegions(repeats), fraction=0.9):
+            ninth = x.line.split('ID=')[-1]
+            ID = ninth.split(";")[0]
+            if not ID in reason:
+                reason[ID] = 'remove_reason=repeat_overlap;'
+                repeat += 1
     if 'blast' in methods:
         # parse the results from BlastP search of transposons
         with open(BlastResults, 'r') as input:
@@ -6170,17 +6554,17 @@ def ParseAntiSmash(input, tmpdir, output, annotations):
 def GetClusterGenes(input, GFF, output, annotations):
     global dictClusters
     # pull out genes in clusters from GFF3, load into dictionary
-    cmd = ['bedtools', 'intersect', '-wo', '-a', input, '-b', GFF]
-    runSubprocess2(cmd, '.', log, output)
+    # output has the same columns as bedtools intersect -wo
     dictClusters = {}
-    with open(output, 'r') as input:
-        for line in input:
-            cols = line.split('\t')
-            if cols[8] != 'mRNA':
+    with open(output, 'w') as outfile:
+        for x, y, bp in overlapping(readRegions(input), readRegions(GFF)):
+            outfile.write('{:}\t{:}\t{:}\n'.format(x.line, y.line, bp))
+            cols = y.line.split('\t')
+            if cols[2] != 'mRNA':
                 continue
-            gene = cols[14].split(';')[0]
+            gene = cols[8].split(';')[0]
             gene = gene.replace('ID=', '')
-            ID = cols[3]
+            ID = x.line.split('\t')[3]
             if ID not in dictClusters:
                 dictClusters[ID] = [gene]
             else:
@@ -6203,10 +6587,27 @@ def splitFASTA(input, outputdir):
                 SeqIO.write(record, output, 'fasta')
 
 
-def genomeStats(input):
-    from Bio.SeqUtils import GC
-    lengths = []
-    GeeCee = []
+GenomeDigest = namedtuple('GenomeDigest', ['stats', 'annotation', 'go', 'cds',
+                                           'proteinortho'])
+
+
+def genomeDigest(input, Database=None, proteinortho=True):
+    '''
+    read a funannotate GenBank file once and collect everything compare uses,
+    returns GenomeDigest where
+    stats: genomeStats list
+    annotation: getGBKannotation list, MEROPS families need the Database
+    go: [(locus_tag, [GO terms])] of the CDS features with GO terms
+    cds: [(locus_tag, contig, start, end, strand, length, product, notes)] of
+         every CDS feature, start is 0-based
+    proteinortho: (gff, proteins, transcripts) file contents written by
+                  gb2proteinortho, None if proteinortho=False
+    '''
+    if Database:
+        meropsDict = MEROPS2dict(os.path.join(Database, 'merops.formatted.fa'))
+    else:
+        meropsDict = {}
+    assembly = AssemblyStats()
     Genes = 0
     tRNA = 0
     Prots = 0
@@ -6214,54 +6615,162 @@ def genomeStats(input):
     organism = None
     isolate = None
     strain = None
-    uniqueIso = None
-    with open(input, 'r') as gbk:
-        SeqRecords = SeqIO.parse(gbk, 'genbank')
-        for record in SeqRecords:
-            lengths.append(len(record.seq))
-            GeeCee.append(str(record.seq))
-            organism = record.annotations['organism'].replace(
-                ' Unclassified.', '')
-            for f in record.features:
-                if f.type == "source":
-                    isolate = f.qualifiers.get("isolate", [None])[0]
-                    strain = f.qualifiers.get("strain", [None])[0]
-                if f.type == "CDS":
-                    Prots += 1
-                if f.type == "gene":
-                    Genes += 1
-                    if Genes == 1:
-                        locus_tag = f.qualifiers.get("locus_tag")[
-                            0].split('_')[0]
-                if f.type == "tRNA":
-                    tRNA += 1
+    annotation = [{}, {}, {}, {}, {}, {}, {}, {}, {}, {},
+                  {'NRPS': 0, 'PKS': 0, 'Hybrid': 0}]
+    go = []
+    cds = []
+    genes = {}
+    for record in readGenBank(input):
+        assembly.add(scanContig(record.id, record.seq,
+                                repeats=False, gaps=False))
+        organism = record.annotations['organism'].replace(
+            ' Unclassified.', '')
+        for f in record.features:
+            if f.type == "source":
+                isolate = f.qualifiers.get("isolate", [None])[0]
+                strain = f.qualifiers.get("strain", [None])[0]
+            if f.type == "CDS":
+                Prots += 1
+                _digestCDS(f, record, meropsDict, annotation, go, cds)
+            if f.type == "gene":
+                Genes += 1
+                if Genes == 1:
+                    locus_tag = f.qualifiers.get("locus_tag")[
+                        0].split('_')[0]
+            if f.type == "tRNA":
+                tRNA += 1
+            if proteinortho:
+                gb_feature_add2dict(f, record, genes)
     if strain:
-        log.info("working on %s %s" % (organism, strain))
         uniqueIso = strain.replace(' ', '')
     elif isolate:
-        log.info("working on %s %s" % (organism, isolate))
         uniqueIso = isolate.replace(' ', '')
     else:
-        log.info("working on %s" % organism)
-    GenomeSize = sum(lengths)
-    LargestContig = max(lengths)
-    ContigNum = len(lengths)
+        uniqueIso = None
+    GenomeSize = assembly.length
+    LargestContig = assembly.largest
+    ContigNum = len(assembly.lengths)
     AvgContig = int(round(GenomeSize / ContigNum))
-    pctGC = round(GC("".join(GeeCee)), 2)
-
-    # now get N50
-    lengths.sort()
-    nlist = []
-    for x in lengths:
-        nlist += [x]*x
-    if len(nlist) % 2 == 0:
-        medianpos = int(len(nlist) / 2)
-        N50 = int((nlist[medianpos] + nlist[medianpos-1]) / 2)
+    pctGC = round(assembly.percentGC(), 2)
+    N50 = assembly.n50()
+    stats = [organism, uniqueIso, locus_tag, "{0:,}".format(GenomeSize)+' bp', "{0:,}".format(LargestContig)+' bp', "{0:,}".format(AvgContig)+' bp', "{0:,}".format(ContigNum), "{0:,}".format(N50)+' bp', "{:.2f}".format(pctGC)+'%', "{0:,}".format(Genes), "{0:,}".format(Prots), "{0:,}".format(tRNA)]
+    if proteinortho:
+        proteinortho = proteinorthoFiles(genes)
+    else:
+        proteinortho = None
+    return GenomeDigest(stats, annotation, go, cds, proteinortho)
+
+
+def _digestWorker(args):
+    return genomeDigest(*args)
+
+
+def digestWorkers(inputs, cpus, factor=6):
+    '''
+    number of genomeDigest processes to run on a list of GenBank files, at
+    most cpus and only as many as fit in the available memory when each
+    takes factor times the size of the largest file
+    '''
+    import psutil
+    largest = max([os.path.getsize(x) for x in inputs] + [1])
+    available = psutil.virtual_memory().available
+    return max(1, min(cpus, len(inputs), int(available // (largest * factor))))
+
+
+def digestKey(input, Database=None):
+    '''
+    genomeDigest store key of a GenBank file, a hash of its contents and of
+    the MEROPS table used to name protease families
+    '''
+    ident = ['genomeDigest', __version__, PARSER_VERSION, fileHash(input)]
+    if Database and os.path.isfile(os.path.join(Database, 'merops.formatted.fa')):
+        ident.append(fileHash(os.path.join(Database, 'merops.formatted.fa')))
+    return hashlib.sha1(repr(ident).encode('utf-8')).hexdigest()
+
+
+def genomeDigests(inputs, Database=None, cpus=1, store=None):
+    '''
+    yield the genomeDigest of every GenBank file in input order, files are
+    read in parallel by a pool of up to cpus processes (see digestWorkers).
+    store is a folder where digests are kept by digestKey, only the files
+    that are not in it yet are read
+    '''
+    keys = [None] * len(inputs)
+    cache = None
+    if store:
+        cache = AnnotationCache(store, maxsize=sys.maxsize)
+        keys = [digestKey(x, Database) for x in inputs]
+    todo = [x for x, key in zip(inputs, keys) if cache is None or not key in cache]
+    if cache is not None:
+        log.info('{:,} of {:,} genomes found in digest store {:}'.format(
+            len(inputs) - len(todo), len(inputs), store))
+    parsed = _parseDigests(todo, Database, cpus)
+    for x, key in zip(inputs, keys):
+        digest = None
+        if cache is None or not key in cache:
+            digest = next(parsed)
+            if cache is not None:
+                cache.put(key, digest)
+        else:
+            digest = cache.get(key)
+            if digest is None:  # unreadable, parse it again
+                digest = genomeDigest(x, Database)
+                cache.put(key, digest)
+        yield digest
+
+
+def _parseDigests(inputs, Database, cpus):
+    tasks = [(x, Database) for x in inputs]
+    workers = digestWorkers(inputs, cpus) if cpus > 1 and len(inputs) > 1 else 1
+    if workers < 2:
+        for x in tasks:
+            yield _digestWorker(x)
+        return
+    log.debug('Reading {:,} GenBank files with {:,} processes'.format(len(inputs), workers))
+    # one genome per process, memory of a parsed genome goes back to the OS
+    pool = multiprocessing.Pool(processes=workers, maxtasksperchild=1)
+    try:
+        for digest in pool.imap(_digestWorker, tasks):
+            yield digest
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _digestCDS(f, record, meropsDict, annotation, go, cds):
+    # annotation tables, GO terms and annotation table row of a CDS feature
+    locusTag, ID, Parent = getID(f, f.type)
+    if ID:
+        addGBKannotation(f, ID, meropsDict, annotation)
+    if not 'locus_tag' in f.qualifiers:
+        log.debug("%s has no locus_tag, skipping" % ID)
+        return
+    locusTag = f.qualifiers['locus_tag'][0]
+    GOS = []
+    notes = []
+    for k, v in f.qualifiers.items():
+        if k == 'note':
+            notes = v[0].split('; ')
+            for i in notes:
+                if i.startswith('GO'):
+                    go_term = i.split(' ')[1]
+                    GOS.append(go_term)
+    if GOS:
+        go.append((locusTag, GOS))
+    strand = '+' if f.strand == '+' else '-'
+    cds.append((locusTag, record.id, f.start - 1, f.end, strand,
+                len(f.qualifiers.get('translation', [''])[0]),
+                f.qualifiers['product'][0], notes))
+
+
+def genomeStats(input):
+    stats = genomeDigest(input, proteinortho=False).stats
+    if stats[1]:
+        log.info("working on %s %s" % (stats[0], stats[1]))
     else:
-        medianpos = int(len(nlist) / 2)
-        N50 = int(nlist[medianpos])
-    # return values in a list
-    return [organism, uniqueIso, locus_tag, "{0:,}".format(GenomeSize)+' bp', "{0:,}".format(LargestContig)+' bp', "{0:,}".format(AvgContig)+' bp', "{0:,}".format(ContigNum), "{0:,}".format(N50)+' bp', "{:.2f}".format(pctGC)+'%', "{0:,}".format(Genes), "{0:,}".format(Prots), "{0:,}".format(tRNA)]
+        log.info("working on %s" % stats[0])
+    return stats
 
 
 def MEROPS2dict(input):
@@ -6345,29 +6854,19 @@ def getSMBackbones(input):
 
 
 def parseGOterms(input, folder, genome):
+    writeGOterms(genomeDigest(input, proteinortho=False).go, folder, genome)
+
+
+def writeGOterms(go, folder, genome):
+    '''
+    append the (locus_tag, [GO terms]) of a genome to folder/associations.txt
+    and write its locus tags to folder/genome.txt
+    '''
     with open(os.path.join(folder, 'associations.txt'), 'a') as assoc:
         with open(os.path.join(folder, genome+'.txt'), 'w') as terms:
-            with open(input, 'r') as gbk:
-                SeqRecords = SeqIO.parse(gbk, 'genbank')
-                for record in SeqRecords:
-                    for f in record.features:
-                        if f.type == 'CDS':
-                            try:
-                                ID = f.qualifiers['locus_tag'][0]
-                            except KeyError:
-                                log.debug("%s has no locus_tag, skipping")
-                                continue
-                            GOS = []
-                            for k, v in f.qualifiers.items():
-                                if k == 'note':
-                                    notes = v[0].split('; ')
-                                    for i in notes:
-                                        if i.startswith('GO'):
-                                            go_term = i.split(' ')[1]
-                                            GOS.append(go_term)
-                            if GOS:
-                                assoc.write("%s\t%s\n" % (ID, ";".join(GOS)))
-                                terms.write("%s\n" % ID)
+            for ID, GOS in go:
+                assoc.write("%s\t%s\n" % (ID, ";".join(GOS)))
+                terms.write("%s\n" % ID)
 
 
 def getStatsfromDbxref(input, word):
@@ -6399,102 +6898,89 @@ def getGBKannotation(input, Database):
     Function will loop through GBK file pulling out funannotate functional annotation
     and returning a list of dictionaries for each annotation class
     '''
-    # convert merops on the fly, need database
-    meropsDict = MEROPS2dict(os.path.join(Database, 'merops.formatted.fa'))
-    SMs = {'NRPS': 0, 'PKS': 0, 'Hybrid': 0}
-    pfams = {}
-    iprs = {}
-    nogs = {}
-    cogs = {}
-    merops = {}
-    cazys = {}
-    secreted = {}
-    membrane = {}
-    buscos = {}
-    secmet = {}
-    with open(input, 'r') as infile:
-        for record in SeqIO.parse(infile, 'genbank'):
-            for f in record.features:
-                locusTag, ID, Parent = (None,)*3
-                if f.type == 'CDS':
-                    locusTag, ID, Parent = getID(f, f.type)
-                    if not ID:
-                        continue
-                    product = f.qualifiers['product'][0]
-                    if product == "Hybrid PKS-NRPS":
-                        SMs['Hybrid'] += 1
-                    if product == "Nonribosomal Peptide Synthase (NRPS)":
-                        SMs['NRPS'] += 1
-                    if 'Polyketide synthase (PKS)' in product:
-                        SMs['PKS'] += 1
-                    for k, v in f.qualifiers.items():
-                        if k == 'db_xref':
-                            for i in v:
-                                if i.startswith('PFAM:'):
-                                    hit = i.replace('PFAM:', '')
-                                    if not hit in pfams:
-                                        pfams[hit] = [ID]
-                                    else:
-                                        pfams[hit].append(ID)
-                                elif i.startswith('InterPro:'):
-                                    hit = i.replace('InterPro:', '')
-                                    if not hit in iprs:
-                                        iprs[hit] = [ID]
-                                    else:
-                                        iprs[hit].append(ID)
-                        if k == 'note':
-                            notes = v[0].split('; ')
-                            for i in notes:
-                                if i.startswith('EggNog:'):
-                                    hit = i.replace('EggNog:', '')
-                                    if not ID in nogs:
-                                        nogs[ID] = hit
-                                elif i.startswith('BUSCO:'):
-                                    hit = i.replace('BUSCO:', '')
-                                    if not hit in buscos:
-                                        buscos[hit] = [ID]
-                                    else:
-                                        buscos[hit].append(ID)
-                                elif i.startswith('MEROPS:'):  # change to family name
-                                    hit = i.replace('MEROPS:', '')
-                                    hit = meropsDict.get(hit)
-                                    if not hit in merops:
-                                        merops[hit] = [ID]
-                                    else:
-                                        merops[hit].append(ID)
-                                elif i.startswith('CAZy:'):
-                                    hit = i.replace('CAZy:', '')
-                                    if not hit in cazys:
-                                        cazys[hit] = [ID]
-                                    else:
-                                        cazys[hit].append(ID)
-                                elif i.startswith('COG:'):
-                                    hit = i.replace('COG:', '')
-                                    hits = hit.split(',')
-                                    for x in hits:
-                                        if not x in cogs:
-                                            cogs[x] = [ID]
-                                        else:
-                                            cogs[x].append(ID)
-                                elif i.startswith('SECRETED:'):
-                                    hit = i.replace('SECRETED:', '')
-                                    if not hit in secreted:
-                                        secreted[hit] = [ID]
-                                    else:
-                                        secreted[hit].append(ID)
-                                elif i.startswith('TransMembrane:'):
-                                    hit = i.replace('TransMembrane:', '')
-                                    if not hit in membrane:
-                                        membrane[hit] = [ID]
-                                    else:
-                                        membrane[hit].append(ID)
-                                elif i.startswith('antiSMASH:'):
-                                    hit = i.replace('antiSMASH:', '')
-                                    if not hit in secmet:
-                                        secmet[hit] = [ID]
-                                    else:
-                                        secmet[hit].append(ID)
-    return [pfams, iprs, nogs, buscos, merops, cazys, cogs, secreted, membrane, secmet, SMs]
+    return genomeDigest(input, Database, proteinortho=False).annotation
+
+
+def addGBKannotation(f, ID, meropsDict, annotation):
+    '''
+    add the functional annotation of CDS feature f with protein ID to the
+    getGBKannotation list of dictionaries
+    '''
+    pfams, iprs, nogs, buscos, merops, cazys, cogs, secreted, membrane, secmet, SMs = annotation
+    product = f.qualifiers['product'][0]
+    if product == "Hybrid PKS-NRPS":
+        SMs['Hybrid'] += 1
+    if product == "Nonribosomal Peptide Synthase (NRPS)":
+        SMs['NRPS'] += 1
+    if 'Polyketide synthase (PKS)' in product:
+        SMs['PKS'] += 1
+    for k, v in f.qualifiers.items():
+        if k == 'db_xref':
+            for i in v:
+                if i.startswith('PFAM:'):
+                    hit = i.replace('PFAM:', '')
+                    if not hit in pfams:
+                        pfams[hit] = [ID]
+                    else:
+                        pfams[hit].append(ID)
+                elif i.startswith('InterPro:'):
+                    hit = i.replace('InterPro:', '')
+                    if not hit in iprs:
+                        iprs[hit] = [ID]
+                    else:
+                        iprs[hit].append(ID)
+        if k == 'note':
+            notes = v[0].split('; ')
+            for i in notes:
+                if i.startswith('EggNog:'):
+                    hit = i.replace('EggNog:', '')
+                    if not ID in nogs:
+                        nogs[ID] = hit
+                elif i.startswith('BUSCO:'):
+                    hit = i.replace('BUSCO:', '')
+                    if not hit in buscos:
+                        buscos[hit] = [ID]
+                    else:
+                        buscos[hit].append(ID)
+                elif i.startswith('MEROPS:'):  # change to family name
+                    hit = i.replace('MEROPS:', '')
+                    hit = meropsDict.get(hit)
+                    if not hit in merops:
+                        merops[hit] = [ID]
+                    else:
+                        merops[hit].append(ID)
+                elif i.startswith('CAZy:'):
+                    hit = i.replace('CAZy:', '')
+                    if not hit in cazys:
+                        cazys[hit] = [ID]
+                    else:
+                        cazys[hit].append(ID)
+                elif i.startswith('COG:'):
+                    hit = i.replace('COG:', '')
+                    hits = hit.split(',')
+                    for x in hits:
+                        if not x in cogs:
+                            cogs[x] = [ID]
+                        else:
+                            cogs[x].append(ID)
+                elif i.startswith('SECRETED:'):
+                    hit = i.replace('SECRETED:', '')
+                    if not hit in secreted:
+                        secreted[hit] = [ID]
+                    else:
+                        secreted[hit].append(ID)
+                elif i.startswith('TransMembrane:'):
+                    hit = i.replace('TransMembrane:', '')
+                    if not hit in membrane:
+                        membrane[hit] = [ID]
+                    else:
+                        membrane[hit].append(ID)
+                elif i.startswith('antiSMASH:'):
+                    hit = i.replace('antiSMASH:', '')
+                    if not hit in secmet:
+                        secmet[hit] = [ID]
+                    else:
+                        secmet[hit].append(ID)
 
 
 def annotationtable(input, Database, output):
@@ -6667,27 +7153,73 @@ def convert2counts(input):
 
 
 def gb2proteinortho(input, folder, name):
-    gffOut = os.path.join(folder, name+'.gff')
-    FastaOut = os.path.join(folder, name+'.faa')
-    Transcripts = os.path.join(folder, name+'.transcripts.fa')
-    genes = {}
-    with open(input, 'r') as gbk:
-        for record in SeqIO.parse(gbk, 'genbank'):
-            for f in record.features:
-                gb_feature_add2dict(f, record, genes)
-    # now output the files you need
-    with open(gffOut, 'w') as gff:
-        with open(FastaOut, 'w') as fasta:
-            with open(Transcripts, 'w') as transcripts:
-                for k, v in natsorted(genes.items()):
-                    if v['type'] == 'mRNA':
-                        for i, item in enumerate(v['ids']):
-                            transcripts.write(">{:} {:} codon_start={:} strand={:}\n{:}\n".format(
-                                item, k, v['codon_start'][i], v['strand'], v['cds_transcript'][i]))
-                            fasta.write(">%s %s\n%s\n" %
-                                        (item, k, v['protein'][i]))
-                            gff.write("{:}\t{:}\tCDS\t{:}\t{:}\t.\t{:}\t.\tID={:};Parent={:};product={:};\n".format(
-                                v['contig'], v['source'], v['location'][0], v['location'][1], v['strand'], item, k, v['product'][i]))
+    writeProteinortho(proteinorthoFiles(loadGBK(input)[0]), folder, name)
+
+
+def proteinorthoFiles(genes):
+    '''
+    (gff, proteins, transcripts) proteinortho inputs of the mRNA models in a
+    funannotate dictionary
+    '''
+    gff, fasta, transcripts = [], [], []
+    for k, v in natsorted(genes.items()):
+        if v['type'] == 'mRNA':
+            for i, item in enumerate(v['ids']):
+                transcripts.append(">{:} {:} codon_start={:} strand={:}\n{:}\n".format(
+                    item, k, v['codon_start'][i], v['strand'], v['cds_transcript'][i]))
+                fasta.append(">%s %s\n%s\n" %
+                             (item, k, v['protein'][i]))
+                gff.append("{:}\t{:}\tCDS\t{:}\t{:}\t.\t{:}\t.\tID={:};Parent={:};product={:};\n".format(
+                    v['contig'], v['source'], v['location'][0], v['location'][1], v['strand'], item, k, v['product'][i]))
+    return ''.join(gff), ''.join(fasta), ''.join(transcripts)
+
+
+def writeProteinortho(files, folder, name):
+    '''
+    write the proteinorthoFiles of a genome to folder/name.gff, .faa and
+    .transcripts.fa
+    '''
+    for suffix, text in zip(['.gff', '.faa', '.transcripts.fa'], files):
+        with open(os.path.join(folder, name+suffix), 'w') as outfile:
+            outfile.write(text)
+
+
+def proteinorthoInputs(folder, filelist, project='funannotate'):
+    '''
+    check the proteinortho input files in folder against the previous run,
+    returns True if its results can be used as they are. Otherwise the
+    results are removed, together with the pairwise searches kept by
+    proteinortho -keep that involve an input which changed or was removed,
+    so only the searches of new or changed genomes are run again
+    '''
+    manifest = os.path.join(folder, project+'.inputs.txt')
+    current = dict((x, fileHash(os.path.join(folder, x))) for x in filelist)
+    previous = {}
+    if os.path.isfile(manifest):
+        with open(manifest, 'r') as infile:
+            for line in infile:
+                cols = line.rstrip('\n').split('\t')
+                if len(cols) == 2:
+                    previous[cols[0]] = cols[1]
+    results = os.path.join(folder, project+'.poff.tsv')
+    if previous == current and os.path.isfile(results):
+        return True
+    stale = [x for x in previous if current.get(x) != previous[x]]
+    for x in os.listdir(folder):
+        if x.startswith(project+'.'):
+            os.remove(os.path.join(folder, x))
+    searches = os.path.join(folder, 'proteinortho_cache_'+project)
+    if stale and os.path.isdir(searches):
+        # searches are named <input>.vs.<input>.<program>.tmp and databases
+        # start with the input name, match whole names so that a stale A.faa
+        # does not also remove the searches of BA.faa
+        for x in os.listdir(searches):
+            if any(x.startswith(y+'.') or '.vs.'+y+'.' in x for y in stale):
+                os.remove(os.path.join(searches, x))
+    with open(manifest, 'w') as outfile:
+        for x in filelist:
+            outfile.write('{:}\t{:}\n'.format(x, current[x]))
+    return False
 
 
 def drawStackedBar(panda, type, labels, ymax, output, colors=False):
@@ -7217,7 +7749,7 @@ def selectTrainingModels(input, fasta, genemark_gtf, output):
     def _sortDict(d):
         return (len(d[1]['CDS'][0]))
     # load gene models into funannotate structured dictionary
-    gene_inter = defaultdict(InterLap)
+    gene_inter = defaultdict(NCLInterLap)
     Genes = {}
     Genes = gff2dict(input, fasta, Genes)
     # add to InterLap output proteins
@@ -7434,19 +7966,9 @@ def sortList(input, col):
 
 
 def sortHints(input, output):
-    data = []
-    with open(input, 'r') as infile:
-        for line in infile:
-            line = line.rstrip()
-            data.append(line.split('\t'))
-    # replicate this: sort -n -k 4,4 | sort -s -n -k 5,5 | sort -s -n -k 3,3 | sort -s -k 1,1
-    sort1 = sortList(data, 3)
-    sort2 = sortList(sort1, 4)
-    sort3 = sortList(sort2, 2)
-    sort4 = sortList(sort3, 0)
-    with open(output, 'w') as sort_out:
-        for line in sort4:
-            sort_out.write('%s\n' % '\t'.join(line))
+    # same order as: sort -n -k 4,4 | sort -s -n -k 5,5 | sort -s -n -k 3,3 | sort -s -k 1,1
+    # large files are sorted in runs and merged, see FUNANNOTATE_SORT_MEMORY
+    gffsort.sortHints(input, output)
 
 
 def checkgoatools(input):
@@ -7465,8 +7987,14 @@ def checkgoatools(input):
 
 def translatemRNA(input, output):
     from Bio.SeqIO.FastaIO import SimpleFastaParser
+    def _write(batch):
+        proteins = translateBatch([(seq, '+', phase) for h, seq, phase in batch])
+        for (header, seq, phase), protSeq in zip(batch, proteins):
+            outfile.write('>{:}\n{:}\n'.format(header, protSeq))
+
     with open(output, 'w') as outfile:
         with open(input, 'r') as fasta:
+            batch = []
             for header, seq in SimpleFastaParser(fasta):
                 codon_start = 1
                 for x in header.split(' '):
@@ -7474,8 +8002,12 @@ def translatemRNA(input, output):
                         codon_start = int(
                             x.replace('codon_start=', '').rstrip())
                 # transcripts should already be in proper orientation
-                protSeq = translate(seq, '+', codon_start-1)
-                outfile.write('>{:}\n{:}\n'.format(header, protSeq))
+                batch.append((header, seq, codon_start-1))
+                if len(batch) >= 10000:
+                    _write(batch)
+                    batch = []
+            if batch:
+                _write(batch)
 
 
 def alignMAFFT(input, output):
@@ -7930,3 +8462,53 @@ HEADER2 = '''
           <a href="#" class="dropdown-toggle" data-toggle="dropdown" role="button" aria-haspopup="true" aria-expanded="false">Genomes <span class="caret"></span></a>
           <ul class="dropdown-menu">
 '''
+
+
+if __name__ == "__main__":
+    # gff2dictParallel against gff2dict on a synthetic genome, then on a GFF3
+    # with an orphan CDS both must exit 1: python -m funannotate.library [cpus]
+    import random
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    log = logging.getLogger(__name__)
+    cpus = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    random.seed(9)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fasta = os.path.join(tmpdir, 'genome.fasta')
+        gff = os.path.join(tmpdir, 'genes.gff3')
+        with open(fasta, 'w') as outfasta, open(gff, 'w') as outgff:
+            outgff.write('##gff-version 3\n')
+            for c in range(12):
+                contig = 'scaffold_{:}'.format(c + 1)
+                outfasta.write('>{:}\n{:}\n'.format(
+                    contig, ''.join(random.choice('ACGT') for x in range(20000))))
+                for g in range(random.randint(1, 8)):
+                    ID = 'g{:}_{:}'.format(c, g)
+                    start = g * 2000 + 101
+                    end = start + 3 * random.randint(50, 500) - 1
+                    strand = random.choice('+-')
+                    for feature, fID, parent, phase in [('gene', ID, None, '.'),
+                                                        ('mRNA', ID + '-T1', ID, '.'),
+                                                        ('exon', ID + '-T1.exon1', ID + '-T1', '.'),
+                                                        ('CDS', ID + '-T1.cds', ID + '-T1', '0')]:
+                        outgff.write('{:}\tsim\t{:}\t{:}\t{:}\t.\t{:}\t{:}\tID={:};{:}\n'.format(
+                            contig, feature, start, end, strand, phase, fID,
+                            'Parent={:};'.format(parent) if parent else ''))
+        serial = gff2dict(gff, fasta, {})
+        parallel = gff2dictParallel(gff, fasta, {}, cpus=cpus)
+        assert parallel == serial
+        print('{:,} models: gff2dictParallel(cpus={:}) == gff2dict'.format(len(serial), cpus))
+        with open(gff, 'a') as outgff:
+            outgff.write('scaffold_3\tsim\tCDS\t15001\t15300\t.\t+\t0\tID=orphan.cds;\n')
+        codes = []
+        for parser in [lambda: gff2dict(gff, fasta, {}),
+                       lambda: gff2dictParallel(gff, fasta, {}, cpus=cpus)]:
+            try:
+                parser()
+                codes.append(0)
+            except SystemExit as e:
+                codes.append(e.code)
+        assert codes == [1, 1], codes
+        print('malformed GFF3: gff2dict and gff2dictParallel both exit 1')
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+'''
+Group transcripts into loci with a single sorted sweep.
+
+Transcripts are (contig, start, end, name) tuples, or (contig, start, end,
+name, group) where transcripts with the same group always end up in the same
+locus (e.g. the isoforms of a PASA gene). They are sorted by position and
+swept once, each transcript is compared only with the earlier transcripts
+that still overlap it and linked ones are joined with a union-find, so the
+cost is the sort plus the number of overlapping pairs.
+
+Overlap is measured as min(end) - max(start) over end - start, computed
+from the coordinates rather than by intersecting sets of positions. With
+fraction two transcripts are linked if the overlap covers at least that
+fraction of either of them, or of both with reciprocal=True; the strand is
+not used, put it in the contig, e.g. (contig, strand), to keep the strands
+apart.
+
+>>> txs = [('chr1', 100, 200, 't1'), ('chr1', 180, 400, 't2'),
+...        ('chr1', 390, 500, 't3'), ('chr2', 100, 200, 't4'),
+...        ('chr1', 600, 700, 't5', 'g1'), ('chr1', 900, 950, 't6', 'g1')]
+>>> for locus in clusterLoci(txs):
+...     print(' '.join(locus))
+t1 t2 t3
+t5 t6
+t4
+>>> for locus in clusterLoci(txs, fraction=0.1):
+...     print(' '.join(locus))
+t1 t2
+t3
+t5 t6
+t4
+>>> print('{:.2f}'.format(overlapFraction((100, 200), (180, 400))))
+0.20
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__all__ = ['clusterLoci', 'overlapFraction']
+
+
+def overlapFraction(one, two):
+    '''
+    fraction of (start, end) one covered by two, 0 if they do not overlap
+    '''
+    length = one[1] - one[0]
+    if length <= 0:
+        # a single position is covered by anything overlapping it
+        return 1.0 if two[0] <= one[1] and two[1] >= one[0] else 0.0
+    return max(0, min(one[1], two[1]) - max(one[0], two[0])) / float(length)
+
+
+def _linked(a, b, fraction, reciprocal):
+    if fraction <= 0:
+        return True  # the sweep only compares overlapping transcripts
+    fa = overlapFraction((a[1], a[2]), (b[1], b[2])) >= fraction
+    fb = overlapFraction((b[1], b[2]), (a[1], a[2])) >= fraction
+    return (fa and fb) if reciprocal else (fa or fb)
+
+
+def clusterLoci(transcripts, fraction=0.0, reciprocal=False):
+    '''
+    return a list of loci, each a list of transcript names in position order,
+    loci are ordered by the position of their first transcript
+    '''
+    transcripts = list(transcripts)
+    parent = list(range(len(transcripts)))
+
+    def _root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def _join(i, j):
+        i, j = _root(i), _root(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    order = sorted(range(len(transcripts)),
+                   key=lambda i: (transcripts[i][0], transcripts[i][1],
+                                  transcripts[i][2]))
+    contig, active = None, []
+    for i in order:
+        t = transcripts[i]
+        if t[0] != contig:
+            contig, active = t[0], []
+        # earlier transcripts ending before this one starts are done
+        active = [j for j in active if transcripts[j][2] >= t[1]]
+        for j in active:
+            if _linked(transcripts[j], t, fraction, reciprocal):
+                _join(j, i)
+        active.append(i)
+    groups = {}
+    for i, t in enumerate(transcripts):
+        if len(t) > 4:
+            if t[4] in groups:
+                _join(groups[t[4]], i)
+            else:
+                groups[t[4]] = i
+    loci = {}
+    results = []
+    for i in order:
+        root = _root(i)
+        if root not in loci:
+            loci[root] = []
+            results.append(loci[root])
+        loci[root].append(transcripts[i][3])
+    return results
+
+
+if __name__ == "__main__":
+    # doctests, then a benchmark against the find() + set based pOverlap
+    # loop previously used in train: python -m funannotate.loci [number]
+    import sys
+    import time
+    import random
+    import doctest
+    from funannotate.interlap import InterLap
+    print(doctest.testmod(verbose=0,
+                          optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
+
+    def _legacy_pOverlap(one, two):
+        rone = set(range(one[0], one[1]))
+        rtwo = set(range(two[0], two[1]))
+        overlap = rone & rtwo
+        return len(overlap) / float(len(rone))
+
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random.seed(42)
+    txs = []
+    for i in range(num):
+        start = random.randint(1, 20000000)
+        txs.append(('chr1', start, start + random.randint(300, 5000), 'asmbl_%i' % i))
+    t0 = time.time()
+    inter = InterLap([(t[1], t[2], t[3]) for t in txs])
+    for x in inter:
+        [y for y in inter.find(x) if _legacy_pOverlap(x, y) >= 0.3]
+    t_legacy = time.time() - t0
+    t0 = time.time()
+    loci = clusterLoci(txs, fraction=0.3)
+    t_sweep = time.time() - t0
+    print('{:,} transcripts: {:.3f} sec find + pOverlap, {:.3f} sec clusterLoci '
+          '({:,} loci)'.format(num, t_legacy, t_sweep, len(loci)))
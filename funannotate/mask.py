@@ -8,8 +8,8 @@ import os
 import argparse
 import shutil
 import subprocess
-from Bio.SeqIO.FastaIO import SimpleFastaParser
 import funannotate.library as lib
+from funannotate.genomescan import AssemblyStats, scanFasta
 
 
 def runTanTan(input, output):
@@ -176,14 +176,12 @@ def main(args):
                 sys.exit(1)
 
     # output some stats on %reads masked.
-    scaffolds = 0
-    maskedSize = 0
-    GenomeLength = 0
-    with open(args.out, 'r') as input:
-        for rec, Seq in SimpleFastaParser(input):
-            scaffolds += 1
-            GenomeLength += len(Seq)
-            maskedSize += lib.n_lower_chars(Seq)
+    assembly = AssemblyStats()
+    for scan in scanFasta(args.out, repeats=False, gaps=False):
+        assembly.add(scan)
+    scaffolds = len(assembly.lengths)
+    maskedSize = assembly.masked
+    GenomeLength = assembly.length
 
     percentMask = maskedSize / float(GenomeLength)
     lib.log.info('Repeat soft-masking finished: \nMasked genome: {:}\nnum scaffolds: {:,}\nassembly size: {:,} bp\nmasked repeats: {:,} bp ({:.2f}%)'.format(
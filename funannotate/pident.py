@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+'''
+Protein identity of old/new translation pairs for update and contrast.
+
+The score of a pair is the number of matches in a global alignment
+(Bio.pairwise2 globalxx), pident is the score over the length of the longer
+protein. Scores are computed with score_only, which gives the same score as
+align[0][2] without building every optimal alignment.
+
+ProteinIdentity deduplicates pairs by a hash of the two sequences, aligns the
+missing ones in a pool of workers with compute(), and keeps the scores in the
+annotation cache so that a repeated update or contrast run does not align the
+same proteins again. score() and pident() look a pair up, aligning it on the
+spot if it was not computed.
+
+Scores are only kept between runs when the annotation cache is enabled, i.e.
+FUNANNOTATE_CACHE is set to a folder or to "on" (see annotcache), otherwise
+they last for the ProteinIdentity object.
+
+The cached scores are split in SHARDS entries by the first byte of the pair
+hash. A run only reads the shards of the pairs it looks up and only rewrites
+the shards it added scores to, each entry stays small and is evicted on its
+own by the cache, and concurrent runs rarely write the same shard.
+
+>>> identity = ProteinIdentity(cache=False)
+>>> identity.compute([('MKVLAT', 'MKVAT'), ('MKVLAT', 'MKVLAT')])
+1
+>>> print(identity.score('MKVLAT', 'MKVAT'))
+5.0
+>>> print('{:.1f}'.format(identity.pident('MKVLAT', 'MKVAT')))
+83.3
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import hashlib
+import multiprocessing
+from collections import defaultdict
+from funannotate.annotcache import defaultCache
+
+__all__ = ['ProteinIdentity', 'alignScore', 'pairKey']
+
+# cache entries the scores are split in
+SHARDS = 256
+
+
+def pairKey(query, ref):
+    '''
+    hash of a (query, ref) protein pair
+    '''
+    data = '{:}\t{:}'.format(query, ref)
+    return hashlib.sha1(data.encode('ascii', 'replace')).digest()
+
+
+def _shard(key):
+    # cache shard of a pairKey
+    return bytearray(key[:1])[0] % SHARDS
+
+
+def alignScore(pair):
+    '''
+    globalxx score of a (query, ref) protein pair
+    '''
+    from Bio import pairwise2
+    query, ref = pair
+    if query == ref:
+        return float(len(ref))
+    return pairwise2.align.globalxx(query, ref, score_only=True)
+
+
+class ProteinIdentity(object):
+    '''
+    alignment scores of protein pairs, computed in batches and cached between
+    runs; cache is an AnnotationCache, None for the default one or False to
+    keep the scores in memory only
+    '''
+
+    def __init__(self, cache=None):
+        self.scores = {}
+        self.new = {}
+        self.cache = cache
+        self.loaded = set()
+
+    def _cache(self):
+        if self.cache is None:
+            self.cache = defaultCache() or False
+        return self.cache
+
+    def _shardKey(self, shard):
+        return self.cache.key('ProteinIdentity', [], shard)
+
+    def _load(self, keys):
+        # read the cache shards holding keys, each one once
+        if not self._cache():
+            return
+        for shard in set(_shard(x) for x in keys) - self.loaded:
+            self.loaded.add(shard)
+            self.scores.update(self.cache.get(self._shardKey(shard)) or {})
+
+    def save(self):
+        '''
+        add the new scores to their cache shards, merged with those of other
+        runs
+        '''
+        if not self._cache() or not self.new:
+            return
+        shards = defaultdict(dict)
+        for key, score in self.new.items():
+            shards[_shard(key)][key] = score
+        for shard, new in shards.items():
+            scores = self.cache.get(self._shardKey(shard)) or {}
+            scores.update(new)
+            self.cache.put(self._shardKey(shard), scores)
+        self.new = {}
+
+    def compute(self, pairs, cpus=1):
+        '''
+        align the (query, ref) pairs that are not known yet, returns the
+        number of alignments run
+        '''
+        todo = {}
+        for query, ref in pairs:
+            if query == ref:
+                continue
+            key = pairKey(query, ref)
+            if key not in todo:
+                todo[key] = (query, ref)
+        self._load(todo.keys())
+        keys = [x for x in todo if x not in self.scores]
+        if not keys:
+            return 0
+        tasks = [todo[x] for x in keys]
+        if cpus > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(processes=min(cpus, len(tasks)))
+            try:
+                results = pool.map(alignScore, tasks,
+                                   chunksize=max(1, len(tasks) // (cpus * 4)))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [alignScore(x) for x in tasks]
+        for key, score in zip(keys, results):
+            self.scores[key] = score
+            self.new[key] = score
+        self.save()
+        return len(tasks)
+
+    def score(self, query, ref):
+        '''
+        globalxx score (number of matches) of query aligned to ref
+        '''
+        key = pairKey(query, ref)
+        self._load([key])
+        if key not in self.scores:
+            self.scores[key] = alignScore((query, ref))
+        return self.scores[key]
+
+    def pident(self, query, ref):
+        '''
+        percent identity over the length of the longer protein
+        '''
+        if query == ref:
+            return 100.0
+        length = max(len(query), len(ref))
+        return (self.score(query, ref) / float(length)) * 100
+
+
+if __name__ == "__main__":
+    # doctests, then time the full pairwise2 alignment per pair used before
+    # against batched score_only with a repeated run from the cache:
+    # python -m funannotate.pident [pairs] [cpus]
+    import sys
+    import time
+    import random
+    import doctest
+    import tempfile
+    import shutil
+    from Bio import pairwise2
+    from funannotate.annotcache import AnnotationCache
+    print(doctest.testmod(verbose=0,
+                          optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
+
+    def _legacy_pairwiseAlign(query, ref):
+        if query == ref:
+            return 100.0
+        align = pairwise2.align.globalxx(query, ref)
+        length = max(len(query), len(ref))
+        return (align[0][2] / float(length)) * 100
+
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    cpus = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    random.seed(42)
+    aa = 'ACDEFGHIKLMNPQRSTVWY'
+    pairs = []
+    for i in range(num):
+        old = ''.join(random.choice(aa) for x in range(random.randint(100, 500)))
+        new = list(old)
+        for x in range(random.randint(0, len(old) // 10)):
+            new[random.randrange(len(new))] = random.choice(aa)
+        new = ''.join(new[random.randint(0, 20):])
+        # isoforms repeat the same pair
+        pairs.extend([(new, old)] * random.choice([1, 1, 2, 3]))
+    t0 = time.time()
+    legacy = [_legacy_pairwiseAlign(q, r) for q, r in pairs]
+    t_legacy = time.time() - t0
+    folder = tempfile.mkdtemp()
+    try:
+        timings = []
+        for run in range(2):
+            t0 = time.time()
+            identity = ProteinIdentity(cache=AnnotationCache(folder))
+            aligned = identity.compute(pairs, cpus=cpus)
+            batch = [identity.pident(q, r) for q, r in pairs]
+            timings.append((time.time() - t0, aligned))
+            assert batch == legacy
+    finally:
+        shutil.rmtree(folder)
+    print('{:,} pairs: {:.3f} sec pairwise2 per pair, {:.3f} sec batched ({:,} '
+          'aligned), {:.3f} sec cached ({:,} aligned)'.format(
+              len(pairs), t_legacy, timings[0][0], timings[0][1], timings[1][0],
+              timings[1][1]))
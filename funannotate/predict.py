@@ -100,6 +100,8 @@ def main(args):
                         help='BUSCO model database')
     parser.add_argument('-t', '--tbl2asn', default='-l paired-ends',
                         help='Parameters for tbl2asn, linkage and gap info')
+    parser.add_argument('--ncbi_validate', action='store_true',
+                        help='Run NCBI tbl2asn to write GenBank file and validation reports')
     parser.add_argument('--organism', default='fungus',
                         choices=['fungus', 'other'], help='Fungal specific settings')
     parser.add_argument('--SeqCenter', default='CFMR',
@@ -282,8 +284,10 @@ def main(args):
 
     lib.log.debug(StartWeights)
 
-    programs = ['exonerate', 'diamond', 'tbl2asn', 'bedtools',
+    programs = ['exonerate', 'diamond', 'bedtools',
                 'augustus', 'etraining', 'tRNAscan-SE', BAM2HINTS]
+    if args.ncbi_validate:
+        programs.append('tbl2asn')
     programs = programs + args.aligners
     if 'blat' in args.aligners:
         programs = programs + ['pslCDnaFilter']
@@ -1744,8 +1748,7 @@ If you can run GeneMark outside funannotate you can add with --genemark_gtf opti
     EVM_proteins = os.path.join(
         args.out, 'predict_misc', 'evm.round1.proteins.fa')
     # translate GFF3 to proteins
-    EVMGenes = {}
-    EVMGenes = lib.gff2dict(EVM_out, MaskGenome, EVMGenes)
+    EVMGenes = lib.loadGFF3(EVM_out, MaskGenome, cpus=args.cpus)
     with open(EVM_proteins, 'w') as evmprots:
         for k, v in natsorted(EVMGenes.items()):
             for i, x in enumerate(v['ids']):
@@ -1823,16 +1826,20 @@ If you can run GeneMark outside funannotate you can add with --genemark_gtf opti
     discrep = os.path.join(args.out, 'predict_results',
                            organism_name + '.discrepency.report.txt')
     lib.log.info("Converting to final Genbank format")
-    # have to run as subprocess because of multiprocessing issues
-    cmd = [sys.executable, os.path.join(parentdir, 'aux_scripts', 'tbl2asn_parallel.py'),
-           '-i', tbl_file, '-f', MaskGenome, '-o', gag3dir, '--sbt', SBT, '-d', discrep,
-           '-s', args.species, '-t', args.tbl2asn, '-v', '1', '-c', str(args.cpus)]
-    if args.isolate:
-        cmd += ['--isolate', args.isolate]
-    if args.strain:
-        cmd += ['--strain', args.strain]
-    lib.log.debug(' '.join(cmd))
-    subprocess.call(cmd)
+    if args.ncbi_validate:
+        # have to run as subprocess because of multiprocessing issues
+        cmd = [sys.executable, os.path.join(parentdir, 'aux_scripts', 'tbl2asn_parallel.py'),
+               '-i', tbl_file, '-f', MaskGenome, '-o', gag3dir, '--sbt', SBT, '-d', discrep,
+               '-s', args.species, '-t', args.tbl2asn, '-v', '1', '-c', str(args.cpus)]
+        if args.isolate:
+            cmd += ['--isolate', args.isolate]
+        if args.strain:
+            cmd += ['--strain', args.strain]
+        lib.log.debug(' '.join(cmd))
+        subprocess.call(cmd)
+    else:
+        lib.tbl2gbk(tbl_file, MaskGenome, os.path.join(gag3dir, 'genome.gbf'), args.species,
+                    strain=args.strain, isolate=args.isolate, parameters=args.tbl2asn, cpus=args.cpus)
     # check if completed successfully
     if not lib.checkannotations(os.path.join(gag3dir, 'genome.gbf')):
         lib.log.info(
@@ -1842,8 +1849,9 @@ If you can run GeneMark outside funannotate you can add with --genemark_gtf opti
     # retrieve files/reorganize
     shutil.copyfile(os.path.join(gag3dir, 'genome.gbf'), final_gbk)
     shutil.copyfile(os.path.join(gag3dir, 'genome.tbl'), final_tbl)
-    shutil.copyfile(os.path.join(gag3dir, 'genome.val'), final_validation)
-    shutil.copyfile(os.path.join(gag3dir, 'errorsummary.val'), final_error)
+    if args.ncbi_validate:
+        shutil.copyfile(os.path.join(gag3dir, 'genome.val'), final_validation)
+        shutil.copyfile(os.path.join(gag3dir, 'errorsummary.val'), final_error)
     lib.tbl2allout(final_tbl, MaskGenome, final_gff, final_proteins,
                    final_transcripts, final_cds_transcripts, final_fasta)
     total = lib.countGFFgenes(final_gff)
@@ -1854,15 +1862,16 @@ If you can run GeneMark outside funannotate you can add with --genemark_gtf opti
         "Funannotate predict is finished, output files are in the %s/predict_results folder" % (args.out))
 
     # check if there are error that need to be fixed
-    errors = lib.ncbiCheckErrors(
-        final_error, final_validation, prefix, final_fixes)
-    if errors > 0:
-        sys.stderr.write(
-            '-------------------------------------------------------\n')
-        lib.log.info("Manually edit the tbl file %s, then run:\n\nfunannotate fix -i %s -t %s\n" %
-                     (final_tbl, final_gbk, final_tbl))
-        lib.log.info(
-            "After the problematic gene models are fixed, you can proceed with functional annotation.")
+    if args.ncbi_validate:
+        errors = lib.ncbiCheckErrors(
+            final_error, final_validation, prefix, final_fixes)
+        if errors > 0:
+            sys.stderr.write(
+                '-------------------------------------------------------\n')
+            lib.log.info("Manually edit the tbl file %s, then run:\n\nfunannotate fix -i %s -t %s\n" %
+                         (final_tbl, final_gbk, final_tbl))
+            lib.log.info(
+                "After the problematic gene models are fixed, you can proceed with functional annotation.")
 
     # give a suggested command
     if args.rna_bam and args.pasa_gff and os.path.isdir(os.path.join(args.out, 'training')):
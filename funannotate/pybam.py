@@ -18,7 +18,7 @@ import time
 import tempfile
 import subprocess
 from array import array
-from struct import unpack
+from struct import pack, unpack
 
 CtoPy = {'A': '<c', 'c': '<b', 'C': '<B', 's': '<h',
          'S': '<H', 'i': '<i', 'I': '<I', 'f': '<f'}
@@ -26,6 +26,9 @@ py4py = {'A':  1, 'c':  1, 'C':  1, 's':  2,
          'S':  2, 'i':  4, 'I':  4, 'f':  4}
 dna_codes = '=ACMGRSVTWYHKDBN'
 cigar_codes = 'MIDNSHP=X'
+# decompressor='threads': default number of threads, and bgzip blocks inflated per task
+THREADS = 4
+BATCH = 16
 parse_codes = {
     'sam':                     ' The current alignment in SAM format.',
     'bam':                     ' All the bytes that make up the current alignment ("read"),\n                              still in binary just as it was in the BAM file. Useful\n                              when creating a new BAM file of filtered alignments.',
@@ -74,7 +77,7 @@ parse_codes = {
     'file_bytes_read':         ' A running counter of the bytes read from the file. Note\n                              that as data is read in arbitary chunks, this is literally\n                              the amount of data read from the file/pipe by pybam.',
     'file_chromosome_lengths': ' The binary header of the BAM file includes chromosome names\n                              and chromosome lengths. This is a dictionary of chromosome-name\n                              keys and chromosome-length values.',
     'file_chromosomes':        ' A list of chromosomes from the binary header.',
-    'file_decompressor':       ' BAM files are compressed with bgzip. The value here reflects\n                              the decompressor used. "internal" if pybam\'s internal\n                              decompressor is being used, "gzip" or "pigz" if the system\n                              has these binaries installed and pybam can find them.\n                              Any other value reflects a custom decompression command.',
+    'file_decompressor':       ' BAM files are compressed with bgzip. The value here reflects\n                              the decompressor used. "internal" if pybam\'s internal\n                              decompressor is being used, "threads" if it inflates blocks\n                              in a pool of threads, "gzip" or "pigz" if the system\n                              has these binaries installed and pybam can find them.\n                              Any other value reflects a custom decompression command.',
     'file_directory':          ' The directory the input BAM file can be found in. This will be\n                              correct if the input file is specified via a string or python\n                              file object, however if the input is a pipe such as sys.stdin, \n                              then the current working directory will be used.',
     'file_header':             ' The ASCII portion of the BAM header. This is the typical header\n                              users of samtools will be familiar with.',
     'file_name':               ' The file name (base name) of input file if input is a string or\n                              python file object. If input is via stdin this will be "<stdin>"'
@@ -109,6 +112,16 @@ Github:     http://github.com/JohnLonginotto/pybam
 [ Force Internal bgzip Decompressor ]
   my_bam = pybam.read('/my/data.bam',decompressor='internal')
 
+[ Internal bgzip Decompressor with a Pool of Threads ]
+  my_bam = pybam.read('/my/data.bam',decompressor='threads',threads=4)
+  my_bam.close()  # only needed when stopping before the end of the file, see read.close
+
+[ Region Query with a BAM Index (.bai) ]
+  my_bam = pybam.indexed('/my/data.bam')  # finds /my/data.bam.bai or /my/data.bai
+  for alignment in my_bam.fetch('chr1',10000,20000):  # 0-based start, end exclusive
+      print alignment.sam_pos1
+  print my_bam.counts('chr1')  # (mapped, unmapped) from the index, no alignments read
+
 [ Parse Words (hah) ]'''
 wat += '\n'+''.join([('\n===============================================================================================\n\n  ' if code is 'file_alignments_read' or code is 'sam' else '  ') +
                      (code+' ').ljust(25, '-')+description+'\n' for code, description in sorted(parse_codes.items())]) + '\n'
@@ -141,11 +154,16 @@ class read:
     [ Force Internal bgzip Decompressor ]
     my_bam = pybam.read('/my/data.bam',decompressor='internal')
 
+    [ Internal bgzip Decompressor with a Pool of Threads ]
+    my_bam = pybam.read('/my/data.bam',decompressor='threads',threads=4)
+
+    Region queries with a BAM index are done with pybam.indexed (see below).
+
     "print pybam.wat" in the python terminal to see the possible parsable values,
     or visit http://github.com/JohnLonginotto/pybam for the latest info.
     '''
 
-    def __init__(self, f, fields=False, decompressor=False):
+    def __init__(self, f, fields=False, decompressor=False, threads=None):
         self.file_bytes_read = 0
         self.file_chromosomes = []
         self.file_alignments_read = 0
@@ -165,7 +183,9 @@ class read:
                         raise PybamError('\n\nStatic parser field "' + str(field) + '" from fields ' + str(
                             fields) + ' does not start with "sam" or "bam" and thus is not an avaliable field for the static parsing.\nPrint "pybam.wat" in interactive python to see available field names with explinations.\n')
 
-        if decompressor:
+        if decompressor == 'threads':
+            self._threads = threads or THREADS
+        elif decompressor:
             if type(decompressor) is str:
                 if decompressor is not 'internal' and '{}' not in decompressor:
                     raise PybamError(
@@ -219,6 +239,15 @@ class read:
                 raise StopIteration
 
             elif magic == "\x1f\x8b\x08\x04":  # The user has passed us compressed gzip/bgzip data, which is typical for a BAM file
+                # inflate the bgzip blocks in a pool of threads, zlib releases the GIL while it works:
+                if decompressor == 'threads':
+                    self.file_decompressor = 'threads'
+                    for data in self._threaded_blocks(magic):
+                        yield data
+                    self._file.close()
+                    DEVNULL.close()
+                    raise StopIteration
+
                 # use custom decompressor if provided:
                 if decompressor is not False and decompressor is not 'internal':
                     if type(f) is str:
@@ -286,7 +315,7 @@ class read:
                     checkpoint = 0
                     decompress = zlib.decompress
                     while raw_data:
-                        if len(raw_data) - bs < 35536:
+                        if len(raw_data) - bs < 65536:  # 64kb is the largest possible block
                             raw_data = raw_data[bs:] + self._file.read(65536)
                             self.file_bytes_read += len(raw_data) - bs
                             bs = 0
@@ -348,7 +377,7 @@ class read:
                         yield ''.join(internal_cache)
                     raise StopIteration
 
-            elif decompressor is not False and decompressor is not 'internal':
+            elif decompressor is not False and decompressor is not 'internal' and decompressor != 'threads':
                 # It wouldn't be safe to just print to the shell four random bytes from the beginning of a file, so instead it's
                 # written to a temp file and cat'd. The idea here being that we trust the decompressor string as it was written by
                 # someone with access to python, so it has system access anyway. The file/data, however, should not be trusted.
@@ -710,6 +739,54 @@ class read:
             def next_read(): return next(self._new_entry)
         self.next = next_read
 
+    def _threaded_blocks(self, magic):
+        # Split the file into bgzip blocks here and inflate batches of them in a thread pool. At most 2 batches per
+        # thread are in flight, and the results are yielded in file order, so memory stays bounded and reads keep their order.
+        from collections import deque
+        from multiprocessing.pool import ThreadPool
+        pool = self._pool = ThreadPool(self._threads)
+        pending = deque()
+        raw_data = magic + self._file.read(1048576)
+        self.file_bytes_read = len(raw_data)
+        bs = 0
+        batch = []
+        try:
+            while True:
+                if len(raw_data) - bs < 65536:  # 64kb is the largest possible block
+                    more = self._file.read(1048576)
+                    self.file_bytes_read += len(more)
+                    raw_data = raw_data[bs:] + more
+                    bs = 0
+                if bs >= len(raw_data):
+                    break
+                if raw_data[bs:bs+4] != "\x1f\x8b\x08\x04":
+                    raise PybamError(
+                        '\n\nThe input file is not in a format I understand. First four bytes: ' + repr(raw_data[bs:bs+4]) + '\n')
+                extra_len = unpack("<H", raw_data[bs+10:bs+12])[0]
+                block_size = None
+                p = bs + 12
+                while p < bs + 12 + extra_len:  # find the BC subfield, almost always the only one
+                    subfield_len = unpack("<H", raw_data[p+2:p+4])[0]
+                    if raw_data[p:p+2] == 'BC':
+                        block_size = unpack("<H", raw_data[p+4:p+6])[0]
+                    p += 4 + subfield_len
+                if block_size is None:
+                    raise PybamError('\n\nThe input file is gzip compressed, but not with bgzip (no BC field).\n')
+                batch.append(raw_data[bs+12+extra_len:bs+block_size+1-8])
+                bs += block_size + 1
+                if len(batch) == BATCH:
+                    pending.append(pool.apply_async(_inflate, (batch,)))
+                    batch = []
+                    if len(pending) >= 2 * self._threads:
+                        yield pending.popleft().get()
+            if batch:
+                pending.append(pool.apply_async(_inflate, (batch,)))
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+            self._pool = None
+
     def __iter__(self): return self
 
     def __str__(self): return self.sam
@@ -904,11 +981,280 @@ class read:
     def _end_of_qual(self): return self._end_of_seq + \
         self.sam_l_seq            # qual has the same length as seq
 
-    def __del__(self):
-        if self._subprocess.returncode is None:
+    def close(self):
+        # stop the thread pool or decompressor subprocess and close the file. A reader dropped part-way is
+        # never collected on python 2 (the generator and self reference each other and the class has a
+        # __del__), so its pool threads keep running unless close() is called when stopping early.
+        if getattr(self, '_pool', None) is not None:
+            self._pool.terminate()
+            self._pool = None
+        # there is no subprocess when the internal decompressors are used
+        if hasattr(self, '_subprocess') and self._subprocess.returncode is None:
             self._subprocess.kill()
         self._file.close()
 
+    def __del__(self):
+        self.close()
+
+
+def _inflate(blocks):
+    # raw deflate data of several bgzip blocks -> their uncompressed data, joined
+    return ''.join([zlib.decompress(block, -15) for block in blocks])
+
+
+def reg2bins(beg, end):
+    # bins that may hold alignments overlapping [beg, end), as in section 5.3 of the SAM specification
+    end -= 1
+    bins = [0]
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+def find_index(f):
+    # the .bai next to a BAM file, named data.bam.bai (samtools) or data.bai (picard), None if there is neither.
+    # An index older than the BAM was made for a previous version of the file and is ignored.
+    bam_mtime = os.path.getmtime(f)
+    for path in (f + '.bai', os.path.splitext(f)[0] + '.bai'):
+        if os.path.isfile(path) and os.path.getmtime(path) >= bam_mtime:
+            return path
+    return None
+
+
+class bai:
+    '''
+    A BAM index (.bai), as written by samtools index. For each reference it holds the binned chunks
+    (virtual file offsets of the alignments in each bin), the linear index (the smallest offset of the
+    alignments overlapping each 16kb window) and, when present, the number of mapped and unmapped reads.
+
+    my_index = pybam.bai('/my/data.bam.bai')
+    print my_index.chunks(0,10000,20000)
+    '''
+
+    def __init__(self, f):
+        with open(f, 'rb') as index_file:
+            data = index_file.read()
+        if data[:4] != 'BAI\1':
+            raise PybamError('\n\nInput file ' + str(f) + ' does not appear to be a BAM index (.bai).\n')
+        self.file_name = os.path.basename(os.path.realpath(f))
+        self.bins = []       # per reference, {bin: [(begin,end) virtual offsets]}
+        self.ioffsets = []   # per reference, linear index of virtual offsets
+        self.mapped = []     # per reference, (mapped, unmapped) or None when the index has no pseudo-bins
+        n_ref = unpack('<i', data[4:8])[0]
+        p = 8
+        for _ in range(n_ref):
+            bins = {}
+            mapped = None
+            n_bin = unpack('<i', data[p:p+4])[0]
+            p += 4
+            for _ in range(n_bin):
+                bin_id, n_chunk = unpack('<Ii', data[p:p+8])
+                p += 8
+                offsets = unpack('<' + str(2*n_chunk) + 'Q', data[p:p+16*n_chunk])
+                p += 16*n_chunk
+                if bin_id == 37450:  # the pseudo-bin: (ref_beg, ref_end), (n_mapped, n_unmapped)
+                    mapped = offsets[2:4]
+                else:
+                    bins[bin_id] = zip(offsets[::2], offsets[1::2])
+            n_intv = unpack('<i', data[p:p+4])[0]
+            p += 4
+            self.ioffsets.append(unpack('<' + str(n_intv) + 'Q', data[p:p+8*n_intv]))
+            p += 8*n_intv
+            self.bins.append(bins)
+            self.mapped.append(mapped)
+        # reads without a position, optional at the end of the file
+        self.unplaced = unpack('<Q', data[p:p+8])[0] if len(data) >= p + 8 else None
+
+    def chunks(self, refID, beg, end):
+        # sorted, merged (begin,end) virtual offsets holding every alignment of refID that overlaps [beg, end)
+        ioffsets = self.ioffsets[refID]
+        if ioffsets:
+            min_offset = ioffsets[min(beg >> 14, len(ioffsets) - 1)]
+        else:
+            min_offset = 0
+        found = []
+        bins = self.bins[refID]
+        for bin_id in reg2bins(beg, end):
+            for chunk in bins.get(bin_id, ()):
+                if chunk[1] > min_offset:
+                    found.append(chunk)
+        found.sort()
+        merged = []
+        for chunk_beg, chunk_end in found:
+            if merged and chunk_beg <= merged[-1][1]:
+                if chunk_end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], chunk_end)
+            else:
+                merged.append((chunk_beg, chunk_end))
+        return merged
+
+
+class bgzf:
+    '''
+    Random access to the uncompressed data of a bgzip compressed file through virtual file offsets,
+    (compressed offset of a block << 16 | offset in the uncompressed block), as stored in a BAM index.
+    Only the blocks that are read get inflated.
+    '''
+
+    def __init__(self, f):
+        self._file = f
+        self._data = ''
+        self._within = 0
+        self._block_start = 0
+        self._next_block = 0
+
+    def _load(self, coffset):
+        self._file.seek(coffset)
+        self._block_start = coffset
+        self._data = ''
+        self._within = 0
+        header = self._file.read(12)
+        if not header:
+            self._next_block = coffset
+            return False
+        if header[:4] != "\x1f\x8b\x08\x04":
+            raise PybamError('\n\nThe input file is not in a format I understand. First four bytes: ' + repr(header[:4]) + '\n')
+        extra_len = unpack("<H", header[10:12])[0]
+        extra = self._file.read(extra_len)
+        block_size = None
+        p = 0
+        while p < extra_len:
+            subfield_len = unpack("<H", extra[p+2:p+4])[0]
+            if extra[p:p+2] == 'BC':
+                block_size = unpack("<H", extra[p+4:p+6])[0]
+            p += 4 + subfield_len
+        if block_size is None:
+            raise PybamError('\n\nThe input file is gzip compressed, but not with bgzip (no BC field).\n')
+        self._data = zlib.decompress(self._file.read(block_size + 1 - 12 - extra_len)[:-8], -15)
+        self._next_block = coffset + block_size + 1
+        return True
+
+    def seek(self, voffset):
+        coffset, uoffset = voffset >> 16, voffset & 0xFFFF
+        if coffset != self._block_start or not self._data:
+            self._load(coffset)
+        self._within = uoffset
+
+    def tell(self):
+        # at the end of a block this is the start of the next one, as in the index
+        if self._within >= len(self._data):
+            return self._next_block << 16
+        return (self._block_start << 16) | self._within
+
+    def read(self, size):
+        chunks = []
+        while size > 0:
+            if self._within >= len(self._data):
+                if not self._load(self._next_block):
+                    break
+                continue  # the empty EOF block
+            data = self._data[self._within:self._within + size]
+            self._within += len(data)
+            size -= len(data)
+            chunks.append(data)
+        return ''.join(chunks)
+
+
+class indexed(read):
+    '''
+    [ Region Query with a BAM Index (.bai) ]
+    my_bam = pybam.indexed('/my/data.bam')
+    for alignment in my_bam.fetch('chr1',10000,20000):
+        print alignment.sam_pos1
+
+    Alignments are parsed with the same methods as pybam.read (sam_pos1, sam_rname, sam_cigar_list...).
+    fetch() takes 0-based, end exclusive coordinates and yields the alignments overlapping them, only the
+    bgzip blocks named by the index for that region are read and inflated. counts() returns the
+    (mapped, unmapped) reads of a chromosome straight from the index.
+
+    The header is read when the file is opened and the index only on the first fetch() or counts(),
+    so this is also a cheap way to get file_chromosomes from a BAM without an index.
+    '''
+
+    def __init__(self, f, index=None):
+        self.file_bytes_read = 0
+        self.file_chromosomes = []
+        self.file_alignments_read = 0
+        self.file_chromosome_lengths = {}
+        self.file_decompressor = 'internal'
+        if type(f) is not str and type(f) is not unicode:
+            raise PybamError('\n\npybam.indexed needs the path of a BAM file. It was: "' + str(f) + '"\n')
+        self._index_file = index
+        self._index = None
+        self._file = open(f, 'rb')
+        self.file_name = os.path.basename(os.path.realpath(f))
+        self.file_directory = os.path.dirname(os.path.realpath(f))
+        self._bgzf = bgzf(self._file)
+        read_bytes = self._bgzf.read
+
+        if read_bytes(4) != 'BAM\1':
+            raise PybamError('\n\nInput file ' + self.file_name + ' does not appear to be a BAM file.\n')
+        length_of_header = unpack('<i', read_bytes(4))[0]
+        self.file_header = read_bytes(length_of_header)
+        binary_header = ['BAM\1', pack('<i', length_of_header), self.file_header]
+        number_of_reference_sequences = read_bytes(4)
+        binary_header.append(number_of_reference_sequences)
+        for _ in range(unpack('<i', number_of_reference_sequences)[0]):
+            l_name = read_bytes(4)
+            name = read_bytes(unpack('<l', l_name)[0])
+            l_ref = read_bytes(4)
+            binary_header.extend([l_name, name, l_ref])
+            self.file_chromosomes.append(name[:-1])
+            self.file_chromosome_lengths[name[:-1]] = unpack('<l', l_ref)[0]
+        self.file_binary_header = buffer(''.join(binary_header))
+        self.file_bytes_read = self._file.tell()
+        self._refIDs = dict((name, refID) for refID, name in enumerate(self.file_chromosomes))
+
+    @property
+    def index(self):
+        if self._index is None:
+            path = self._index_file or find_index(os.path.join(self.file_directory, self.file_name))
+            if path is None:
+                raise PybamError('\n\nNo up to date index (.bai) found for ' + self.file_name + ', run "samtools index" on it first.\n')
+            self._index = bai(path)
+        return self._index
+
+    def counts(self, chromosome):
+        # (mapped, unmapped) reads on a chromosome from the index, None if the index does not store them
+        return self.index.mapped[self._refIDs[chromosome]]
+
+    def fetch(self, chromosome, start=0, end=None):
+        if chromosome not in self._refIDs:
+            raise PybamError('\n\nChromosome "' + str(chromosome) + '" is not in the header of ' + self.file_name + '\n')
+        refID = self._refIDs[chromosome]
+        if end is None:
+            end = self.file_chromosome_lengths[chromosome]
+        start = max(0, start)
+        if end <= start:
+            return
+        read_bytes = self._bgzf.read
+        for chunk_beg, chunk_end in self.index.chunks(refID, start, end):
+            self._bgzf.seek(chunk_beg)
+            while self._bgzf.tell() < chunk_end:
+                block_size = read_bytes(4)
+                if len(block_size) < 4:
+                    break
+                self.sam_block_size = unpack('<i', block_size)[0]
+                self.bam = block_size + read_bytes(self.sam_block_size)
+                self.file_alignments_read += 1
+                ref, pos = unpack('<ii', self.bam[4:12])
+                if ref != refID or pos >= end:
+                    return  # the BAM is sorted, nothing after this can overlap
+                # the alignment ends after the reference bases consumed by its CIGAR (M, D, N, = and X)
+                alignment_end = pos
+                for cig in array('I', self.bam[self._end_of_qname:self._end_of_cigar]):
+                    if cig & 0b1111 in (0, 2, 3, 7, 8):
+                        alignment_end += cig >> 4
+                if max(alignment_end, pos + 1) > start:
+                    yield self
+
+    def __iter__(self):
+        raise PybamError('\n\npybam.indexed reads regions, use fetch(chromosome,start,end) or pybam.read to go through the whole file.\n')
+
+    def __del__(self):
+        if hasattr(self, '_file'):
+            self._file.close()
+
 
 class PybamWarn(Exception):
     pass
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+'''
+Table driven sequence operations shared by library, update and contrast.
+
+RevComp uses a single str.translate() call with a complement table instead of
+building the result one character at a time, translate() looks codons up in a
+precomputed 64 entry codon index, and translateBatch() translates many CDS
+sequences at once with numpy so the per-transcript Python overhead is paid once
+per batch instead of once per codon.
+
+>>> print(RevComp('ATGcNN'))
+NNGCAT
+>>> print(translate('ATGAAATAG', '+', 0))
+MK*
+>>> print(translate('CTATTTCAT', '-', 0))
+MK*
+>>> print(' '.join(translateBatch([('ATGAAATAG', '+', 0), ('CTATTTCAT', '-', 0),
+...                                ('AATGNNTAA', '+', 1)])))
+MK* MK* MX
+'''
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import sys
+
+__all__ = ['RevComp', 'translate', 'translateBatch', 'CODON_TABLE']
+
+PY3 = sys.version_info[0] >= 3
+
+# IUPAC complement, lowercase input returns the uppercase complement
+_BASES = 'ACGTUMRWSYKVHDBXN'
+_COMPS = 'TGCAAKYWSRMBDHVXN'
+
+# standard genetic code, indexed by 16*first + 4*second + third in TCAG order
+_CODON_ORDER = 'TCAG'
+_AMINO_ACIDS = 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG'
+CODON_TABLE = {}
+for _i, _a in enumerate(_CODON_ORDER):
+    for _j, _b in enumerate(_CODON_ORDER):
+        for _k, _c in enumerate(_CODON_ORDER):
+            CODON_TABLE[_a+_b+_c] = _AMINO_ACIDS[16*_i + 4*_j + _k]
+
+
+def _maketables():
+    src = _BASES + _BASES.lower()
+    dst = _COMPS + _COMPS
+    text = dict((ord(a), ord(b)) for a, b in zip(src, dst))
+    if PY3:
+        raw = bytes.maketrans(src.encode('ascii'), dst.encode('ascii'))
+    else:
+        import string
+        raw = string.maketrans(src.encode('ascii'), dst.encode('ascii'))
+    return text, raw
+
+
+_COMP_TEXT, _COMP_BYTES = _maketables()
+
+
+def _native(s):
+    if PY3 and isinstance(s, bytes):
+        return s.decode('ascii')
+    return s
+
+
+def RevComp(s):
+    '''
+    reverse complement a nucleotide sequence, returns uppercase
+    '''
+    if isinstance(s, bytes):
+        return s.translate(_COMP_BYTES)[::-1]
+    return s.translate(_COMP_TEXT)[::-1]
+
+
+def _frame(cDNA, strand, phase):
+    # orient and trim the sequence so it is a whole number of codons
+    if strand == '-' or strand == -1:
+        seq = RevComp(cDNA)
+    else:
+        seq = cDNA.upper()
+    seq = seq[phase:]
+    return seq[:len(seq) - len(seq) % 3]
+
+
+def translate(cDNA, strand, phase):
+    '''
+    translate cDNA into protein sequence, codons that are not in the
+    standard table (ambiguous bases, gaps) are returned as X
+    '''
+    seq = _native(_frame(cDNA, strand, phase))
+    get = CODON_TABLE.get
+    return ''.join([get(seq[i:i+3], 'X') for i in range(0, len(seq), 3)])
+
+
+def _codonlookup():
+    # base -> 0..3 in TCAG order, anything else -> 4 so that a radix 5 index
+    # of 125 entries holds every codon including the invalid ones
+    import numpy as np
+    base_index = np.full(256, 4, dtype=np.uint8)
+    for i, b in enumerate(_CODON_ORDER):
+        base_index[ord(b)] = i
+        base_index[ord(b.lower())] = i
+    aa_index = np.full(125, ord('X'), dtype=np.uint8)
+    for i in range(4):
+        for j in range(4):
+            for k in range(4):
+                aa_index[25*i + 5*j + k] = ord(_AMINO_ACIDS[16*i + 4*j + k])
+    return base_index, aa_index
+
+
+_LOOKUP = []
+
+
+def translateBatch(records):
+    '''
+    translate many CDS sequences at once, records is an iterable of
+    (cDNA, strand, phase) tuples, returns a list of protein strings
+    in the same order, identical to calling translate() on each record
+    '''
+    import numpy as np
+    if not _LOOKUP:
+        _LOOKUP.extend(_codonlookup())
+    base_index, aa_index = _LOOKUP
+    frames = []
+    for cDNA, strand, phase in records:
+        seq = _frame(cDNA, strand, phase)
+        if not isinstance(seq, bytes):
+            seq = seq.encode('ascii', 'replace')
+        frames.append(seq)
+    if not frames:
+        return []
+    codes = base_index[np.frombuffer(b''.join(frames), dtype=np.uint8)]
+    codes = codes.reshape(-1, 3).astype(np.uint16)
+    protein = aa_index[codes[:, 0] * 25 + codes[:, 1] * 5 + codes[:, 2]]
+    protein = protein.tostring() if not PY3 else protein.tobytes()
+    results = []
+    offset = 0
+    for seq in frames:
+        n = len(seq) // 3
+        results.append(protein[offset:offset+n].decode('ascii'))
+        offset += n
+    return results
+
+
+if __name__ == "__main__":
+    # benchmark against the previous per-character/per-codon implementations
+    # python -m funannotate.seqops [number of genes]
+    import time
+    import random
+    import doctest
+
+    def _legacy_RevComp(s):
+        rev_comp_lib = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'U': 'A', 'M': 'K', 'R': 'Y', 'W': 'W',
+                        'S': 'S', 'Y': 'R', 'K': 'M', 'V': 'B', 'H': 'D', 'D': 'H', 'B': 'V', 'X': 'X', 'N': 'N'}
+        cseq = ''
+        n = len(s)
+        s = s.upper()
+        for i in range(0, n):
+            c = s[n-i-1]
+            cseq += rev_comp_lib[c]
+        return cseq
+
+    def _legacy_translate(cDNA, strand, phase):
+        def _split(str, num):
+            return [str[start:start+num] for start in range(0, len(str), num)]
+        if strand == '-' or strand == -1:
+            seq = _legacy_RevComp(cDNA)
+        else:
+            seq = cDNA
+        seq = seq[phase:]
+        protSeq = []
+        for i in _split(seq, 3):
+            if len(i) == 3:
+                iSeq = i.upper()
+                if iSeq in CODON_TABLE:
+                    protSeq.append(CODON_TABLE[iSeq])
+                else:
+                    protSeq.append('X')
+        return ''.join(protSeq)
+
+    print(doctest.testmod(verbose=0,
+                          optionflags=doctest.REPORT_ONLY_FIRST_FAILURE))
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    random.seed(42)
+    genes = []
+    for i in range(num):
+        length = random.randint(100, 1000) * 3
+        seq = ''.join(random.choice('ACGTacgtN') for x in range(length))
+        genes.append((seq, random.choice('+-'), random.randint(0, 2)))
+    total = sum(len(x[0]) for x in genes)
+    print('{:,} CDS, {:,} bp'.format(num, total))
+
+    t0 = time.time()
+    legacy = [_legacy_translate(*x) for x in genes]
+    t_legacy = time.time() - t0
+    t0 = time.time()
+    single = [translate(*x) for x in genes]
+    t_single = time.time() - t0
+    t0 = time.time()
+    batch = translateBatch(genes)
+    t_batch = time.time() - t0
+    assert legacy == single == batch
+    for name, t in [('legacy translate', t_legacy), ('seqops.translate', t_single),
+                    ('seqops.translateBatch', t_batch)]:
+        print('{:<22} {:>8.3f} sec {:>10.1f} Mb/sec'.format(
+            name, t, total / max(t, 1e-9) / 1e6))
+
+    t0 = time.time()
+    legacy = [_legacy_RevComp(x[0]) for x in genes]
+    t_legacy = time.time() - t0
+    t0 = time.time()
+    table = [RevComp(x[0]) for x in genes]
+    t_table = time.time() - t0
+    assert legacy == table
+    for name, t in [('legacy RevComp', t_legacy), ('seqops.RevComp', t_table)]:
+        print('{:<22} {:>8.3f} sec {:>10.1f} Mb/sec'.format(
+            name, t, total / max(t, 1e-9) / 1e6))
@@ -9,8 +9,7 @@ import argparse
 from Bio import SeqIO
 import funannotate.library as lib
 from natsort import natsorted
-from funannotate.interlap import InterLap
-from collections import defaultdict
+from funannotate.loci import clusterLoci
 from Bio.SeqIO.FastaIO import SimpleFastaParser
 from Bio.SeqIO.QualityIO import FastqGeneralIterator
 
@@ -483,29 +482,19 @@ def getPASAtranscripts2genes(input, output, pasa_alignment_overlap=30):
                                  'mRNA': [(int(start), int(end))]}
                 else:
                     Genes[ID]['mRNA'].append((int(start), int(end)))
-    # after all positions added, now create interlap on start stop positions
-    inter = defaultdict(InterLap)
+    # group the alignments into loci by start stop positions, alignments
+    # overlapping by more than pasa_alignment_overlap are in the same gene
+    transcripts = []
     for k, v in natsorted(Genes.items()):
         sortedExons = sorted(v['mRNA'], key=lambda tup: tup[0])
-        inter[v['contig']].add(
-            (sortedExons[0][0], sortedExons[-1][1], k, v['ids']))
-    # now loop through interlap object and create a gene2transcript dictionary
+        transcripts.append(
+            (v['contig'], sortedExons[0][0], sortedExons[-1][1], v['ids']))
     Transcript2Gene = {}
-    counter = 1
-    for scaffold in inter:
-        for x in inter[scaffold]:
-            loc = [x[0], x[1]]
-            hits = list(inter[scaffold].find(loc))
-            Overlap = []
-            for y in hits:
-                percentOverlap = pOverlap(loc, [y[0], y[1]])
-                if percentOverlap >= (float(pasa_alignment_overlap) / 100) and not y[3] in Transcript2Gene:
-                    Overlap.append(y[3])
-            if len(Overlap) > 0:
-                for transcript in Overlap:
-                    if not transcript in Transcript2Gene:
-                        Transcript2Gene[transcript] = 'g_'+str(counter)
-            counter += 1
+    loci = clusterLoci(transcripts, fraction=float(pasa_alignment_overlap) / 100)
+    for counter, locus in enumerate(loci, start=1):
+        for transcript in locus:
+            if not transcript in Transcript2Gene:
+                Transcript2Gene[transcript] = 'g_'+str(counter)
     # finally print out TSV file
     unique = []
     with open(output, 'w') as outfile:
@@ -516,13 +505,6 @@ def getPASAtranscripts2genes(input, output, pasa_alignment_overlap=30):
     return len(unique)
 
 
-def pOverlap(one, two):
-    rone = set(range(one[0], one[1]))
-    rtwo = set(range(two[0], two[1]))
-    overlap = rone & rtwo
-    return len(overlap) / float(len(rone))
-
-
 def getBestModel(input, fasta, abundances, outfile, pasa_alignment_overlap=30):
     # function to parse PASA results and generate GFF3; supports multiple transcripts
     lib.log.info(
@@ -539,28 +521,16 @@ def getBestModel(input, fasta, abundances, outfile, pasa_alignment_overlap=30):
 
     # load GFF3 output into annotation and interlap dictionaries.
     inter_gene, Genes = lib.gff2interlap(input, fasta)
-    bestHits = []
-    overlap = []
+    bestHits = set()
     for scaffold in inter_gene:
-        for x in inter_gene[scaffold]:
-            loc = [x[0], x[1]]
-            hits = list(inter_gene[scaffold].find(loc))
-            ExpHits = []
-            for y in hits:
-                percentOverlap = pOverlap(loc, [y[0], y[1]])
-                # overlap more than args.pasa_alignment_overlap
-                if percentOverlap >= (float(pasa_alignment_overlap) / 100):
-                    if y[2] in Expression:
-                        ExpHits.append(
-                            (y[2], Expression[y[2]], percentOverlap))
-                    else:
-                        ExpHits.append((y[2], 0.00, percentOverlap))
-            sortedExpHits = sorted(ExpHits, key=lambda x: x[1], reverse=True)
-            for i in range(0, len(sortedExpHits)):
-                if i == 0:
-                    bestHits.append(sortedExpHits[i][0])
-                else:
-                    overlap.append(sortedExpHits[i][0])
+        # keep the most expressed of the hits overlapping each model by more
+        # than args.pasa_alignment_overlap
+        joined = inter_gene[scaffold].join(
+            inter_gene[scaffold], fraction=float(pasa_alignment_overlap) / 100)
+        for x, hits in joined:
+            if hits:
+                best = max(hits, key=lambda y: Expression.get(y[2], 0.00))
+                bestHits.add(best[2])
     bestModels = {}
     for k, v in natsorted(Genes.items()):
         if k in bestHits:
@@ -8,9 +8,14 @@ import subprocess
 import shutil
 import argparse
 import itertools
+import multiprocessing
 from Bio import SeqIO
 import funannotate.library as lib
-from funannotate.interlap import InterLap
+from funannotate.interlap import InterLap, NCLInterLap
+from funannotate.loci import clusterLoci
+from funannotate.aed import geneAEDs
+from funannotate.pident import ProteinIdentity
+from funannotate.genomestore import GenomeStore
 from collections import defaultdict
 from natsort import natsorted
 import numpy as np
@@ -226,7 +231,7 @@ def gbk2pasaNEW(input, gff, trnaout, fastaout, spliceout, exonout, proteinsout):
     return tag, count, justify
 
 
-def gff2pasa(gff_in, fasta, gff_out, trnaout, spliceout, exonout):
+def gff2pasa(gff_in, fasta, gff_out, trnaout, spliceout, exonout, cpus=1):
     '''
     function to parse GFF3 input file and split protein coding models from tRNA and/or rRNA
     models. Generate Hisat2 splice and exon files for mapping.
@@ -234,8 +239,7 @@ def gff2pasa(gff_in, fasta, gff_out, trnaout, spliceout, exonout):
     # load into funanotate structured dictionary
     LocusTags = []
     multiExon = {}
-    genes = {}
-    genes = lib.gff2dict(gff_in, fasta, genes)
+    genes = lib.loadGFF3(gff_in, fasta, cpus=cpus)
     # now loop through dictionary and output desired files
     with open(gff_out, 'w') as gffout:
         gffout.write('##gff-version 3\n')
@@ -940,23 +944,33 @@ def getBestModels(input, fasta, abundances, alt_transcripts, outfile):
     else:
         lib.log.info(
             "Parsing Kallisto results. Keeping best transcript at each locus.")
-    bestModels = {}
-    locations = {}
+    # mRNA coordinates from the PASA GFF3
+    mRNAs = {}
+    with open(input, 'r') as gff:
+        for line in gff:
+            if line.startswith("#") or line.startswith('\n'):
+                continue
+            cols = line.rstrip().split('\t')
+            if cols[2] == 'mRNA':
+                gffID = cols[8].split(';Parent')[0].replace('ID=', '')
+                mRNAs[gffID] = ((cols[0], cols[6]), int(cols[3]), int(cols[4]))
+    # group transcripts into loci, the transcripts of a PASA gene and those
+    # with identical coordinates on the same strand are one locus
+    transcripts = []
+    TPMs, Genes = {}, {}
     with open(abundances, 'r') as tpms:
         for line in tpms:
             line = line.rstrip()
             if line.startswith('#') or line.startswith('target_id'):
                 continue
             transcriptID, geneID, Loc, TPM = line.split('\t')
-            if not Loc in locations:
-                locations[Loc] = geneID
-                geneLocus = geneID
-            else:
-                geneLocus = locations.get(geneID)
-            if not geneLocus in bestModels:
-                bestModels[geneLocus] = [(transcriptID, float(TPM))]
-            else:
-                bestModels[geneLocus].append((transcriptID, float(TPM)))
+            contig, start, end = mRNAs.get(transcriptID, ((Loc, None), 0, 0))
+            transcripts.append((contig, start, end, transcriptID, geneID))
+            TPMs[transcriptID] = float(TPM)
+            Genes[transcriptID] = geneID
+    bestModels = {}
+    for locus in clusterLoci(transcripts, fraction=1.0, reciprocal=True):
+        bestModels[Genes[locus[0]]] = [(x, TPMs[x]) for x in locus]
     # now we have geneID dictionary containing list of tuples of of transcripts
     # loop through each locus grabbing transcript IDs of those models to keep
     # use best expression value * alt_transcript threshold to filter models
@@ -1028,13 +1042,10 @@ def GFF2tblCombinedNEW(evm, genome, trnascan, prefix, genenumber, justify, SeqCe
     # make sure genenumber is integer
     genenumber = int(genenumber)
     # generate genome length dictionary used for feature tbl generation
-    scaffLen = {}
-    with open(genome, 'r') as fastain:
-        for record in SeqIO.parse(fastain, 'fasta'):
-            if not record.id in scaffLen:
-                scaffLen[record.id] = len(record.seq)
+    SeqRecords = GenomeStore(genome)
+    scaffLen = SeqRecords.lengths()
     # setup interlap database for genes on each chromosome and load EVM models into dictionary
-    gene_inter = defaultdict(InterLap)
+    gene_inter = defaultdict(NCLInterLap)
     Genes = {}
     gene_inter, Genes = lib.gff2interlapDict(
         evm, genome, gene_inter, Genes)
@@ -1046,7 +1057,6 @@ def GFF2tblCombinedNEW(evm, genome, trnascan, prefix, genenumber, justify, SeqCe
     sortedGenes = OrderedDict(sGenes)
     renamedGenes = {}
     scaff2genes = {}
-    SeqRecords = SeqIO.to_dict(SeqIO.parse(genome, 'fasta'))
     skipList = []
     dropped = 0
     keeper = 0
@@ -1132,27 +1142,23 @@ def gbk2interlap(input):
     '''
     function to parse GBK file, construct scaffold/gene interlap dictionary and funannotate standard annotation dictionary
     '''
-    inter = defaultdict(InterLap)
+    inter = defaultdict(NCLInterLap)
     Genes = {}
-    with open(input, 'r') as filein:
-        for record in SeqIO.parse(filein, 'genbank'):
-            for f in record.features:
-                if f.type == 'gene':
-                    locusTag, ID, Parent = lib.getID(f, f.type)
-                    start = int(f.location.nofuzzy_start)
-                    end = int(f.location.nofuzzy_end)
-                    inter[record.id].add((start, end, locusTag))
-                lib.gb_feature_add2dict(f, record, Genes)
+    for record in lib.readGenBank(input):
+        for f in record.features:
+            if f.type == 'gene':
+                locusTag, ID, Parent = lib.getID(f, f.type)
+                inter[record.id].add((f.start - 1, f.end, locusTag))
+            lib.gb_feature_add2dict(f, record, Genes)
     return inter, Genes
 
 
-def gff2interlap(input, fasta):
+def gff2interlap(input, fasta, cpus=1):
     '''
     function to parse GFF3 file, construct scaffold/gene interlap dictionary and funannotate standard annotation dictionary
     '''
-    inter = defaultdict(InterLap)
-    Genes = {}
-    Genes = lib.gff2dict(input, fasta, Genes)
+    inter = defaultdict(NCLInterLap)
+    Genes = lib.loadGFF3(input, fasta, cpus=cpus)
     for k, v in natsorted(Genes.items()):
         inter[v['contig']].add((v['location'][0], v['location'][1], k))
     return inter, Genes
@@ -1205,147 +1211,187 @@ def message(loc1, loc2, cdsAED, mrnaAED, protMatches, UTRs, no_change, UTR_added
     return final_message, no_change, UTR_added, yardSale, exonChange
 
 
+# alignment scores shared with the compareAnnotations2 workers
+_IDENTITY = ProteinIdentity()
+
+
 def pairwiseAlign(query, ref):
-    from Bio import pairwise2
     '''
-    do global alignment and return pident
+    do global alignment and return pident, scores computed before by
+    compareAnnotations2 or in earlier runs are looked up
     '''
-    if query == ref:
-        return 100.0
-    align = pairwise2.align.globalxx(query, ref)
-    length = max(len(query), len(ref))
-    pident = (align[0][2] / float(length)) * 100
-    return pident
+    return _IDENTITY.pident(query, ref)
 
 
-def compareAnnotations2(old, new, output, args={}):
+# counts summed over contigs for the compareAnnotations2 summary
+COUNTS = ['no_change', 'UTR_added', 'yardSale', 'exonChange', 'dropped', 'added',
+          'total_transcripts', 'total_genes']
+
+
+def _compareContig(task):
     '''
-    function takes two GenBank annotated genomes and compares gene models
-    output is a tsv file for each locus and a description of what is different
-    can handle multiple transcripts per locus
+    compare the old and new gene models of one contig, returns the report rows
+    as a dictionary of locus: values and a dictionary of counts
     '''
+    contig, oldInter, newInter, oldGenes, newGenes = task
     result = {}
-    global no_change, UTR_added, yardSale, exonChange, modelChangeNotProt, dropped, added, total_transcripts, total_genes
-    no_change, UTR_added, yardSale, exonChange, modelChangeNotProt, dropped, added, total_transcripts, total_genes = (
-        0,)*9
-    lib.log.info("Parsing GenBank files...comparing annotation")
-    if args.gff and args.fasta:
-        oldInter, oldGenes = gff2interlap(old, args.fasta)
-    else:
-        oldInter, oldGenes = gbk2interlap(old)
-    newInter, newGenes = gbk2interlap(new)
+    counts = dict((x, 0) for x in COUNTS)
     # do the simple stuff first, find models that were deleted
-    for contig in oldInter:
-        for gene in oldInter[contig]:
-            if not gene in newInter[contig]:  # these models are removed
-                dropped += 1
-                if not gene[2] in oldGenes:
-                    continue
-                # populate output dictionary with results
-                if not gene[2] in result:
-                    # dropped model has AED of 1.000
-                    cdsAED = '1.000'
-                    exonAED = '1.000'
-                    result[gene[2]] = {'contig': oldGenes[gene[2]]['contig'], 'old_num_transcripts': len(oldGenes[gene[2]]['ids']),
-                                       'old_location': oldGenes[gene[2]]['location'], 'num_transcripts': len(oldGenes[gene[2]]['ids']), 'strand': oldGenes[gene[2]]['strand'],
-                                       'mRNA': oldGenes[gene[2]]['mRNA'], 'location': oldGenes[gene[2]]['location'], 'CDS': oldGenes[gene[2]]['CDS'], 'message': 'gene model removed',
-                                       'cdsAED': cdsAED, 'exonAED': exonAED, 'transcript_id': oldGenes[gene[2]]['ids'], 'pident': [],
-                                       'protein_id': oldGenes[gene[2]]['ids'], 'seq': oldGenes[gene[2]]['protein']}
+    for gene, hitList in oldInter.join(newInter):
+        if not hitList:  # these models are removed
+            counts['dropped'] += 1
+            if not gene[2] in oldGenes:
+                continue
+            # populate output dictionary with results
+            if not gene[2] in result:
+                # dropped model has AED of 1.000
+                cdsAED = '1.000'
+                exonAED = '1.000'
+                result[gene[2]] = {'contig': oldGenes[gene[2]]['contig'], 'old_num_transcripts': len(oldGenes[gene[2]]['ids']),
+                                   'old_location': oldGenes[gene[2]]['location'], 'num_transcripts': len(oldGenes[gene[2]]['ids']), 'strand': oldGenes[gene[2]]['strand'],
+                                   'mRNA': oldGenes[gene[2]]['mRNA'], 'location': oldGenes[gene[2]]['location'], 'CDS': oldGenes[gene[2]]['CDS'], 'message': 'gene model removed',
+                                   'cdsAED': cdsAED, 'exonAED': exonAED, 'transcript_id': oldGenes[gene[2]]['ids'], 'pident': [],
+                                   'protein_id': oldGenes[gene[2]]['ids'], 'seq': oldGenes[gene[2]]['protein']}
 
     # now go through the updated annotation, comparing to old annot
-    for contig in newInter:
-        for gene in newInter[contig]:
-            # means this is a new model, so add it
-            if not gene in oldInter[contig]:
-                added += 1
-                total_genes += 1
-                if not gene[2] in newGenes:
-                    continue
-                total_transcripts += len(newGenes[gene[2]]['ids'])
+    # models are paired up first so that AED is calculated in a single batch
+    hits = list(newInter.join(oldInter))
+    AEDs = geneAEDs(set((gene[2], gene[2]) for gene, hitList in hits
+                        if any(gene[2] == z[2] for z in hitList)),
+                    newGenes, oldGenes)
+    for gene, hitList in hits:
+        # means this is a new model, so add it
+        if not hitList:
+            counts['added'] += 1
+            counts['total_genes'] += 1
+            if not gene[2] in newGenes:
+                continue
+            counts['total_transcripts'] += len(newGenes[gene[2]]['ids'])
+            if not gene[2] in result:
+                result[gene[2]] = {'contig': newGenes[gene[2]]['contig'], 'old_num_transcripts': 0,
+                                   'old_location': newGenes[gene[2]]['location'], 'num_transcripts': len(newGenes[gene[2]]['ids']), 'strand': newGenes[gene[2]]['strand'],
+                                   'mRNA': newGenes[gene[2]]['mRNA'], 'location': newGenes[gene[2]]['location'], 'CDS': newGenes[gene[2]]['CDS'], 'message': 'new gene model',
+                                   'cdsAED': '0.000', 'exonAED': '0.000', 'transcript_id': newGenes[gene[2]]['ids'],
+                                   'protein_id': newGenes[gene[2]]['ids'], 'seq': newGenes[gene[2]]['protein'], 'pident': []}
+        else:  # means this is existing model, and need to do some comparisons
+            # there might be some overlapping transcripts, so enforce locus name
+            hit = None
+            for z in hitList:
+                if gene[2] == z[2]:
+                    hit = z
+            if not hit:
+                # there is no real hit, so this a new gene
+                counts['total_transcripts'] += len(newGenes[gene[2]]['ids'])
+                counts['added'] += 1
+                counts['total_genes'] += 1
                 if not gene[2] in result:
                     result[gene[2]] = {'contig': newGenes[gene[2]]['contig'], 'old_num_transcripts': 0,
                                        'old_location': newGenes[gene[2]]['location'], 'num_transcripts': len(newGenes[gene[2]]['ids']), 'strand': newGenes[gene[2]]['strand'],
                                        'mRNA': newGenes[gene[2]]['mRNA'], 'location': newGenes[gene[2]]['location'], 'CDS': newGenes[gene[2]]['CDS'], 'message': 'new gene model',
                                        'cdsAED': '0.000', 'exonAED': '0.000', 'transcript_id': newGenes[gene[2]]['ids'],
                                        'protein_id': newGenes[gene[2]]['ids'], 'seq': newGenes[gene[2]]['protein'], 'pident': []}
-            else:  # means this is existing model, and need to do some comparisons
-                hitList = list(oldInter[contig].find(gene))
-                # there might be some overlapping transcripts, so enforce locus name
-                hit = None
-                for z in hitList:
-                    if gene[2] == z[2]:
-                        hit = z
-                if not hit:
-                    # there is no real hit, so this a new gene
-                    total_transcripts += len(newGenes[gene[2]]['ids'])
-                    added += 1
-                    total_genes += 1
-                    if not gene[2] in result:
-                        result[gene[2]] = {'contig': newGenes[gene[2]]['contig'], 'old_num_transcripts': 0,
-                                           'old_location': newGenes[gene[2]]['location'], 'num_transcripts': len(newGenes[gene[2]]['ids']), 'strand': newGenes[gene[2]]['strand'],
-                                           'mRNA': newGenes[gene[2]]['mRNA'], 'location': newGenes[gene[2]]['location'], 'CDS': newGenes[gene[2]]['CDS'], 'message': 'new gene model',
-                                           'cdsAED': '0.000', 'exonAED': '0.000', 'transcript_id': newGenes[gene[2]]['ids'],
-                                           'protein_id': newGenes[gene[2]]['ids'], 'seq': newGenes[gene[2]]['protein'], 'pident': []}
-                else:
-                    # since we may have multiple transcripts from hit as well as new annotation we need to be aware of that
-                    # also, tRNA annotations do not exist in Proteins dictionary, so process them differently
-                    # get the reference hits, pull out CDS and mRNA for pairwiseAED calculation
-                    total_genes += 1
-                    total_transcripts += len(newGenes[gene[2]]['ids'])
-
-                    # get the old annotation
-                    hitInfo = oldGenes.get(gene[2])
-
-                    # calculate AED
-                    exonAED = pairwiseAED(
-                        newGenes[gene[2]]['mRNA'], hitInfo['mRNA'])
-                    if newGenes[gene[2]]['type'] == 'mRNA' and hitInfo['type'] == 'mRNA':
-                        cdsAED = pairwiseAED(
-                            newGenes[gene[2]]['CDS'], hitInfo['CDS'])
-                    else:
-                        cdsAED = '0.000'
-
-                    # check translation, to deal with multiple transcripts, lets loop through new
-                    protMatches = []
-                    if newGenes[gene[2]]['type'] == 'mRNA' and hitInfo['type'] == 'mRNA':
-                        for i in range(0, len(newGenes[gene[2]]['ids'])):
-                            protMatch = None
-                            for y in range(0, len(oldGenes[gene[2]]['ids'])):
-                                pident = pairwiseAlign(
-                                    newGenes[gene[2]]['protein'][i], oldGenes[gene[2]]['protein'][y])
-                                if not protMatch:
+            else:
+                # since we may have multiple transcripts from hit as well as new annotation we need to be aware of that
+                # also, tRNA annotations do not exist in Proteins dictionary, so process them differently
+                # get the reference hits, pull out CDS and mRNA for pairwiseAED calculation
+                counts['total_genes'] += 1
+                counts['total_transcripts'] += len(newGenes[gene[2]]['ids'])
+
+                # get the old annotation
+                hitInfo = oldGenes.get(gene[2])
+
+                # AED calculated above
+                exonAED, cdsAED = AEDs[(gene[2], gene[2])]
+
+                # check translation, to deal with multiple transcripts, lets loop through new
+                protMatches = []
+                if newGenes[gene[2]]['type'] == 'mRNA' and hitInfo['type'] == 'mRNA':
+                    for i in range(0, len(newGenes[gene[2]]['ids'])):
+                        protMatch = None
+                        for y in range(0, len(oldGenes[gene[2]]['ids'])):
+                            pident = pairwiseAlign(
+                                newGenes[gene[2]]['protein'][i], oldGenes[gene[2]]['protein'][y])
+                            if not protMatch:
+                                protMatch = pident
+                            else:
+                                if pident > protMatch:
                                     protMatch = pident
-                                else:
-                                    if pident > protMatch:
-                                        protMatch = pident
-                            protMatches.append(protMatch)
-                    # summarize UTRs
-                    UTRs = findUTRs(
-                        newGenes[gene[2]]['CDS'], newGenes[gene[2]]['mRNA'], newGenes[gene[2]]['strand'])
-
-                    # structured comments/counts for gene models
-                    msg, no_change, UTR_added, yardSale, exonChange = message(
-                        newGenes[gene[2]]['location'], oldGenes[gene[2]]['location'], cdsAED, exonAED, protMatches, UTRs, no_change, UTR_added, yardSale, exonChange)
-
-                    if not gene[2] in result:
-                        result[gene[2]] = {'contig': newGenes[gene[2]]['contig'], 'old_num_transcripts': len(oldGenes[gene[2]]['ids']),
-                                           'old_location': oldGenes[gene[2]]['location'], 'num_transcripts': len(newGenes[gene[2]]['ids']), 'strand': newGenes[gene[2]]['strand'],
-                                           'mRNA': newGenes[gene[2]]['mRNA'], 'location': newGenes[gene[2]]['location'], 'CDS': newGenes[gene[2]]['CDS'], 'message': msg,
-                                           'cdsAED': cdsAED, 'exonAED': exonAED, 'transcript_id': newGenes[gene[2]]['ids'],
-                                           'protein_id': newGenes[gene[2]]['ids'], 'seq': newGenes[gene[2]]['protein'], 'pident': protMatches}
+                        protMatches.append(protMatch)
+                # summarize UTRs
+                UTRs = findUTRs(
+                    newGenes[gene[2]]['CDS'], newGenes[gene[2]]['mRNA'], newGenes[gene[2]]['strand'])
+
+                # structured comments/counts for gene models
+                msg, counts['no_change'], counts['UTR_added'], counts['yardSale'], counts['exonChange'] = message(
+                    newGenes[gene[2]]['location'], oldGenes[gene[2]]['location'], cdsAED, exonAED, protMatches, UTRs,
+                    counts['no_change'], counts['UTR_added'], counts['yardSale'], counts['exonChange'])
+
+                if not gene[2] in result:
+                    result[gene[2]] = {'contig': newGenes[gene[2]]['contig'], 'old_num_transcripts': len(oldGenes[gene[2]]['ids']),
+                                       'old_location': oldGenes[gene[2]]['location'], 'num_transcripts': len(newGenes[gene[2]]['ids']), 'strand': newGenes[gene[2]]['strand'],
+                                       'mRNA': newGenes[gene[2]]['mRNA'], 'location': newGenes[gene[2]]['location'], 'CDS': newGenes[gene[2]]['CDS'], 'message': msg,
+                                       'cdsAED': cdsAED, 'exonAED': exonAED, 'transcript_id': newGenes[gene[2]]['ids'],
+                                       'protein_id': newGenes[gene[2]]['ids'], 'seq': newGenes[gene[2]]['protein'], 'pident': protMatches}
+    return result, counts
 
+
+def compareAnnotations2(old, new, output, args={}):
+    '''
+    function takes two GenBank annotated genomes and compares gene models
+    output is a tsv file for each locus and a description of what is different
+    can handle multiple transcripts per locus
+    contigs are compared in parallel and written to the tsv in contig order
+    '''
+    lib.log.info("Parsing GenBank files...comparing annotation")
+    if args.gff and args.fasta:
+        oldInter, oldGenes = gff2interlap(old, args.fasta, cpus=args.cpus)
+    else:
+        oldInter, oldGenes = gbk2interlap(old)
+    newInter, newGenes = gbk2interlap(new)
+    # align the old and new proteins of every locus in one batch, pairs that
+    # were aligned in an earlier run come from the cache
+    pairs = []
+    for k, v in newGenes.items():
+        if k in oldGenes and v['type'] == 'mRNA' and oldGenes[k]['type'] == 'mRNA':
+            pairs.extend(itertools.product(v['protein'], oldGenes[k]['protein']))
+    _IDENTITY.compute(pairs, cpus=args.cpus)
+    # each task gets the models of its contig only
+    tasks = []
+    for contig in natsorted(set(oldInter) | set(newInter)):
+        tasks.append((contig, oldInter[contig], newInter[contig],
+                      dict((x[2], oldGenes[x[2]]) for x in oldInter[contig] if x[2] in oldGenes),
+                      dict((x[2], newGenes[x[2]]) for x in newInter[contig] if x[2] in newGenes)))
+    pool = None
+    if args.cpus > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(processes=min(args.cpus, len(tasks)))
+        results = pool.imap(_compareContig, tasks)
+    else:
+        results = (_compareContig(x) for x in tasks)
+    totals = dict((x, 0) for x in COUNTS)
     total_cdsAED = []
     total_exonAED = []
-    with open(output, 'w') as out:
-        out.write('Locus_tag\tOrig_Location\tOrig_Num_Transcripts\tContig:start-end\tStrand\tGene_Length\tNum_Transcripts\tmRNA_AED\tCDS_AED\tDescription\n')
-        for k, v in natsorted(result.items()):
-            start = str(v['location'][0])
-            end = str(v['location'][1])
-            GeneLength = int(end) - int(start)
-            total_cdsAED.append(float(v['cdsAED']))
-            total_exonAED.append(float(v['exonAED']))
-            out.write('{:}\t{:}:{:}-{:}\t{:}\t{:}:{:}-{:}\t{:}\t{:}\t{:}\t{:}\t{:}\t{:}\n'.format(k, v['contig'], v['old_location'][0], v['old_location'][
-                      1], v['old_num_transcripts'], v['contig'], start, end, v['strand'], GeneLength, v['num_transcripts'], v['exonAED'], v['cdsAED'], v['message']))
+    written = set()
+    try:
+        with open(output, 'w') as out:
+            out.write('Locus_tag\tOrig_Location\tOrig_Num_Transcripts\tContig:start-end\tStrand\tGene_Length\tNum_Transcripts\tmRNA_AED\tCDS_AED\tDescription\n')
+            for result, counts in results:
+                for x in counts:
+                    totals[x] += counts[x]
+                for k, v in natsorted(result.items()):
+                    if k in written:  # same locus tag on another contig
+                        continue
+                    written.add(k)
+                    start = str(v['location'][0])
+                    end = str(v['location'][1])
+                    GeneLength = int(end) - int(start)
+                    total_cdsAED.append(float(v['cdsAED']))
+                    total_exonAED.append(float(v['exonAED']))
+                    out.write('{:}\t{:}:{:}-{:}\t{:}\t{:}:{:}-{:}\t{:}\t{:}\t{:}\t{:}\t{:}\t{:}\n'.format(k, v['contig'], v['old_location'][0], v['old_location'][
+                              1], v['old_num_transcripts'], v['contig'], start, end, v['strand'], GeneLength, v['num_transcripts'], v['exonAED'], v['cdsAED'], v['message']))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
     Avg_cdsAED = sum(total_cdsAED) / float(len(total_cdsAED))
     Avg_exonAED = sum(total_exonAED) / float(len(total_exonAED))
     # output some simple stats to cmd line
@@ -1361,7 +1407,8 @@ Exons/CDS Changed:\t{:,}\n\
 Dropped Models:\t\t{:,}\n\
 CDS AED:\t\t{:.3f}\n\
 mRNA AED:\t\t{:.3f}\n\
--------------------------------------------------------".format(total_genes, total_transcripts, added, no_change, UTR_added, exonChange, yardSale, dropped, Avg_cdsAED, Avg_exonAED))
+-------------------------------------------------------".format(totals['total_genes'], totals['total_transcripts'], totals['added'], totals['no_change'],
+                                                         totals['UTR_added'], totals['exonChange'], totals['yardSale'], totals['dropped'], Avg_cdsAED, Avg_exonAED))
 
 
 def findUTRs(cds, mrna, strand):
@@ -1427,69 +1474,6 @@ def findUTRs(cds, mrna, strand):
     return UTRs
 
 
-def pairwiseAED(query, reference):
-    '''
-    takes a multiple transcripts and sums AED from lowest pairwise comparison and then calculates
-    the average based on number of transcripts in the query
-    '''
-    AEDsum = []
-    pAED = [float(getAED(a, b))
-            for a, b in itertools.product(query, reference)]
-    # split into parts to get lowest AED
-    splitAED = [pAED[i:i+len(query)] for i in range(0, len(pAED), len(query))]
-    for pair in splitAED:
-        AEDsum.append(min(pair))
-    AEDavg = sum(AEDsum) / len(query)
-    return '{:.3f}'.format(AEDavg)
-
-
-def getAED(query, reference):
-    '''
-    function to calcuate annotation edit distance between two mRNA transcript coordinates
-    AED = 1 - (SN + SP / 2)
-    SN = fraction of ref predicted
-    SP = fraction prediction overlapping the ref
-    '''
-    def _length(listTup):
-        len = 0
-        for i in listTup:
-            l = abs(i[0] - i[1])
-            len += l
-        return len
-    # check if identical
-    if query == reference:
-        return '0.000'
-    # make sure sorted
-    rLen = _length(reference)
-    refInterlap = InterLap(reference)
-    QueryOverlap = 0
-    qLen = 0
-    for exon in query:
-        qLen += abs(exon[0] - exon[1])
-        if exon in refInterlap:  # exon overlaps at least partially with reference
-            hit = list(refInterlap.find(exon))
-            for h in hit:
-                # will return array of exon minus hit at each pos
-                diff = np.subtract(exon, h)
-                if diff[0] <= 0 and diff[1] >= 0:  # then query exon covers ref exon
-                    cov = abs(h[0] - h[1])
-                    QueryOverlap += cov
-                elif diff[0] <= 0 and diff[1] < 0:  # means query partial covers ref
-                    cov = abs(h[0] - exon[1])
-                    QueryOverlap += cov
-                elif diff[0] > 0 and diff[1] >= 0:  # means query partial covers ref
-                    cov = abs(exon[0] - h[1])
-                    QueryOverlap += cov
-                elif diff[0] > 0 and diff[1] < 1:
-                    cov = abs(exon[0] - exon[1])
-                    QueryOverlap += cov
-    # calculate AED
-    SP = QueryOverlap / float(qLen)
-    SN = QueryOverlap / float(rLen)
-    AED = 1 - ((SN + SP) / 2)
-    return '{:.3f}'.format(AED)
-
-
 def main(args):
     # setup menu with argparse
     class MyFormatter(argparse.ArgumentDefaultsHelpFormatter):
@@ -1555,6 +1539,8 @@ def main(args):
                         help='Number of CPUs to use')
     parser.add_argument('-t', '--tbl2asn', default='-l paired-ends',
                         help='Parameters for tbl2asn, linkage and gap info')
+    parser.add_argument('--ncbi_validate', action='store_true',
+                        help='Run NCBI tbl2asn to write GenBank file and validation reports')
     parser.add_argument('--sbt', default='SBT',
                         help='Basename of output files')
     parser.add_argument('--p2g', help='NCBI p2g file from previous annotation')
@@ -1647,8 +1633,10 @@ def main(args):
     else:
         TRINITY = args.TRINITYHOME.strip()
 
-    programs = ['fasta', 'minimap2', 'tbl2asn', 'hisat2', 'hisat2-build', 'kallisto',
+    programs = ['fasta', 'minimap2', 'hisat2', 'hisat2-build', 'kallisto',
                 'Trinity', 'bedtools', 'java', LAUNCHPASA, os.path.join(PASA, 'bin', 'seqclean')]
+    if args.ncbi_validate:
+        programs.append('tbl2asn')
     if not args.no_trimmomatic:
         programs.append('trimmomatic')
     programs += args.aligners
@@ -1775,7 +1763,7 @@ def main(args):
                 sys.exit(1)
             shutil.copyfile(args.fasta, fastaout)
             locustag, genenumber, justify = gff2pasa(
-                args.gff, fastaout, gffout, trnaout, spliceout, exonout)
+                args.gff, fastaout, gffout, trnaout, spliceout, exonout, cpus=args.cpus)
             organism, strain, isolate, accession, WGS_accession, gb_gi, version = (
                 None,)*7
         else:
@@ -1783,6 +1771,10 @@ def main(args):
                 "Error in input: pass either funannotate directory or GenBank file to -i,--input; or GFF3 to -g,--gff and genome FASTA to -f,--fasta.")
             sys.exit(1)
 
+    # a GenBank reannotation is written with tbl2asn, make sure it is there now rather than at the end
+    if WGS_accession and not args.ncbi_validate:
+        lib.CheckDependencies(['tbl2asn'])
+
     lib.log.info("Previous annotation consists of: {:,} protein coding gene models and {:,} non-coding gene models".format(
         lib.countGFFgenes(gffout), lib.countGFFgenes(trnaout)))
         
@@ -2236,16 +2228,22 @@ def main(args):
     else:
         rev_version = 1
 
-    # have to run as subprocess because of multiprocessing issues
-    cmd = [sys.executable, os.path.join(parentdir, 'aux_scripts', 'tbl2asn_parallel.py'),
-           '-i', TBLFile, '-f', fastaout, '-o', gagdir, '--sbt', SBT, '-d', discrep,
-           '-s', organism, '-t', args.tbl2asn, '-v', str(rev_version), '-c', str(args.cpus)]
-    if isolate:
-        cmd += ['--isolate', isolate]
-    if strain:
-        cmd += ['--strain', strain]
-    lib.log.debug(' '.join(cmd))
-    subprocess.call(cmd)
+    # a GenBank reannotation has NCBI protein/transcript ids, so that always goes through tbl2asn
+    validate = args.ncbi_validate or WGS_accession
+    if validate:
+        # have to run as subprocess because of multiprocessing issues
+        cmd = [sys.executable, os.path.join(parentdir, 'aux_scripts', 'tbl2asn_parallel.py'),
+               '-i', TBLFile, '-f', fastaout, '-o', gagdir, '--sbt', SBT, '-d', discrep,
+               '-s', organism, '-t', args.tbl2asn, '-v', str(rev_version), '-c', str(args.cpus)]
+        if isolate:
+            cmd += ['--isolate', isolate]
+        if strain:
+            cmd += ['--strain', strain]
+        lib.log.debug(' '.join(cmd))
+        subprocess.call(cmd)
+    else:
+        lib.tbl2gbk(TBLFile, fastaout, os.path.join(gagdir, 'genome.gbf'), organism,
+                    strain=strain, isolate=isolate, parameters=args.tbl2asn, cpus=args.cpus)
 
     # grab results, populate results output directory
     final_fasta = os.path.join(
@@ -2272,8 +2270,9 @@ def main(args):
     # retrieve files/reorganize
     shutil.copyfile(os.path.join(gagdir, 'genome.gbf'), final_gbk)
     shutil.copyfile(os.path.join(gagdir, 'genome.tbl'), final_tbl)
-    shutil.copyfile(os.path.join(gagdir, 'genome.val'), final_validation)
-    shutil.copyfile(os.path.join(gagdir, 'errorsummary.val'), final_error)
+    if validate:
+        shutil.copyfile(os.path.join(gagdir, 'genome.val'), final_validation)
+        shutil.copyfile(os.path.join(gagdir, 'errorsummary.val'), final_error)
 
     lib.log.info("Collecting final annotation files")
     lib.tbl2allout(final_tbl, fastaout, final_gff, final_proteins,
@@ -2293,14 +2292,15 @@ def main(args):
 
     lib.log.info(
         "Funannotate update is finished, output files are in the %s/update_results folder" % (args.out))
-    errors = lib.ncbiCheckErrors(
-        final_error, final_validation, locustag, final_fixes)
-    if errors > 0:
-        print('-------------------------------------------------------')
-        lib.log.info("Manually edit the tbl file %s, then run:\n\nfunannotate fix -i %s -t %s\n" %
-                     (final_tbl, final_gbk, final_tbl))
-        lib.log.info(
-            "After the problematic gene models are fixed, you can proceed with functional annotation.")
+    if validate:
+        errors = lib.ncbiCheckErrors(
+            final_error, final_validation, locustag, final_fixes)
+        if errors > 0:
+            print('-------------------------------------------------------')
+            lib.log.info("Manually edit the tbl file %s, then run:\n\nfunannotate fix -i %s -t %s\n" %
+                         (final_tbl, final_gbk, final_tbl))
+            lib.log.info(
+                "After the problematic gene models are fixed, you can proceed with functional annotation.")
 
     lib.log.info("Your next step might be functional annotation, suggested commands:\n\
 -------------------------------------------------------\n\
@@ -6,10 +6,14 @@ import sys
 import os
 import argparse
 import itertools
+import multiprocessing
 from Bio import SeqIO
 from interlap import InterLap
+from funannotate.genomestore import GenomeStore
+from funannotate.seqops import translate
+from funannotate.aed import geneAEDs
+from funannotate.pident import ProteinIdentity
 from collections import defaultdict
-from collections import OrderedDict
 from natsort import natsorted
 import numpy as np
 import pandas as pd
@@ -46,58 +50,11 @@ def fmtcols(mylist, cols):
     return "\n".join(lines)
 
 
-def translate(cDNA, strand, phase):
-    '''
-    translate cDNA into protein sequence
-    trying to see if I can speed this up over Biopython
-    '''
-    def _RevComp(s):
-        rev_comp_lib = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'U': 'A', 'M': 'K', 'R': 'Y', 'W': 'W',
-                        'S': 'S', 'Y': 'R', 'K': 'M', 'V': 'B', 'H': 'D', 'D': 'H', 'B': 'V', 'X': 'X', 'N': 'N'}
-        cseq = ''
-        n = len(s)
-        s = s.upper()
-        for i in range(0, n):
-            c = s[n-i-1]
-            cseq += rev_comp_lib[c]
-        return cseq
-
-    def _split(str, num):
-        return [str[start:start+num] for start in range(0, len(str), num)]
-    codon_table = {'TTT': 'F', 'TTC': 'F', 'TTA': 'L', 'TTG': 'L', 'TCT': 'S',
-                   'TCC': 'S', 'TCA': 'S', 'TCG': 'S', 'TAT': 'Y', 'TAC': 'Y',
-                   'TGT': 'C', 'TGC': 'C', 'TGG': 'W', 'CTT': 'L', 'CTC': 'L',
-                   'CTA': 'L', 'CTG': 'L', 'CCT': 'P', 'CCC': 'P', 'CCA': 'P',
-                   'CCG': 'P', 'CAT': 'H', 'CAC': 'H', 'CAA': 'Q', 'CAG': 'Q',
-                   'CGT': 'R', 'CGC': 'R', 'CGA': 'R', 'CGG': 'R', 'ATT': 'I',
-                   'ATC': 'I', 'ATA': 'I', 'ATG': 'M', 'ACT': 'T', 'ACC': 'T',
-                   'ACA': 'T', 'ACG': 'T', 'AAT': 'N', 'AAC': 'N', 'AAA': 'K',
-                   'AAG': 'K', 'AGT': 'S', 'AGC': 'S', 'AGA': 'R', 'AGG': 'R',
-                   'GTT': 'V', 'GTC': 'V', 'GTA': 'V', 'GTG': 'V', 'GCT': 'A',
-                   'GCC': 'A', 'GCA': 'A', 'GCG': 'A', 'GAT': 'D', 'GAC': 'D',
-                   'GAA': 'E', 'GAG': 'E', 'GGT': 'G', 'GGC': 'G', 'GGA': 'G',
-                   'GGG': 'G', 'TAA': '*', 'TAG': '*', 'TGA': '*'}
-    if strand == '-' or strand == -1:
-        seq = _RevComp(cDNA)
-    else:
-        seq = cDNA
-    seq = seq[phase:]
-    # map seq to proteins
-    protSeq = []
-    for i in _split(seq, 3):
-        if len(i) == 3:
-            iSeq = i.upper()
-            if iSeq in codon_table:
-                aa = codon_table[iSeq]
-                protSeq.append(aa)
-            else:
-                protSeq.append('X')
-    return ''.join(protSeq)
-
-
 def getSeqRegions(SeqRecordDict, header, coordinates):
-    # takes SeqRecord dictionary or Index, returns sequence string
+    # takes GenomeStore, SeqRecord dictionary or Index, returns sequence string
     # coordinates is a list of tuples [(1,10), (20,30)]
+    if isinstance(SeqRecordDict, GenomeStore):
+        return SeqRecordDict.regions(header, coordinates)
     result = ''
     sorted_coordinates = sorted(coordinates, key=lambda tup: tup[0])
     for x in sorted_coordinates:
@@ -407,7 +364,7 @@ def gff2dict(file, fasta, Genes):
                                 Genes[GeneFeature]['3UTR'][i].append(
                                     (start, end))
     # loop through and make sure CDS and exons are properly sorted and codon_start is correct, translate to protein space
-    SeqRecords = SeqIO.to_dict(SeqIO.parse(fasta, 'fasta'))
+    SeqRecords = GenomeStore(fasta)
     for k, v in Genes.items():
         for i in range(0, len(v['ids'])):
             if v['type'] == 'mRNA' or v['type'] == 'tRNA':
@@ -739,17 +696,21 @@ def message(loc1, loc2, cdsAED, mrnaAED, protMatches, UTRs, no_change, UTR_added
     return final_message, no_change, UTR_added, yardSale, exonChange
 
 
+# alignment scores shared with the compareModels workers
+_IDENTITY = ProteinIdentity()
+
+
 def pairwiseAlign(query, ref):
-    from Bio import pairwise2
     '''
-    do global alignment and return pident
+    do global alignment and return pident, scores computed before by
+    compareModels or in earlier runs are looked up
     '''
     if query == ref:
         return 100.0, len(ref), len(ref)
-    align = pairwise2.align.globalxx(query, ref)
+    score = _IDENTITY.score(query, ref)
     length = max(len(query), len(ref))
-    pident = (align[0][2] / float(length)) * 100
-    return pident, align[0][2], len(ref)
+    pident = (score / float(length)) * 100
+    return pident, score, len(ref)
 
 
 def countFeatures(input):
@@ -765,136 +726,207 @@ def countFeatures(input):
     return len(input), mRNAg, mRNAt, tRNAg, tRNAt
 
 
-def compareAnnotations(old, oldformat, new, newformat, fasta, measure_pident, output):
+# counts summed over contigs for the compareAnnotations summary
+COUNTS = ['no_change', 'identicalCDS', 'refUnique', 'queryUnique', 'totalmatches',
+          'totallength']
+
+
+def _bestHit(gene, oldInter):
+    '''
+    (distance, ID) of the reference model closest to a query model, the sum of
+    the start and end differences, None if it overlaps no reference model
+    '''
+    if not gene in oldInter:
+        return None
+    hitList = list(oldInter.find(gene))
+    # there might be some overlapping transcripts, so get best hit?
+    hit = []
+    # get best hit
+    for z in hitList:
+        diffs = np.subtract((gene[0], gene[1]), (z[0], z[1]))
+        totaldiffs = abs(diffs[0]) + abs(diffs[1])
+        hit.append((totaldiffs, z[2]))
+    return min(hit)
+
+
+def _compareContig(task):
+    '''
+    compare the reference and query gene models of one contig, returns the
+    report rows as a dictionary of locus: values and a dictionary of counts
+    '''
+    contig, oldInter, newInter, oldGenes, newGenes, measure_pident = task
+    result = {}
+    counts = dict((x, 0) for x in COUNTS)
+    # now run some comparisons
+    # do the simple stuff first, find models that were deleted
+    for gene in oldInter:
+        if not gene in newInter:  # these models are removed
+            if not gene[2] in oldGenes:
+                continue
+            # populate output dictionary with results
+            if not gene[2] in result:
+                counts['refUnique'] += 1
+                result[gene[2]] = {'contig': oldGenes[gene[2]]['contig'], 'location': oldGenes[gene[2]]['location'], 'ref_type': oldGenes[gene[2]]['type'], 'ref_location': oldGenes[gene[2]]['location'],
+                                   'query_location': None, 'query_id': None, 'query_type': None, 'pident': None, 'ref_id': gene[2],
+                                   'cdsAED': '1.000', 'exonAED': '1.000', 'ref_transcripts': len(oldGenes[gene[2]]['ids']), 'query_transcripts': 0,
+                                   'ref_strand': oldGenes[gene[2]]['strand'], 'query_strand': None}
+                for x in oldGenes[gene[2]]['protein']:
+                    counts['totallength'] += len(x)
+
+    # now go through the updated annotation, comparing to old annot
+    # first find the best reference hit of every model, so that AED can be
+    # calculated in a single batch
+    paired = [(gene, _bestHit(gene, oldInter)) for gene in newInter]
+    AEDs = geneAEDs(set((gene[2], besthit[1]) for gene, besthit in paired
+                        if besthit), newGenes, oldGenes)
+    for gene, besthit in paired:
+        # means this is a new model, so add it
+        if not besthit:
+            if not gene[2] in newGenes:
+                continue
+            if not gene[2] in result:
+                counts['queryUnique'] += 1
+                result[gene[2]] = {'contig': newGenes[gene[2]]['contig'], 'location': newGenes[gene[2]]['location'], 'ref_type': None, 'ref_location': None,
+                                   'query_location': newGenes[gene[2]]['location'], 'query_id': gene[2], 'query_type': newGenes[gene[2]]['type'], 'pident': None,
+                                   'cdsAED': '1.000', 'exonAED': '1.000', 'ref_transcripts': 0, 'query_transcripts': len(newGenes[gene[2]]['ids']), 'ref_id': None,
+                                   'ref_strand': None, 'query_strand': newGenes[gene[2]]['strand']}
+        else:  # means this is existing model, and need to do some comparisons
+            # get the old annotation
+            hitInfo = oldGenes.get(besthit[1])
+
+            # AED calculated above
+            exonAED, cdsAED = AEDs[(gene[2], besthit[1])]
+
+            # check translation, to deal with multiple transcripts, lets loop through new
+            if measure_pident:
+                protMatches = []
+                if newGenes[gene[2]]['type'] == 'mRNA' and hitInfo['type'] == 'mRNA':
+                    for i in range(0, len(newGenes[gene[2]]['ids'])):
+                        protMatch = None
+                        for y in range(0, len(hitInfo['ids'])):
+                            pident, matches, length = pairwiseAlign(
+                                newGenes[gene[2]]['protein'][i], hitInfo['protein'][y])
+                            if not protMatch:
+                                protMatch = (pident, matches, length)
+                            else:
+                                if pident > protMatch[0]:
+                                    protMatch = (pident, matches, length)
+                        protMatches.append(protMatch[0])
+                        counts['totalmatches'] += protMatch[1]
+                        counts['totallength'] += protMatch[2]
+            else:
+                protMatches = None
+
+            if not besthit[1] in result:
+                result[besthit[1]] = {'contig': newGenes[gene[2]]['contig'], 'location': hitInfo['location'], 'ref_type': hitInfo['type'], 'ref_location': hitInfo['location'],
+                                      'query_location': newGenes[gene[2]]['location'], 'query_id': gene[2], 'query_type': newGenes[gene[2]]['type'], 'pident': protMatches,
+                                      'cdsAED': cdsAED, 'exonAED': exonAED, 'ref_transcripts': len(hitInfo['ids']), 'query_transcripts': len(newGenes[gene[2]]['ids']),
+                                      'ref_strand': hitInfo['strand'], 'query_strand': newGenes[gene[2]]['strand'], 'ref_id': besthit[1]}
+            # get some summary stats as you loop through
+            if float(exonAED) == 0 and float(cdsAED) == 0:
+                counts['no_change'] += 1
+            elif float(cdsAED) == 0:
+                counts['identicalCDS'] += 1
+
+    return result, counts
+
+
+def loadAnnotation(input, format, fasta):
+    '''
+    contig interlap dictionary and funannotate annotation dictionary from a
+    GenBank (format genbank) or GFF3 (format gff) file
+    '''
+    if format == 'gff':
+        return gff2interlap(input, fasta)
+    return gbk2interlap(input)
+
+
+def compareAnnotations(old, oldformat, new, newformat, fasta, measure_pident, output, cpus=1):
     '''
     function takes two GenBank annotated genomes and compares gene models
     output is a tsv file for each locus and a description of what is different
     can handle multiple transcripts per locus
     '''
-    result = {}
-    global no_change, identicalCDS, refUnique, queryUnique
-    no_change, identicalCDS, refUnique, queryUnique, totalmatches, totallength = (
-        0,)*6
-    if oldformat == 'gff':
-        oldInter, oldGenes = gff2interlap(old, fasta)
-    else:
-        oldInter, oldGenes = gbk2interlap(old)
-    if newformat == 'gff':
-        newInter, newGenes = gff2interlap(new, fasta)
-    else:
-        newInter, newGenes = gbk2interlap(new)
+    oldInter, oldGenes = loadAnnotation(old, oldformat, fasta)
+    newInter, newGenes = loadAnnotation(new, newformat, fasta)
+    return compareModels(oldInter, oldGenes, newInter, newGenes, measure_pident, output, cpus=cpus)
+
+
+def compareModels(oldInter, oldGenes, newInter, newGenes, measure_pident, output, cpus=1):
+    '''
+    compare parsed query models (new) to parsed reference models (old), the
+    reference is not modified so it can be reused for several queries
+    contigs are compared in parallel and written to the tsv in contig order
+    '''
     NumOldLoci, NumOldGenes, NumOldmRNA, NumOldtRNALoci, NumOldtRNA = countFeatures(
         oldGenes)
     NumNewLoci, NumNewGenes, NumNewmRNA, NumNewtRNALoci, NumNewtRNA = countFeatures(
         newGenes)
 
-    # now run some comparisons
-    # do the simple stuff first, find models that were deleted
-    for contig in oldInter:
-        for gene in oldInter[contig]:
-            if not gene in newInter[contig]:  # these models are removed
-                if not gene[2] in oldGenes:
-                    continue
-                # populate output dictionary with results
-                if not gene[2] in result:
-                    refUnique += 1
-                    result[gene[2]] = {'contig': oldGenes[gene[2]]['contig'], 'location': oldGenes[gene[2]]['location'], 'ref_type': oldGenes[gene[2]]['type'], 'ref_location': oldGenes[gene[2]]['location'],
-                                       'query_location': None, 'query_id': None, 'query_type': None, 'pident': None, 'ref_id': gene[2],
-                                       'cdsAED': '1.000', 'exonAED': '1.000', 'ref_transcripts': len(oldGenes[gene[2]]['ids']), 'query_transcripts': 0,
-                                       'ref_strand': oldGenes[gene[2]]['strand'], 'query_strand': None}
-                    for x in oldGenes[gene[2]]['protein']:
-                        totallength += len(x)
-
-    # now go through the updated annotation, comparing to old annot
-    for contig in newInter:
-        for gene in newInter[contig]:
-            # means this is a new model, so add it
-            if not gene in oldInter[contig]:
-                if not gene[2] in newGenes:
+    # align the proteins of every query model to those of its best reference
+    # hit in one batch, pairs aligned in an earlier run come from the cache
+    if measure_pident:
+        pairs = []
+        for contig in newInter:
+            if not contig in oldInter:
+                continue
+            for gene in newInter[contig]:
+                if not gene[2] in newGenes or newGenes[gene[2]]['type'] != 'mRNA':
                     continue
-                if not gene[2] in result:
-                    queryUnique += 1
-                    result[gene[2]] = {'contig': newGenes[gene[2]]['contig'], 'location': newGenes[gene[2]]['location'], 'ref_type': None, 'ref_location': None,
-                                       'query_location': newGenes[gene[2]]['location'], 'query_id': gene[2], 'query_type': newGenes[gene[2]]['type'], 'pident': None,
-                                       'cdsAED': '1.000', 'exonAED': '1.000', 'ref_transcripts': 0, 'query_transcripts': len(newGenes[gene[2]]['ids']), 'ref_id': None,
-                                       'ref_strand': None, 'query_strand': newGenes[gene[2]]['strand']}
-            else:  # means this is existing model, and need to do some comparisons
-                hitList = list(oldInter[contig].find(gene))
-                # there might be some overlapping transcripts, so get best hit?
-                hit = []
-                # get best hit
-                for z in hitList:
-                    diffs = np.subtract((gene[0], gene[1]), (z[0], z[1]))
-                    totaldiffs = abs(diffs[0]) + abs(diffs[1])
-                    hit.append((totaldiffs, z[2]))
-                besthit = min(hit)
-
-                # get the old annotation
-                hitInfo = oldGenes.get(besthit[1])
-
-                # calculate AED
-                exonAED = pairwiseAED(
-                    newGenes[gene[2]]['mRNA'], hitInfo['mRNA'])
-                if newGenes[gene[2]]['type'] == 'mRNA' and hitInfo['type'] == 'mRNA':
-                    cdsAED = pairwiseAED(
-                        newGenes[gene[2]]['CDS'], hitInfo['CDS'])
-                else:
-                    cdsAED = '0.000'
-
-                # check translation, to deal with multiple transcripts, lets loop through new
-                if measure_pident:
-                    protMatches = []
-                    if newGenes[gene[2]]['type'] == 'mRNA' and hitInfo['type'] == 'mRNA':
-                        for i in range(0, len(newGenes[gene[2]]['ids'])):
-                            protMatch = None
-                            for y in range(0, len(hitInfo['ids'])):
-                                pident, matches, length = pairwiseAlign(
-                                    newGenes[gene[2]]['protein'][i], hitInfo['protein'][y])
-                                if not protMatch:
-                                    protMatch = (pident, matches, length)
-                                else:
-                                    if pident > protMatch[0]:
-                                        protMatch = (pident, matches, length)
-                            protMatches.append(protMatch[0])
-                            totalmatches += protMatch[1]
-                            totallength += protMatch[2]
-                else:
-                    protMatches = None
-
-                if not besthit[1] in result:
-                    result[besthit[1]] = {'contig': newGenes[gene[2]]['contig'], 'location': hitInfo['location'], 'ref_type': hitInfo['type'], 'ref_location': hitInfo['location'],
-                                          'query_location': newGenes[gene[2]]['location'], 'query_id': gene[2], 'query_type': newGenes[gene[2]]['type'], 'pident': protMatches,
-                                          'cdsAED': cdsAED, 'exonAED': exonAED, 'ref_transcripts': len(hitInfo['ids']), 'query_transcripts': len(newGenes[gene[2]]['ids']),
-                                          'ref_strand': hitInfo['strand'], 'query_strand': newGenes[gene[2]]['strand'], 'ref_id': besthit[1]}
-                # get some summary stats as you loop through
-                if float(exonAED) == 0 and float(cdsAED) == 0:
-                    no_change += 1
-                elif float(cdsAED) == 0:
-                    identicalCDS += 1
+                besthit = _bestHit(gene, oldInter[contig])
+                if besthit and besthit[1] in oldGenes and oldGenes[besthit[1]]['type'] == 'mRNA':
+                    pairs.extend(itertools.product(newGenes[gene[2]]['protein'],
+                                                   oldGenes[besthit[1]]['protein']))
+        _IDENTITY.compute(pairs, cpus=cpus)
 
+    # now run some comparisons, each task gets the models of its contig only
+    tasks = []
+    for contig in sorted(set(oldInter) | set(newInter)):
+        ref = oldInter.get(contig, InterLap())
+        query = newInter.get(contig, InterLap())
+        tasks.append((contig, ref, query,
+                      dict((x[2], oldGenes[x[2]]) for x in ref if x[2] in oldGenes),
+                      dict((x[2], newGenes[x[2]]) for x in query if x[2] in newGenes),
+                      measure_pident))
+    pool = None
+    if cpus > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(processes=min(cpus, len(tasks)))
+        results = pool.imap(_compareContig, tasks)
+    else:
+        results = (_compareContig(x) for x in tasks)
+    totals = dict((x, 0) for x in COUNTS)
     total_cdsAED = []
     total_exonAED = []
-
-    def _sortDict(d):
-        return (d[1]['contig'], d[1]['location'][0])
-    # sort the annotations by contig and start location
-    sGenes = sorted(result.iteritems(), key=_sortDict)
-    sortedGenes = OrderedDict(sGenes)
-    with open(output, 'w') as out:
-        out.write('Reference_Location\tReference_ID\tRef_strand\tRef_Num_Transcripts\tQuery_Location\tQuery_ID\tQuery_strand\tQuery_Num_Transcripts\tmRNA_AED\tCDS_AED\n')
-        for k, v in sortedGenes.items():
-            Rstart = str(v['location'][0])
-            Rend = str(v['location'][1])
-            if v['query_id']:
-                Qstart = str(v['query_location'][0])
-                Qend = str(v['query_location'][1])
-            else:
-                Qstart = 'None'
-                Qend = 'None'
-            total_cdsAED.append(float(v['cdsAED']))
-            total_exonAED.append(float(v['exonAED']))
-            out.write('{:}:{:}-{:}\t{:}\t{:}\t{:}\t{:}:{:}-{:}\t{:}\t{:}\t{:}\t{:}\t{:}\n'.format(
-                v['contig'], Rstart, Rend, v['ref_id'], v['ref_strand'], v['ref_transcripts'], v['contig'], Qstart, Qend, v['query_id'], v['query_strand'], v['query_transcripts'], v['exonAED'], v['cdsAED']))
+    written = set()
+    try:
+        with open(output, 'w') as out:
+            out.write('Reference_Location\tReference_ID\tRef_strand\tRef_Num_Transcripts\tQuery_Location\tQuery_ID\tQuery_strand\tQuery_Num_Transcripts\tmRNA_AED\tCDS_AED\n')
+            for result, counts in results:
+                for x in counts:
+                    totals[x] += counts[x]
+                # sort the annotations by start location
+                for k, v in sorted(result.items(), key=lambda d: d[1]['location'][0]):
+                    if k in written:  # same ID on another contig
+                        continue
+                    written.add(k)
+                    Rstart = str(v['location'][0])
+                    Rend = str(v['location'][1])
+                    if v['query_id']:
+                        Qstart = str(v['query_location'][0])
+                        Qend = str(v['query_location'][1])
+                    else:
+                        Qstart = 'None'
+                        Qend = 'None'
+                    total_cdsAED.append(float(v['cdsAED']))
+                    total_exonAED.append(float(v['exonAED']))
+                    out.write('{:}:{:}-{:}\t{:}\t{:}\t{:}\t{:}:{:}-{:}\t{:}\t{:}\t{:}\t{:}\t{:}\n'.format(
+                        v['contig'], Rstart, Rend, v['ref_id'], v['ref_strand'], v['ref_transcripts'], v['contig'], Qstart, Qend, v['query_id'], v['query_strand'], v['query_transcripts'], v['exonAED'], v['cdsAED']))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    no_change, identicalCDS, refUnique, queryUnique, totalmatches, totallength = [
+        totals[x] for x in COUNTS]
     Avg_cdsAED = sum(total_cdsAED) / float(len(total_cdsAED))
     Avg_exonAED = sum(total_exonAED) / float(len(total_exonAED))
     totalPident = 0.00
@@ -966,70 +998,43 @@ def findUTRs(cds, mrna, strand):
     return UTRs
 
 
-def pairwiseAED(query, reference):
-    '''
-    takes a multiple transcripts and sums AED from lowest pairwise comparison and then calculates
-    the average based on number of transcripts in the query
-    '''
-    AEDsum = []
-    pAED = [float(getAED(a, b))
-            for a, b in itertools.product(query, reference)]
-    # split into parts to get lowest AED
-    splitAED = [pAED[i:i+len(query)] for i in range(0, len(pAED), len(query))]
-    for pair in splitAED:
-        AEDsum.append(min(pair))
-    AEDavg = sum(AEDsum) / len(query)
-    return '{:.3f}'.format(AEDavg)
-
-
-def getAED(query, reference):
+def summaryTable(results):
     '''
-    function to calcuate annotation edit distance between two mRNA transcript coordinates
-    AED = 1 - (SN + SP / 2)
-    SN = fraction of ref predicted
-    SP = fraction prediction overlapping the ref
+    stats x annotation table, results is a dictionary with the Stats names
+    and a list of values for the Reference and each query
     '''
-    def _length(listTup):
-        len = 0
-        for i in listTup:
-            l = abs(i[0] - i[1])
-            len += l
-        return len
-    # check if identical
-    if query == reference:
-        return '0.000'
-    # make sure sorted
-    rLen = _length(reference)
-    refInterlap = InterLap(reference)
-    QueryOverlap = 0
-    qLen = 0
-    for exon in query:
-        qLen += abs(exon[0] - exon[1])
-        if exon in refInterlap:  # exon overlaps at least partially with reference
-            hit = list(refInterlap.find(exon))
-            for h in hit:
-                # will return array of exon minus hit at each pos
-                diff = np.subtract(exon, h)
-                if diff[0] <= 0 and diff[1] >= 0:  # then query exon covers ref exon
-                    cov = abs(h[0] - h[1])
-                    QueryOverlap += cov
-                elif diff[0] <= 0 and diff[1] < 0:  # means query partial covers ref
-                    cov = abs(h[0] - exon[1])
-                    QueryOverlap += cov
-                elif diff[0] > 0 and diff[1] >= 0:  # means query partial covers ref
-                    cov = abs(exon[0] - h[1])
-                    QueryOverlap += cov
-                elif diff[0] > 0 and diff[1] < 1:
-                    cov = abs(exon[0] - exon[1])
-                    QueryOverlap += cov
-    # calculate AED
-    if qLen > 0 and rLen > 0:
-        SP = QueryOverlap / float(qLen)
-        SN = QueryOverlap / float(rLen)
-        AED = 1 - ((SN + SP) / 2)
-    else:
-        AED = 0.000
-    return '{:.3f}'.format(AED)
+    df = pd.DataFrame(results)
+    df.set_index('Stats', inplace=True)
+    dfT = df.transpose()
+    for x in ['Total Genes', 'Coding Genes', 'Coding transcripts', 'tRNA Genes', 'tRNA transcripts', 'Unique Genes', 'Identical Genes', 'Identical CDS']:
+        dfT[x] = pd.Series(["{0:,.0f}".format(val)
+                            for val in dfT[x]], index=dfT.index)
+    for x in ['Avg mRNA AED', 'Avg CDS AED']:
+        dfT[x] = pd.Series(["{0:.3f}".format(val)
+                            for val in dfT[x]], index=dfT.index)
+    dfT['Protein pident'] = pd.Series(
+        ["{0:.1%}".format(val) for val in dfT['Protein pident']], index=dfT.index)
+    df2 = dfT.transpose()
+    cols = list(df2)
+    cols.insert(0, cols.pop(cols.index('Reference')))
+    df2 = df2.ix[:, cols]
+    return df2
+
+
+_REFERENCE = None
+
+
+def _initQueryWorker(reference):
+    global _REFERENCE
+    _REFERENCE = reference
+
+
+def _contrastQuery(task):
+    # parse one query annotation and compare it to the shared reference
+    query, format, fasta, measure_pident, output, cpus = task
+    newInter, newGenes = loadAnnotation(query, format, fasta)
+    oldInter, oldGenes = _REFERENCE
+    return compareModels(oldInter, oldGenes, newInter, newGenes, measure_pident, output, cpus=cpus)
 
 
 def main(args):
@@ -1037,7 +1042,7 @@ def main(args):
                                      description='''Script is compares query annotation to reference annotation.''',
                                      epilog="""Written by Jon Palmer (2018) nextgenusfs@gmail.com""")
     parser.add_argument('-q', '--query', nargs='+',
-                        required=True, help='Genome annotation GBK or GFF3')
+                        required=True, help='Genome annotation(s) GBK or GFF3, each compared to the reference')
     parser.add_argument('-r', '--reference', required=True,
                         help='Genome annotation GBK or GFF3')
     parser.add_argument(
@@ -1046,6 +1051,8 @@ def main(args):
                         help='Output comparison file basename')
     parser.add_argument('-c', '--calculate_pident', action='store_true',
                         help='Calculate protein pident at each overlap')
+    parser.add_argument('--cpus', default=2, type=int,
+                        help='Number of contigs to compare at once')
     args = parser.parse_args(args)
 
     # goal here is to populate annotation into query and reference dictionaries
@@ -1060,6 +1067,9 @@ def main(args):
             print('ERROR: Need --fasta if using GFF3 input.')
             sys.exit(1)
         Refformat = 'gff'
+    # parse and index the reference once, it is shared by all of the queries
+    reference = loadAnnotation(args.reference, Refformat, args.fasta)
+    tasks = []
     for q in args.query:
         if q.endswith('.gbk') or q.endswith('.gbff') or q.endswith('.gb'):
             Queryformat = 'genbank'
@@ -1074,33 +1084,38 @@ def main(args):
             runOutput = args.output + '.' + qbase + '.compare2ref.txt'
         else:
             runOutput = qbase + '.compare2ref.txt'
-        result = compareAnnotations(
-            args.reference, Refformat, q, Queryformat, args.fasta, args.calculate_pident, runOutput)
-        if not 'Reference' in CombinedResults:
-            RefResults = result[:11]
-            if len(args.query) > 1:
-                RefResults[5] = 0
-                RefResults[6] = 0
-                RefResults[7] = 0
-            CombinedResults['Reference'] = RefResults
-        CombinedResults[qbase] = result[11:]
+        tasks.append((q, Queryformat, args.fasta, args.calculate_pident, runOutput, 1))
+    # several queries are compared at once, a single query contig by contig
+    pool = None
+    if args.cpus > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(processes=min(args.cpus, len(tasks)), initializer=_initQueryWorker,
+                                    initargs=(reference,))
+        results = pool.imap(_contrastQuery, tasks)
+    else:
+        _initQueryWorker(reference)
+        results = (_contrastQuery(x[:-1] + (args.cpus,)) for x in tasks)
+    try:
+        for q, result in zip(args.query, results):
+            qbase = os.path.basename(q).rsplit('.', 1)[0]
+            # summary of this query on its own
+            summary = summaryTable({'Stats': CombinedResults['Stats'], 'Reference': result[:11],
+                                    qbase: result[11:]})
+            summary.to_csv(args.output + '.' + qbase + '.summary-stats.csv', sep=',')
+            if not 'Reference' in CombinedResults:
+                RefResults = result[:11]
+                if len(args.query) > 1:
+                    RefResults[5] = 0
+                    RefResults[6] = 0
+                    RefResults[7] = 0
+                CombinedResults['Reference'] = RefResults
+            CombinedResults[qbase] = result[11:]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
     # get together stats from each query:
-    df = pd.DataFrame(CombinedResults)
-    df.set_index('Stats', inplace=True)
-    dfT = df.transpose()
-    for x in ['Total Genes', 'Coding Genes', 'Coding transcripts', 'tRNA Genes', 'tRNA transcripts', 'Unique Genes', 'Identical Genes', 'Identical CDS']:
-        dfT[x] = pd.Series(["{0:,.0f}".format(val)
-                            for val in dfT[x]], index=dfT.index)
-    for x in ['Avg mRNA AED', 'Avg CDS AED']:
-        dfT[x] = pd.Series(["{0:.3f}".format(val)
-                            for val in dfT[x]], index=dfT.index)
-    dfT['Protein pident'] = pd.Series(
-        ["{0:.1%}".format(val) for val in dfT['Protein pident']], index=dfT.index)
-    df2 = dfT.transpose()
-    cols = list(df2)
-    cols.insert(0, cols.pop(cols.index('Reference')))
-    df2 = df2.ix[:, cols]
+    df2 = summaryTable(CombinedResults)
     df2.to_csv(args.output+'.summary-stats.csv', sep=',')
     print('--------------------------------------------------------------')
     print(df2.to_string(justify='center'))
@@ -27,7 +27,7 @@ def main(args):
     # translate GFF3 to proteins
     # load into dictionary
     Genes = {}
-    Genes = lib.gff2dict(args.gff3, args.fasta, Genes)
+    Genes = lib.gff2dict(args.gff3, args.fasta, Genes, compact=True)
 
     for k, v in natsorted(Genes.items()):
         for i, x in enumerate(v['ids']):